@@ -1,61 +1,633 @@
 """Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
 
+import asyncio
 import base64
+import binascii
+import json
+import sys
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
+from typing import AsyncIterator, Iterator, Optional
+from urllib.parse import urlparse
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response
+from loguru import logger
+from pydantic import ValidationError
+from requests import Session
+from starlette.concurrency import run_in_threadpool
 
-from .config import Routing, Target
-from .distribution import send
+from .cache import LRUCache, fingerprint
+from .config import (
+    Batch,
+    GroupState,
+    Offload,
+    Readiness,
+    RenderCache,
+    Route,
+    Routing,
+    Shutdown,
+    Target,
+)
+from .distribution import DeliveryTracker, send
+from .distribution.utils import requests_retry_session
 from .model import AlertGroup
+from .offload import Offloader
 from .preprocessing import preprocess
+from .readiness import ReadinessProbe
+from .routing import RoutePlan, RoutingTableHolder, compile_routing_table
+from .state import GroupStateStore, alert_states, changed_alerts
+from .templating import current_engine, template, template_fields, template_names
 
 # ==============================================================================
 
 
-def create_fastapi_base() -> FastAPI:
+def create_fastapi_base(
+    shutdown: Shutdown = Shutdown(),
+    readiness: Readiness = Readiness(),
+    render_cache: RenderCache = RenderCache(),
+    batch: Batch = Batch(),
+    group_state: GroupState = GroupState(),
+    offload: Offload = Offload(),
+) -> FastAPI:
+    """Creates app with endpoints and hooks not related to routes.
+
+    The delivery tracker is available as `app.state.deliveries`. Call its
+    `begin_shutdown()` as soon as the process is asked to terminate. At the
+    latest this happens when the app itself is shut down. The readiness probe
+    is available as `app.state.readiness`. The render cache is available as
+    `app.state.render_cache` (`None` if disabled). Batch related settings
+    are available as `app.state.batch`. The store for delivered
+    alert group states is available as `app.state.group_state`. The process
+    pool for huge alert groups is available as `app.state.offloader` (`None`
+    if disabled).
+
+    Args:
+        shutdown (Shutdown, optional): Shutdown related settings. Defaults to
+            `Shutdown()`.
+        readiness (Readiness, optional): Readiness thresholds. Defaults to
+            `Readiness()`.
+        render_cache (RenderCache, optional): Render cache related settings.
+            Defaults to `RenderCache()`.
+        batch (Batch, optional): Batch endpoint related settings. Defaults to
+            `Batch()`.
+        group_state (GroupState, optional): Group state related settings.
+            Defaults to `GroupState()`.
+        offload (Offload, optional): Offload related settings. Defaults to
+            `Offload()`.
+
+    Returns:
+        FastAPI: New app.
+    """
+
     fastapi = FastAPI()
 
+    deliveries = DeliveryTracker(persist_dir=shutdown.persist_dir)
+    fastapi.state.deliveries = deliveries
+
+    probe = ReadinessProbe(readiness, deliveries)
+    fastapi.state.readiness = probe
+
+    cache = (
+        LRUCache(max_items=render_cache.max_items, max_bytes=render_cache.max_bytes)
+        if render_cache.enabled
+        else None
+    )
+    fastapi.state.render_cache = cache
+
+    fastapi.state.batch = batch
+
+    store = GroupStateStore(group_state.path, group_state.max_items, group_state.max_age)
+    fastapi.state.group_state = store
+
+    offloader = (
+        Offloader(offload.threshold, offload.max_workers)
+        if offload.threshold is not None
+        else None
+    )
+    fastapi.state.offloader = offloader
+
     @fastapi.get("/health")
     def health():
         return {"message": "OK", "symbol": "👌"}
 
+    @fastapi.get("/ready")
+    def ready(response: Response):
+        is_ready, status = probe.check()
+        if not is_ready:
+            response.status_code = 503
+        return status
+
+    @fastapi.get("/stats")
+    def stats():
+        return _stats(cache)
+
+    monitor_tasks = []
+
+    @fastapi.on_event("startup")
+    async def start_event_loop_monitor():
+        monitor_tasks.append(asyncio.ensure_future(probe.monitor_event_loop()))
+
+    @fastapi.on_event("shutdown")
+    async def drain_deliveries():
+        deliveries.begin_shutdown(shutdown.grace_period)
+        for task in monitor_tasks:
+            task.cancel()
+
+        # Pending deliveries are still queued in send loops. Once the grace
+        # period is over, the loops hand them over to `abandon()`.
+        while not deliveries.drained() and not deliveries.expired():
+            await asyncio.sleep(0.1)
+
+        _close(store, offloader)
+
+        logger.bind(**deliveries.report()).info("Shutdown of PromAC complete.")
+
+        await logger.complete()
+        sys.stderr.flush()
+
     return fastapi
 
 
+def _close(store: GroupStateStore, offloader: Optional[Offloader]) -> None:
+    """Releases files and worker processes."""
+
+    store.close()
+    if offloader is not None:
+        offloader.shutdown()
+    engine = current_engine()
+    if engine is not None:
+        engine.close()
+
+
+def _stats(render_cache: Optional[LRUCache]) -> dict:
+    """Returns stats of all caches. Disabled caches are `None`."""
+
+    engine = current_engine()
+    fragment_cache = engine.fragment_cache if engine is not None else None
+
+    return {
+        "render_cache": render_cache.stats() if render_cache is not None else None,
+        "fragment_cache": fragment_cache.stats() if fragment_cache is not None else None,
+    }
+
+
+# ==============================================================================
+
+
+@lru_cache(maxsize=1024)
+def _decode_webhook(b64_webhook: str) -> Optional[str]:
+    """Decodes and validates a webhook URL caught from the request path.
+
+    Both the standard and the URL-safe Base64 alphabet are accepted and missing
+    padding is tolerated. Results are cached, so repeated requests to the same
+    catch-all path skip the work.
+
+    Args:
+        b64_webhook (str): Base64 encoded URL.
+
+    Returns:
+        Optional[str]: Decoded URL. `None` if decoding failed or the result is
+            not an absolute HTTP(S) URL.
+    """
+
+    try:
+        url = base64.b64decode(
+            b64_webhook + "=" * (-len(b64_webhook) % 4), altchars=b"-_"
+        ).decode("utf-8")
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.netloc:
+        return None
+
+    return url
+
+
+def _resolve_targets(route: Route, b64_webhook: str = "") -> list[Target]:
+    """Resolves the targets for a single request. Never mutates `route`.
+
+    Args:
+        route (Route): Route related settings.
+        b64_webhook (str, optional): Base64 encoded URL caught from path.
+            Defaults to `""`.
+
+    Returns:
+        list[Target]: Targets of route plus caught webhook if there is one.
+            Do not mutate, it might be the list from the settings.
+    """
+
+    if not b64_webhook:
+        return route.targets
+
+    url = _decode_webhook(b64_webhook)
+
+    if url is None:
+        logger.bind(route=route.name, b64_webhook=b64_webhook).warning(
+            "Failed to decode webhook from path. Continue with configured targets."
+        )
+        return route.targets
+
+    return route.targets + [Target.construct(url=url)]
+
+
+def _template_fields(route: Route) -> Optional[frozenset[str]]:
+    """Returns fields referenced by any template the route renders with."""
+
+    names = {route.template} | {
+        target.template for target in route.targets if target.template
+    }
+    fields = [template_fields(name) for name in names]
+
+    if None in fields:
+        return None
+    return frozenset().union(*fields)
+
+
+def _render(
+    plan: RoutePlan,
+    alert_group: AlertGroup,
+    targets: Optional[list[Target]] = None,
+    offloader: Optional[Offloader] = None,
+) -> list[tuple]:
+    """Preprocesses and templates alert group.
+
+    Huge alert groups are preprocessed by the offloader if there is one.
+
+    Returns:
+        list[tuple]: Payloads and error parser per preprocessed alert group.
+    """
+
+    if offloader is not None and offloader.should_offload(alert_group):
+        enhanced_alert_groups = offloader.preprocess(plan, alert_group, targets)
+    else:
+        enhanced_alert_groups = preprocess(
+            plan.routing,
+            plan.route,
+            alert_group,
+            targets,
+            actions=plan.actions,
+            specific=plan.specific,
+        )
+
+    return [
+        template(enhanced_alert_group, plan.route.template)
+        for enhanced_alert_group in enhanced_alert_groups
+    ]
+
+
+def _rendered_size(rendered: list[tuple]) -> int:
+    """Approximates the memory used by rendered payloads in bytes."""
+
+    return sum(
+        (
+            len(payload.data)
+            if isinstance(payload.data, bytes)
+            else len(json.dumps(payload.data, default=str))
+        )
+        for payloads, _ in rendered
+        for payload in payloads
+    )
+
+
+def _process(
+    plan: RoutePlan,
+    alert_group: AlertGroup,
+    targets: Optional[list[Target]] = None,
+    session: Optional[Session] = None,
+    tracker: Optional[DeliveryTracker] = None,
+    cache: Optional[LRUCache] = None,
+    store: Optional[GroupStateStore] = None,
+    offloader: Optional[Offloader] = None,
+) -> list[list]:
+    """Runs a single alert group through the complete pipeline.
+
+    Args:
+        plan (RoutePlan): Plan of the route to process the alert group with.
+        alert_group (AlertGroup): Alertmanager payload. Mutated in-place.
+        targets (Optional[list[Target]], optional): Targets resolved for the
+            request. If `None`, the targets of the route are used. Defaults to
+            `None`.
+        session (Optional[Session], optional): Session to reuse for sending.
+            Defaults to `None`.
+        tracker (Optional[DeliveryTracker], optional): Tracks deliveries.
+            Defaults to `None`.
+        cache (Optional[LRUCache], optional): Cache for rendered payloads.
+            Identical alert groups sent to the same plan and targets skip
+            preprocessing and templating. Defaults to `None`.
+        store (Optional[GroupStateStore], optional): Delivered alert states.
+            Required for routes that use `delta`. Defaults to `None`.
+        offloader (Optional[Offloader], optional): Preprocesses huge alert
+            groups in a process pool. Defaults to `None`.
+
+    Returns:
+        list[list]: Responses per preprocessed alert group. Empty if nothing
+            has changed since the last delivery.
+    """
+
+    state_key = None
+    if store is not None and plan.route.delta:
+        state_key = json.dumps(
+            [
+                plan.name,
+                alert_group.group_key,
+                None if targets is None else [target.json() for target in targets],
+            ]
+        )
+        current_state = alert_states(alert_group)
+        previous_state = store.get(state_key)
+
+        if previous_state == current_state:
+            logger.bind(route=plan.name, group_key=alert_group.group_key).info(
+                "Alert group has not changed since last delivery. Skip."
+            )
+            return []
+
+        if plan.route.delta == "changes" and previous_state:
+            alert_group.alerts = changed_alerts(previous_state, alert_group)
+
+    if cache is None:
+        rendered = _render(plan, alert_group, targets, offloader)
+    else:
+        key = (
+            plan.version,
+            plan.name,
+            None if targets is None else tuple(target.json() for target in targets),
+            fingerprint(alert_group),
+        )
+        rendered = cache.get(key)
+        if rendered is None:
+            rendered = _render(plan, alert_group, targets, offloader)
+            cache.put(key, rendered, _rendered_size(rendered))
+
+    responses = []
+
+    for payloads, error_parser in rendered:
+        responses.append(
+            send(
+                payloads=payloads,
+                sending=plan.sending,
+                error_parser=error_parser,
+                session=session,
+                tracker=tracker,
+            )
+        )
+
+    if state_key is not None and all(
+        response.status_code < 300
+        for group_responses in responses
+        for response in group_responses
+    ):
+        store.put(state_key, current_state)
+
+    return responses
+
+
+async def _iter_ndjson(
+    chunks: AsyncIterator[bytes], max_line_bytes: int = Batch().max_line_bytes
+) -> AsyncIterator[bytes]:
+    """Splits a stream of bytes into non-empty lines.
+
+    Only the current incomplete line is kept in memory, so arbitrarily large
+    bodies can be consumed. Every byte is scanned for a newline only once.
+
+    Args:
+        chunks (AsyncIterator[bytes]): Stream of chunks, for example from
+            `Request.stream()`.
+        max_line_bytes (int, optional): Maximum length of a single line.
+            Defaults to `Batch().max_line_bytes`.
+
+    Yields:
+        bytes: Lines without the trailing newline. Blank lines are skipped.
+
+    Raises:
+        HTTPException: 413 if a line is longer than `max_line_bytes`.
+    """
+
+    def too_long() -> HTTPException:
+        return HTTPException(
+            status_code=413, detail=f"Line exceeds {max_line_bytes} bytes."
+        )
+
+    buffer = bytearray()
+    async for chunk in chunks:
+        scanned = len(buffer)
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find(b"\n", scanned)
+            if end < 0:
+                break
+            if end - start > max_line_bytes:
+                raise too_long()
+            line = bytes(buffer[start:end])
+            if line.strip():
+                yield line
+            start = scanned = end + 1
+        del buffer[:start]
+        if len(buffer) > max_line_bytes:
+            raise too_long()
+    if buffer.strip():
+        yield bytes(buffer)
+
+
+def _process_line(
+    plan: RoutePlan,
+    line: bytes,
+    index: int,
+    session: Session,
+    tracker: Optional[DeliveryTracker] = None,
+    cache: Optional[LRUCache] = None,
+    store: Optional[GroupStateStore] = None,
+    offloader: Optional[Offloader] = None,
+) -> dict:
+    """Parses and processes a single line of a batch.
+
+    Failures are caught and returned as result so that a single broken alert
+    group does not abort the remaining batch.
+
+    Returns:
+        dict: Result for the line. Contains at least `index` and `status`.
+    """
+
+    try:
+        alert_group = AlertGroup.parse_obj(json.loads(line))
+    except (ValueError, ValidationError) as e:
+        logger.bind(index=index).warning("Failed to parse alert group in batch.")
+        return {"index": index, "status": "invalid", "detail": str(e)}
+
+    try:
+        responses = _process(
+            plan,
+            alert_group,
+            session=session,
+            tracker=tracker,
+            cache=cache,
+            store=store,
+            offloader=offloader,
+        )
+    except Exception as e:
+        logger.bind(index=index).opt(exception=True).error(
+            "Failed to process alert group in batch."
+        )
+        return {"index": index, "status": "error", "detail": str(e)}
+
+    return {
+        "index": index,
+        "status": "ok",
+        "status_codes": [
+            [response.status_code for response in group_responses]
+            for group_responses in responses
+        ],
+    }
+
+
 # ==============================================================================
 
 
+def _lookup_plan(
+    holder: RoutingTableHolder, name: str, b64_webhook: str = ""
+) -> RoutePlan:
+    """Looks up the plan for a route in the current routing table.
+
+    Raises:
+        HTTPException: 404 if there is no such route or the route does not
+            catch webhooks but one has been given.
+    """
+
+    plan = holder.current.get(name)
+
+    if plan is None or (b64_webhook and not plan.route.catch):
+        raise HTTPException(status_code=404, detail=f"Route '{name}' not found.")
+
+    return plan
+
+
 def setup_routes(app: FastAPI, routing: Routing, route_prefix: str = "/route") -> FastAPI:
-    for route in routing.routes:
+    """Adds the route endpoints to the given app.
 
-        # ----------------------------------------------------------------------
+    Endpoints resolve the route by name from the current routing table on every
+    request. The holder is available as `app.state.routing_table` and can be
+    used to swap in new routing settings without restarting. Every request
+    finishes with the snapshot it started with. `POST /dispatch` selects the
+    routes for every alert by the `matchers` of the routes instead.
 
-        def route_handler(alert_group: AlertGroup, b64_webhook: str = ""):
-            route.targets.append(Target.construct(url=base64.b64decode(b64_webhook)))
+    Args:
+        app (FastAPI): App to add endpoints to.
+        routing (Routing): Initial routing settings.
+        route_prefix (str, optional): Prefix for all route endpoints.
+            Defaults to `"/route"`.
 
-            responses = []
+    Returns:
+        FastAPI: The given app.
 
-            enhanced_alert_groups = preprocess(routing, route, alert_group)
+    Raises:
+        ValueError: If a route or target selects a template that does not
+            exist. Reloads with such templates are rejected as well.
+    """
 
-            for enhanced_alert_group in enhanced_alert_groups:
-                payloads, error_parser = template(enhanced_alert_group)
-                
-                responses.append(
-                    send(
-                        payloads=payloads,
-                        sending=route.sending or routing.sending,
-                        error_parser=error_parser,
+    holder = RoutingTableHolder(
+        compile_routing_table(
+            routing, fields=_template_fields, templates=template_names()
+        )
+    )
+    app.state.routing_table = holder
+
+    tracker: Optional[DeliveryTracker] = getattr(app.state, "deliveries", None)
+    probe: Optional[ReadinessProbe] = getattr(app.state, "readiness", None)
+    cache: Optional[LRUCache] = getattr(app.state, "render_cache", None)
+    store: Optional[GroupStateStore] = getattr(app.state, "group_state", None)
+    offloader: Optional[Offloader] = getattr(app.state, "offloader", None)
+    batch: Batch = getattr(app.state, "batch", Batch())
+
+    if cache is not None:
+        # Entries of old tables can never be hit again.
+        holder.add_listener(lambda _: cache.clear())
+
+    @contextmanager
+    def accept() -> Iterator[None]:
+        if tracker and not tracker.accepting:
+            raise HTTPException(status_code=503, detail="PromAC is shutting down.")
+        with probe.track_request() if probe else nullcontext():
+            yield
+
+    def route_handler(name: str, alert_group: AlertGroup, b64_webhook: str = ""):
+        with accept():
+            plan = _lookup_plan(holder, name, b64_webhook)
+            _process(
+                plan,
+                alert_group,
+                _resolve_targets(plan.route, b64_webhook),
+                tracker=tracker,
+                cache=cache,
+                store=store,
+                offloader=offloader,
+            )
+
+    def dispatch_handler(alert_group: AlertGroup):
+        with accept():
+            table = holder.current
+            alert_groups = table.dispatcher.dispatch(alert_group)
+            counts = {
+                name: len(routed_alert_group.alerts)
+                for name, routed_alert_group in alert_groups.items()
+            }
+            for name, routed_alert_group in alert_groups.items():
+                _process(
+                    table.get(name),
+                    routed_alert_group,
+                    tracker=tracker,
+                    cache=cache,
+                    store=store,
+                    offloader=offloader,
+                )
+
+        logger.bind(routes=counts).info("Dispatched alert group.")
+
+        return {"routes": counts}
+
+    async def batch_handler(name: str, request: Request):
+        with accept():
+            plan = _lookup_plan(holder, name)
+            session = requests_retry_session(
+                retries=plan.sending.retries, backoff_factor=plan.sending.backoff_factor
+            )
+
+            results = []
+            index = 0
+            async for line in _iter_ndjson(request.stream(), batch.max_line_bytes):
+                results.append(
+                    await run_in_threadpool(
+                        _process_line,
+                        plan,
+                        line,
+                        index,
+                        session,
+                        tracker,
+                        cache,
+                        store,
+                        offloader,
                     )
                 )
+                index += 1
 
-        # ----------------------------------------------------------------------
+        logger.bind(route=name, items=index).info("Processed batch.")
 
-        route_postfix = r"{b64_webhook:path}" if route.catch else r""
+        return {"results": results}
 
-        app.add_api_route(
-            path=f"{route_prefix}/{route.name}/{route_postfix}",
-            endpoint=route_handler,
-            methods=["POST"],
-        )
+    app.add_api_route(path="/dispatch", endpoint=dispatch_handler, methods=["POST"])
+
+    # Must be added before the catch-all path, otherwise it would be shadowed.
+    app.add_api_route(
+        path=f"{route_prefix}/{{name}}/batch",
+        endpoint=batch_handler,
+        methods=["POST"],
+    )
+
+    app.add_api_route(
+        path=f"{route_prefix}/{{name}}/{{b64_webhook:path}}",
+        endpoint=route_handler,
+        methods=["POST"],
+    )
 
     return app
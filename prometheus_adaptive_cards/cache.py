@@ -0,0 +1,107 @@
+"""
+Memory-bounded caches. Alertmanager re-sends identical alert groups every
+`repeat_interval`. Caching the rendered payloads lets PromAC skip
+preprocessing and templating for those re-notifications.
+
+Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0
+"""
+
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Hashable, Optional
+
+from prometheus_adaptive_cards.model import AlertGroup
+
+
+class LRUCache:
+    """Least recently used cache bounded by number of items and bytes.
+
+    The size of every item is given by the caller. Counts hits, misses and
+    evictions. Thread-safe.
+
+    Args:
+        max_items (int, optional): Maximum number of items. Defaults to `1024`.
+        max_bytes (int, optional): Maximum sum of item sizes. Defaults to
+            `64 * 2**20`.
+    """
+
+    def __init__(self, max_items: int = 1024, max_bytes: int = 64 * 2**20) -> None:
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = Lock()
+        self._items: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Returns cached value or `None`. Marks it as recently used."""
+
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, size: int) -> None:
+        """Caches value. Evicts least recently used items to make room.
+
+        Values bigger than `max_bytes` are not cached at all.
+        """
+
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._items.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+
+            self._items[key] = (value, size)
+            self.bytes += size
+
+            while len(self._items) > self.max_items or self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Removes all items. Counters are kept."""
+
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        """Returns counters and the hit ratio."""
+
+        lookups = self.hits + self.misses
+        return {
+            "items": len(self._items),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def fingerprint(alert_group: AlertGroup) -> str:
+    """Returns digest of the complete content of an alert group.
+
+    Must be called before the alert group is mutated by preprocessing.
+    """
+
+    return hashlib.blake2b(
+        alert_group.json(sort_keys=True).encode(), digest_size=16
+    ).hexdigest()
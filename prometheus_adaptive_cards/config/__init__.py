@@ -3,14 +3,29 @@
 from .logger import setup_logging
 from .settings import (
     Add,
+    Batch,
+    FragmentCache,
+    GroupState,
     Logging,
+    Offload,
+    OrderKey,
     Override,
+    Readiness,
+    Reload,
     Remove,
+    RenderCache,
     Route,
     Routing,
+    Scripts,
     Sending,
     Settings,
+    Shutdown,
+    SplitBy,
+    SplitKey,
+    Summarize,
     Target,
+    Templating,
     Unstructured,
     settings_singleton,
 )
+from .settings_raw import config_file_locations
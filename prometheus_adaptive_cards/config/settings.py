@@ -9,9 +9,17 @@ import re
 from typing import Literal, Optional, Pattern
 
 from loguru import logger
-from pydantic import BaseModel, ValidationError, parse_obj_as, validator
+from pydantic import (
+    BaseModel,
+    ValidationError,
+    parse_obj_as,
+    root_validator,
+    validator,
+)
 
 from prometheus_adaptive_cards.config.settings_raw import setup_raw_settings
+from prometheus_adaptive_cards.expansion import compile_value
+from prometheus_adaptive_cards.matchers import parse_matchers
 
 # ==============================================================================
 # Logging
@@ -40,10 +48,57 @@ class Logging(BaseModel):
 # Server
 
 
+class Reload(BaseModel):
+    signal: bool = True
+    watch: bool = False
+    watch_interval: float = 5.0
+
+
+class Shutdown(BaseModel):
+    grace_period: float = 30.0
+    persist_dir: Optional[str]
+
+
+class Readiness(BaseModel):
+    max_requests_in_flight: Optional[int]
+    max_pending_deliveries: Optional[int]
+    max_oldest_pending_seconds: Optional[float]
+    max_event_loop_lag_seconds: Optional[float]
+    lag_probe_interval: float = 0.5
+
+
+class RenderCache(BaseModel):
+    enabled: bool = True
+    max_items: int = 1024
+    max_bytes: int = 64 * 2**20
+
+
+class Batch(BaseModel):
+    max_line_bytes: int = 16 * 2**20
+
+
+class GroupState(BaseModel):
+    path: Optional[str]
+    max_items: int = 65536
+    max_age: Optional[float] = 7 * 24 * 3600
+
+
+class Offload(BaseModel):
+    threshold: Optional[int]
+    max_workers: Optional[int]
+
+
 class Server(BaseModel):
     host: str = "127.0.0.1"
     port: int = 8000
     root_path: str = ""
+    reload: Reload = Reload()
+    shutdown: Shutdown = Shutdown()
+    readiness: Readiness = Readiness()
+    render_cache: RenderCache = RenderCache()
+    batch: Batch = Batch()
+    group_state: GroupState = GroupState()
+    offload: Offload = Offload()
 
 
 # ==============================================================================
@@ -64,21 +119,90 @@ class Remove(BaseModel):
     re_labels: list[Pattern] = []
 
 
+def _validate_templates(cls, v):  # noqa
+    for value in v.values():
+        compile_value(value)
+    return v
+
+
 class Add(BaseModel):
     annotations: dict[str, str] = {}
     labels: dict[str, str] = {}
 
+    _templates = validator("annotations", "labels", allow_reuse=True)(_validate_templates)
+
 
 class Override(BaseModel):
     annotations: dict[str, str] = {}
     labels: dict[str, str] = {}
 
+    _templates = validator("annotations", "labels", allow_reuse=True)(_validate_templates)
 
-class SplitBy(BaseModel):
+
+class SplitKey(BaseModel):
     target: Literal["annotation", "label"]
     value: str
 
 
+class SplitBy(BaseModel):
+    target: Optional[Literal["annotation", "label"]]
+    value: Optional[str]
+    keys: list[SplitKey] = []
+    max_groups: Optional[int]
+
+    @root_validator(skip_on_failure=True)
+    def validate_keys(cls, values):  # noqa
+        target, value, keys = values["target"], values["value"], values["keys"]
+        if (target is None) != (value is None):
+            raise ValueError("'target' and 'value' must be set together.")
+        if target is not None:
+            key = SplitKey(target=target, value=value)
+            keys = [key] + [k for k in keys if k != key]
+        if not keys:
+            raise ValueError("'split_by' requires at least one key.")
+        if values["max_groups"] is not None and values["max_groups"] < 1:
+            raise ValueError("'max_groups' must be at least 1.")
+        values["keys"] = keys
+        return values
+
+
+class OrderKey(BaseModel):
+    target: Literal["annotation", "label", "starts_at"]
+    value: Optional[str]
+    ranking: list[str] = []
+    descending: bool = False
+
+    @root_validator(skip_on_failure=True)
+    def validate_value(cls, values):  # noqa
+        if (values["target"] == "starts_at") != (values["value"] is None):
+            raise ValueError("'value' must be set for labels and annotations only.")
+        return values
+
+
+class Summarize(BaseModel):
+    max_alerts: int
+    order_by: list[OrderKey] = [
+        OrderKey(
+            target="label",
+            value="severity",
+            ranking=["critical", "error", "warning", "info"],
+        ),
+        OrderKey(target="starts_at", descending=True),
+    ]
+    count_by: list[str] = ["alertname", "severity"]
+
+    @validator("max_alerts")
+    def validate_max_alerts(cls, v):  # noqa
+        if v < 1:
+            raise ValueError("'max_alerts' must be at least 1.")
+        return v
+
+
+def _validate_matchers(cls, v):  # noqa
+    parse_matchers(v)
+    return v
+
+
 _PATTERN_FOR_NAME = re.compile(r"^[a-z0-9_\-]*$")
 
 
@@ -87,6 +211,7 @@ class Target(BaseModel):
     expansion_url: Optional[str]
     url_from_label: Optional[str]
     url_from_annotation: Optional[str]
+    template: Optional[str]
 
 
 class Route(BaseModel):
@@ -96,11 +221,21 @@ class Route(BaseModel):
     add: Optional[Add]
     override: Optional[Override]
     split_by: Optional[SplitBy]
+    summarize: Optional[Summarize]
+    delta: Optional[Literal["skip_unchanged", "changes"]]
+    drop: list[str] = []
+    matchers: list[str] = []
     extract_webhooks: list[str] = []
     extract_webhooks_re: list[Pattern] = []
     targets: list[Target] = []
+    template: str = "default"
     sending: Optional[Sending]
 
+    _drop = validator("drop", each_item=True, allow_reuse=True)(_validate_matchers)
+    _matchers = validator("matchers", each_item=True, allow_reuse=True)(
+        _validate_matchers
+    )
+
     @validator("name")
     def validate_name(cls, v):  # noqa
         if _PATTERN_FOR_NAME.search(v):
@@ -115,6 +250,10 @@ class Routing(BaseModel):
     override: Optional[Override]
     routes: list[Route] = []
     sending: Sending = Sending()
+    columnar_threshold: Optional[int] = None
+    drop: list[str] = []
+
+    _drop = validator("drop", each_item=True, allow_reuse=True)(_validate_matchers)
 
     @validator("routes")
     def validate_routes_unique(cls, v):  # noqa
@@ -125,6 +264,30 @@ class Routing(BaseModel):
             raise ValidationError("Routes must have unique names.")
 
 
+# ==============================================================================
+# Templating
+
+
+class FragmentCache(BaseModel):
+    enabled: bool = True
+    max_items: int = 16384
+    max_bytes: int = 16 * 2**20
+
+
+class Scripts(BaseModel):
+    workers: int = 2
+    cpu_time: float = 1.0
+    wall_time: float = 5.0
+    max_memory: Optional[int] = 512 * 2**20
+
+
+class Templating(BaseModel):
+    directories: list[str] = []
+    bytecode_cache_dir: Optional[str]
+    fragment_cache: FragmentCache = FragmentCache()
+    scripts: Scripts = Scripts()
+
+
 # ==============================================================================
 
 
@@ -132,6 +295,7 @@ class Settings(BaseModel):
     logging: Logging = Logging()
     server: Server = Server()
     routing: Routing = Routing()
+    templating: Templating = Templating()
 
 
 # ==============================================================================
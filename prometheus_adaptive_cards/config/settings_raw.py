@@ -49,6 +49,28 @@ def _parse_args(args: list[str]) -> Box:
     return Box(settings_utils.unflatten(cli_args_dict), box_dots=True)
 
 
+def _lookup_locations(
+    force_file: str or None = None, lookup_override: list[str] or None = None
+) -> list[str]:
+    """Returns locations where config files are looked up. Not filtered.
+
+    Args:
+        force_file (str or None, optional): See `_parse_files`.
+        lookup_override (list[str] or None, optional): See `_parse_files`.
+
+    Returns:
+        list[str]: Locations in the order they are checked.
+    """
+
+    if force_file:
+        return [force_file]
+    else:
+        return lookup_override or [
+            f"{os.path.dirname(__file__)}/promac.yml",
+            "/etc/promac/promac.yml",
+        ]
+
+
 def _parse_files(
     force_file: str or None = None, lookup_override: list[str] or None = None
 ) -> dict[str]:
@@ -74,15 +96,10 @@ def _parse_files(
 
     if force_file:
         logger.debug(f"Only file '{force_file}' is considered.")
-        locations = settings_utils.generate_locations([force_file])
-    else:
-        locations = settings_utils.generate_locations(
-            lookup_override
-            or [
-                f"{os.path.dirname(__file__)}/promac.yml",
-                "/etc/promac/promac.yml",
-            ]
-        )
+
+    locations = settings_utils.generate_locations(
+        _lookup_locations(force_file, lookup_override)
+    )
 
     configs = settings_utils.parse_yamls(locations)
 
@@ -132,6 +149,31 @@ def _cast_vars(box: Box) -> None:
     settings_utils.cast(box, "logging.structured.custom_serializer", bool)
     settings_utils.cast(box, "logging.unstructured.colorize", bool)
     settings_utils.cast(box, "server.port", int)
+    settings_utils.cast(box, "server.reload.signal", bool)
+    settings_utils.cast(box, "server.reload.watch", bool)
+    settings_utils.cast(box, "server.reload.watch_interval", float)
+    settings_utils.cast(box, "server.shutdown.grace_period", float)
+    settings_utils.cast(box, "server.readiness.max_requests_in_flight", int)
+    settings_utils.cast(box, "server.readiness.max_pending_deliveries", int)
+    settings_utils.cast(box, "server.readiness.max_oldest_pending_seconds", float)
+    settings_utils.cast(box, "server.readiness.max_event_loop_lag_seconds", float)
+    settings_utils.cast(box, "server.readiness.lag_probe_interval", float)
+    settings_utils.cast(box, "server.render_cache.enabled", bool)
+    settings_utils.cast(box, "server.render_cache.max_items", int)
+    settings_utils.cast(box, "server.render_cache.max_bytes", int)
+    settings_utils.cast(box, "server.batch.max_line_bytes", int)
+    settings_utils.cast(box, "server.group_state.max_items", int)
+    settings_utils.cast(box, "server.group_state.max_age", float)
+    settings_utils.cast(box, "server.offload.threshold", int)
+    settings_utils.cast(box, "server.offload.max_workers", int)
+    settings_utils.cast(box, "routing.columnar_threshold", int)
+    settings_utils.cast(box, "templating.fragment_cache.enabled", bool)
+    settings_utils.cast(box, "templating.fragment_cache.max_items", int)
+    settings_utils.cast(box, "templating.fragment_cache.max_bytes", int)
+    settings_utils.cast(box, "templating.scripts.workers", int)
+    settings_utils.cast(box, "templating.scripts.cpu_time", float)
+    settings_utils.cast(box, "templating.scripts.wall_time", float)
+    settings_utils.cast(box, "templating.scripts.max_memory", int)
 
 
 def setup_raw_settings(cli_args: list[str], env: dict[str, str]) -> dict:
@@ -167,3 +209,28 @@ def setup_raw_settings(cli_args: list[str], env: dict[str, str]) -> dict:
     settings_utils.merge(collected_settings_dict, cli_args_box.to_dict())
 
     return collected_settings_dict
+
+
+def config_file_locations(cli_args: list[str]) -> list[str]:
+    """Returns all locations a config file could be read from.
+
+    Includes the `.local.` versions and locations that currently do not exist.
+    Meant for watching the files for changes.
+
+    Args:
+        cli_args (list[str]): List of all arguments passed to program.
+
+    Returns:
+        list[str]: Locations of potential config files.
+    """
+
+    cli_args_box = _parse_args(cli_args)
+    config_file = cli_args_box.get("config_file", os.environ.get("CONFIG_FILE", None))
+
+    locations = []
+    for path in _lookup_locations(force_file=config_file):
+        locations.append(path)
+        last_dot = path.rfind(".")
+        if last_dot != -1:
+            locations.append(path[:last_dot] + ".local." + path[last_dot + 1 :])
+    return locations
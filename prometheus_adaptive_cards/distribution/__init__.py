@@ -1,4 +1,5 @@
 """Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
 
-from .distribution import send
+from .distribution import resend_persisted, send
 from .model import Payload
+from .tracking import DeliveryTracker, load_persisted
@@ -1,6 +1,8 @@
 """Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
 
-from typing import Callable, Optional
+import os
+from contextlib import nullcontext
+from typing import Callable, Optional, Union
 
 from fastapi import Response
 from loguru import logger
@@ -9,6 +11,7 @@ from requests import Session
 from prometheus_adaptive_cards.config import Sending
 
 from .model import Payload
+from .tracking import DeliveryTracker, load_persisted
 from .utils import extract_url, requests_retry_session
 
 
@@ -42,7 +45,7 @@ def _handle_send_failure(
 
     if error_payload:
         method = "post"
-        kwargs = {"url": notify_url if notify_url else url, "data": error_payload}
+        kwargs = {"url": notify_url if notify_url else url, "json": error_payload}
     else:
         method = "get"
         kwargs = {"url": notify_url if notify_url else url}
@@ -69,21 +72,79 @@ def send(
     payloads: list[Payload],
     sending: Sending,
     error_parser: Optional[Callable[[dict], dict]] = None,
+    session: Optional[Session] = None,
+    tracker: Optional[DeliveryTracker] = None,
 ) -> list[Response]:
+    """Sends payloads to all of their targets.
+
+    Args:
+        payloads (list[Payload]): Payloads to send out.
+        sending (Sending): Sending related settings.
+        error_parser (Optional[Callable[[dict], dict]], optional): Creates the
+            payload used to notify about a failed send. Defaults to `None`.
+        session (Optional[Session], optional): Session to reuse. Should be
+            created with `requests_retry_session()`. Lets callers that send
+            many batches share connection pools. If `None`, a new session is
+            created based on `sending`. Defaults to `None`.
+        tracker (Optional[DeliveryTracker], optional): Tracks deliveries.
+            Once its grace period is over, remaining deliveries are handed
+            over to it instead of being sent. Defaults to `None`.
+
+    Returns:
+        list[Response]: Responses for all requests made.
+    """
+
     logger.info("Start sending out payloads to targets.")
 
-    session = requests_retry_session(
+    session = session or requests_retry_session(
         retries=sending.retries, backoff_factor=sending.backoff_factor
     )
 
     responses = []
 
+    token = (
+        tracker.enqueue(sum(len(payload.targets) for payload in payloads))
+        if tracker
+        else None
+    )
+
+    try:
+        _send(payloads, sending, error_parser, session, tracker, token, responses)
+    finally:
+        if tracker:
+            tracker.release(token)
+
+    return responses
+
+
+def _post(session: Session, url: str, data: Union[dict, bytes]) -> Response:
+    if isinstance(data, bytes):
+        return session.post(url, data=data, headers={"Content-Type": "application/json"})
+    return session.post(url, json=data)
+
+
+def _send(  # noqa: C901
+    payloads: list[Payload],
+    sending: Sending,
+    error_parser: Optional[Callable[[dict], dict]],
+    session: Session,
+    tracker: Optional[DeliveryTracker],
+    token: Optional[int],
+    responses: list[Response],
+) -> None:
+    """Does the actual work for `send()`. Appends to `responses` in-place."""
+
     for payload in payloads:
         local_logger = logger.bind(data=payload.data)
         for target in payload.targets:
             url = extract_url(target)
             if url:
-                response = session.post(url, data=payload.data)
+                if tracker and tracker.expired():
+                    tracker.abandon(payload, target, url, token)
+                    continue
+
+                with tracker.track(token) if tracker else nullcontext():
+                    response = _post(session, url, payload.data)
 
                 responses.append(response)
 
@@ -128,4 +189,36 @@ def send(
                             responses.append(response)
             else:
                 local_logger.warning("No target defined. Alert will not be send out.")
-    return responses
+                if tracker:
+                    tracker.dequeue(token)
+
+
+def resend_persisted(persist_dir: str, sending: Sending) -> int:
+    """Sends out deliveries that have been persisted during a shutdown.
+
+    Files are deleted once their deliveries have been sent, regardless of the
+    response. Files that fail to send are kept for the next attempt.
+
+    Args:
+        persist_dir (str): Directory deliveries have been persisted to.
+        sending (Sending): Sending related settings.
+
+    Returns:
+        int: Number of deliveries that have been sent.
+    """
+
+    count = 0
+    for path, payloads in load_persisted(persist_dir):
+        logger.bind(path=path, deliveries=len(payloads)).info(
+            "Send deliveries persisted during shutdown."
+        )
+        try:
+            send(payloads, sending)
+        except Exception:
+            logger.bind(path=path).opt(exception=True).error(
+                "Failed to send persisted deliveries. Keep file."
+            )
+            continue
+        os.remove(path)
+        count += len(payloads)
+    return count
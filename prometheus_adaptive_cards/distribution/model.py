@@ -1,8 +1,11 @@
+from typing import Union
+
 from pydantic import BaseModel
 
 from prometheus_adaptive_cards.config import Target
 
 
 class Payload(BaseModel):
-    data: dict
+    # Bytes are sent as they are with JSON as content type.
+    data: Union[dict, bytes]
     targets: list[Target]
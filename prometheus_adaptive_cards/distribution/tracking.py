@@ -0,0 +1,217 @@
+"""
+Keeps track of deliveries so that PromAC can shut down gracefully. Once the
+shutdown has begun, no new webhooks are accepted. Deliveries that are still
+pending when the grace period is over are persisted to disk (if configured)
+or dropped instead of being cut off.
+
+Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0
+"""
+
+import itertools
+import json
+import os
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock
+from typing import Iterator, Optional
+
+from loguru import logger
+
+from prometheus_adaptive_cards.config import Target
+
+from .model import Payload
+
+
+class DeliveryTracker:
+    """Counts deliveries and coordinates the shutdown.
+
+    A delivery is sending a single payload to a single target. Deliveries are
+    pending from the moment they are enqueued until they are done. All
+    counters can be read in constant time.
+
+    Args:
+        persist_dir (Optional[str], optional): Directory to persist pending
+            deliveries to after the grace period is over. If `None`, they are
+            dropped. Defaults to `None`.
+    """
+
+    def __init__(self, persist_dir: Optional[str] = None) -> None:
+        self.persist_dir = persist_dir
+
+        self.accepting = True
+        self.deadline: Optional[float] = None
+
+        self.in_flight = 0
+        self.pending = 0
+        self.finished = 0
+        self.persisted = 0
+        self.dropped = 0
+
+        self._lock = Lock()
+        self._tokens = itertools.count()
+        self._queued: OrderedDict[int, list] = OrderedDict()
+
+    def begin_shutdown(self, grace_period: float) -> None:
+        """Stops accepting webhooks and starts the grace period. Idempotent."""
+
+        with self._lock:
+            if not self.accepting:
+                return
+            self.accepting = False
+            self.deadline = time.monotonic() + grace_period
+
+        logger.bind(grace_period=grace_period, in_flight=self.in_flight).info(
+            "Begin shutdown. Drain pending deliveries."
+        )
+
+    def drained(self) -> bool:
+        """Are there neither pending nor in flight deliveries left?"""
+
+        return self.pending == 0 and self.in_flight == 0
+
+    def expired(self) -> bool:
+        """Is the grace period over?"""
+
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def enqueue(self, count: int) -> int:
+        """Marks a number of deliveries as pending.
+
+        Returns:
+            int: Token to pass to `dequeue()` and `release()`.
+        """
+
+        with self._lock:
+            token = next(self._tokens)
+            if count > 0:
+                self._queued[token] = [time.monotonic(), count]
+                self.pending += count
+        return token
+
+    def dequeue(self, token: Optional[int]) -> None:
+        """Marks a single pending delivery as done."""
+
+        with self._lock:
+            entry = self._queued.get(token)
+            if entry:
+                entry[1] -= 1
+                self.pending -= 1
+                if entry[1] == 0:
+                    del self._queued[token]
+
+    def release(self, token: int) -> None:
+        """Marks all deliveries that are still pending for token as done."""
+
+        with self._lock:
+            entry = self._queued.pop(token, None)
+            if entry:
+                self.pending -= entry[1]
+
+    def oldest_pending_age(self) -> float:
+        """Seconds since the oldest pending delivery has been enqueued."""
+
+        with self._lock:
+            if not self._queued:
+                return 0.0
+            return time.monotonic() - next(iter(self._queued.values()))[0]
+
+    @contextmanager
+    def track(self, token: Optional[int] = None) -> Iterator[None]:
+        """Tracks a single delivery while it is in flight.
+
+        Args:
+            token (Optional[int], optional): Token returned by `enqueue()`.
+                If given, the delivery is dequeued on exit. Defaults to `None`.
+        """
+
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                if not self.accepting:
+                    self.finished += 1
+            if token is not None:
+                self.dequeue(token)
+
+    def abandon(
+        self, payload: Payload, target: Target, url: str, token: Optional[int] = None
+    ) -> None:
+        """Persists or drops a delivery that can not be made anymore."""
+
+        if token is not None:
+            self.dequeue(token)
+
+        if self.persist_dir:
+            try:
+                os.makedirs(self.persist_dir, exist_ok=True)
+                with open(
+                    f"{self.persist_dir}/deliveries-{os.getpid()}.ndjson", "a"
+                ) as f:
+                    record = {"url": url, "target": target.dict()}
+                    if isinstance(payload.data, bytes):
+                        record["raw"] = payload.data.decode()
+                    else:
+                        record["data"] = payload.data
+                    f.write(json.dumps(record, default=str) + "\n")
+                with self._lock:
+                    self.persisted += 1
+                return
+            except OSError:
+                logger.opt(exception=True).error("Failed to persist delivery.")
+
+        logger.bind(url=url).warning("Dropped delivery after grace period.")
+        with self._lock:
+            self.dropped += 1
+
+    def report(self) -> dict[str, int]:
+        """Returns counts of deliveries handled since shutdown began."""
+
+        return {
+            "finished": self.finished,
+            "persisted": self.persisted,
+            "dropped": self.dropped,
+            "in_flight": self.in_flight,
+            "pending": self.pending,
+        }
+
+
+def load_persisted(persist_dir: str) -> Iterator[tuple[str, list[Payload]]]:
+    """Loads deliveries persisted by `DeliveryTracker.abandon()`.
+
+    Args:
+        persist_dir (str): Directory deliveries have been persisted to.
+
+    Yields:
+        tuple[str, list[Payload]]: Path of a file together with the payloads
+            it contains. Every payload has exactly one target that points to
+            the URL that has been extracted originally. Delete the file once
+            the payloads have been sent.
+    """
+
+    if not os.path.isdir(persist_dir):
+        return
+
+    for name in sorted(os.listdir(persist_dir)):
+        if not (name.startswith("deliveries-") and name.endswith(".ndjson")):
+            continue
+        path = f"{persist_dir}/{name}"
+        payloads = []
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    payloads.append(
+                        Payload.construct(
+                            data=(
+                                record["raw"].encode()
+                                if "raw" in record
+                                else record["data"]
+                            ),
+                            targets=[Target.construct(url=record["url"])],
+                        )
+                    )
+        yield path, payloads
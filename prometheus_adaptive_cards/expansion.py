@@ -0,0 +1,100 @@
+"""
+Values of `add` and `override` that reference labels and annotations of the
+alert they are applied to, for example `https://wiki/{labels[alertname]}`.
+Templates are parsed once when the route plan is built. Expanded values are
+memoized per distinct combination of referenced values, so alerts that share
+them only expand once.
+
+Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0
+"""
+
+import re
+from string import Formatter
+from typing import Union
+
+_FIELD = re.compile(r"^(labels|annotations)\[([^\]]+)\]$")
+
+
+class _Empty(dict):
+    def __missing__(self, key: str) -> str:
+        return ""
+
+
+class Expansion:
+    """Template for a value with references to labels and annotations.
+
+    References use the syntax of `str.format()`. Missing labels and
+    annotations expand to an empty string.
+
+    Args:
+        template (str): Template to parse.
+
+    Raises:
+        ValueError: If the template is invalid or references something else
+            than `labels[...]` or `annotations[...]`.
+    """
+
+    __slots__ = ("template", "fields", "_memo")
+
+    def __init__(self, template: str) -> None:
+        self.template = template
+
+        fields = []
+        try:
+            parsed = list(Formatter().parse(template))
+        except ValueError as e:
+            raise ValueError(f"Invalid template '{template}': {e}") from e
+        for _, field_name, _, _ in parsed:
+            if field_name is None:
+                continue
+            match = _FIELD.match(field_name)
+            if not match:
+                raise ValueError(
+                    f"Invalid reference '{field_name}' in template '{template}'. "
+                    "Only 'labels[name]' and 'annotations[name]' are supported."
+                )
+            if match.groups() not in fields:
+                fields.append(match.groups())
+
+        self.fields: tuple[tuple[str, str], ...] = tuple(fields)
+        self._memo: dict[tuple[str, ...], str] = {}
+
+    def __repr__(self) -> str:
+        return f"Expansion({self.template!r})"
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Expansion) and other.template == self.template
+
+    def expand(self, labels: dict[str, str], annotations: dict[str, str]) -> str:
+        """Expands template with the given labels and annotations."""
+
+        key = tuple(
+            (labels if target == "labels" else annotations).get(name, "")
+            for target, name in self.fields
+        )
+
+        value = self._memo.get(key)
+        if value is None:
+            items = {"labels": _Empty(), "annotations": _Empty()}
+            for (target, name), item in zip(self.fields, key):
+                items[target][name] = item
+            value = self.template.format_map(items)
+            if len(self._memo) < 2**16:
+                self._memo[key] = value
+
+        return value
+
+
+def compile_value(value: str) -> Union[str, Expansion]:
+    """Returns `Expansion` if value references anything, otherwise the value.
+
+    Escaped braces are unescaped in both cases.
+
+    Raises:
+        ValueError: If the value is an invalid template.
+    """
+
+    expansion = Expansion(value)
+    if expansion.fields:
+        return expansion
+    return "".join(literal for literal, _, _, _ in Formatter().parse(value))
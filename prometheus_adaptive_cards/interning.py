@@ -0,0 +1,71 @@
+"""
+Bounded interning of strings. Alerts of a group share most label names and
+values. Interning them while decoding makes all alerts reference the same
+string objects. That saves memory and speeds up dict and set operations,
+because comparisons of identical objects short-circuit.
+
+Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0
+"""
+
+from typing import Optional
+
+
+class InternTable:
+    """Interns strings in a table with bounded size.
+
+    Uses two generations. New strings go into the current generation. Once
+    it is full, it becomes the previous generation and the old previous one
+    is dropped. Strings found in the previous generation are promoted. This
+    keeps frequently used strings while high-cardinality values are evicted
+    over time. All operations are constant time.
+
+    Args:
+        maxsize (int, optional): Maximum number of strings kept in total.
+            Defaults to `2**16`.
+        max_length (int, optional): Longer strings are not interned. They are
+            unlikely to repeat. Defaults to `256`.
+    """
+
+    def __init__(self, maxsize: int = 2**16, max_length: int = 256) -> None:
+        self.generation_size = max(1, maxsize // 2)
+        self.max_length = max_length
+
+        self._current: dict[str, str] = {}
+        self._previous: dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._current) + len(self._previous)
+
+    def intern(self, string: str) -> str:
+        """Returns the canonical instance of the given string."""
+
+        found: Optional[str] = self._current.get(string)
+        if found is not None:
+            return found
+
+        if len(string) > self.max_length:
+            return string
+
+        found = self._previous.get(string)
+        if found is None:
+            found = string
+
+        if len(self._current) >= self.generation_size:
+            self._previous = self._current
+            self._current = {}
+
+        self._current[found] = found
+        return found
+
+    def intern_items(self, items: dict[str, str]) -> dict[str, str]:
+        """Returns a new dict with interned names and values."""
+
+        intern = self.intern
+        return {intern(name): intern(value) for name, value in items.items()}
+
+    def clear(self) -> None:
+        self._current = {}
+        self._previous = {}
+
+
+intern_table = InternTable()
@@ -2,12 +2,34 @@
 
 import os
 import sys
+from threading import Thread
+from typing import Callable
 
 import uvicorn
 from loguru import logger
 
 from .app import create_fastapi_base, setup_routes
-from .config import settings_singleton, setup_logging
+from .config import config_file_locations, settings_singleton, setup_logging
+from .distribution import resend_persisted
+from .routing import Reloader
+from .templating import setup_templating
+
+
+class _Server(uvicorn.Server):
+    """Uvicorn server that calls `on_exit` as soon as it is asked to exit.
+
+    Uvicorn itself only informs the app after all connections have been
+    closed. That is too late to stop accepting webhooks and to start the
+    grace period for pending deliveries.
+    """
+
+    def __init__(self, config: uvicorn.Config, on_exit: Callable[[], None]) -> None:
+        super().__init__(config)
+        self.on_exit = on_exit
+
+    def handle_exit(self, sig, frame):
+        self.on_exit()
+        super().handle_exit(sig, frame)
 
 
 def main(cli_args: list[str], env: dict[str, str]):
@@ -20,16 +42,51 @@ def main(cli_args: list[str], env: dict[str, str]):
 
     logger.bind(settings=settings.dict()).info("Running PromAC with attached settings.")
 
-    fastapi_app = create_fastapi_base()
+    setup_templating(settings.templating)
+
+    fastapi_app = create_fastapi_base(
+        shutdown=settings.server.shutdown,
+        readiness=settings.server.readiness,
+        render_cache=settings.server.render_cache,
+        batch=settings.server.batch,
+        group_state=settings.server.group_state,
+        offload=settings.server.offload,
+    )
     setup_routes(fastapi_app, settings.routing)
 
-    uvicorn.run(
+    reload_settings = settings.server.reload
+    reloader = Reloader(
+        holder=fastapi_app.state.routing_table,
+        load=lambda: settings_singleton(cli_args, env, refresh=True).routing,
+        watch_paths=config_file_locations(cli_args) if reload_settings.watch else [],
+        interval=reload_settings.watch_interval,
+    )
+    if reload_settings.signal:
+        reloader.install_signal_handler()
+    reloader.start()
+
+    persist_dir = settings.server.shutdown.persist_dir
+    if persist_dir:
+        Thread(
+            target=resend_persisted,
+            args=(persist_dir, settings.routing.sending),
+            name="promac-resend",
+            daemon=True,
+        ).start()
+
+    config = uvicorn.Config(
         fastapi_app,
         host=settings.server.host,
         port=settings.server.port,
         log_level=str.lower(settings.logging.level),
         log_config=None,
     )
+    _Server(
+        config,
+        on_exit=lambda: fastapi_app.state.deliveries.begin_shutdown(
+            settings.server.shutdown.grace_period
+        ),
+    ).run()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,140 @@
+"""
+Alertmanager style label matchers (`=`, `!=`, `=~`, `!~`). Used to drop whole
+alerts early. Many matchers are compiled into an index keyed by label name,
+so that evaluating an alert only touches the matchers of labels it might
+match on.
+
+Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Optional, Pattern
+
+# ==============================================================================
+
+
+@dataclass(frozen=True)
+class Matcher:
+    """Single matcher. Regexes are fully anchored like in Alertmanager.
+
+    A missing label is treated like a label with an empty value.
+    """
+
+    name: str
+    op: str
+    value: str
+    regex: Optional[Pattern] = None
+
+    def matches(self, value: str) -> bool:
+        if self.op == "=":
+            return value == self.value
+        if self.op == "!=":
+            return value != self.value
+        if self.op == "=~":
+            return self.regex.fullmatch(value) is not None
+        return self.regex.fullmatch(value) is None
+
+    def __str__(self) -> str:
+        return f'{self.name}{self.op}"{self.value}"'
+
+
+_MATCHER = re.compile(
+    r'\s*([a-zA-Z_][a-zA-Z0-9_]*)\s*(=~|!~|!=|=)\s*("(?:[^"\\]|\\.)*"|[^,{}"\s]*)\s*(?:,|$)'
+)
+
+
+def parse_matchers(text: str) -> list[Matcher]:
+    """Parses matchers like `{severity="info", team=~"a|b"}`.
+
+    Braces and quotes are optional. Multiple matchers are separated by commas.
+
+    Args:
+        text (str): Matchers to parse.
+
+    Raises:
+        ValueError: If the text is not a valid list of matchers or contains
+            an invalid regex.
+
+    Returns:
+        list[Matcher]: Parsed matchers. Never empty.
+    """
+
+    body = text.strip()
+    if body.startswith("{") and body.endswith("}"):
+        body = body[1:-1]
+
+    matchers = []
+    position = 0
+
+    while position < len(body):
+        match = _MATCHER.match(body, position)
+        if not match or match.end() == position:
+            raise ValueError(f"Invalid matcher at position {position} in '{text}'.")
+        name, op, value = match.groups()
+        if value.startswith('"'):
+            value = re.sub(r"\\(.)", r"\1", value[1:-1])
+        try:
+            regex = re.compile(value) if op in ("=~", "!~") else None
+        except re.error as e:
+            raise ValueError(f"Invalid regex in matcher '{text}': {e}") from e
+        matchers.append(Matcher(name=name, op=op, value=value, regex=regex))
+        position = match.end()
+
+    if not matchers:
+        raise ValueError(f"No matchers in '{text}'.")
+
+    return matchers
+
+
+# ==============================================================================
+
+
+class MatcherIndex:
+    """Evaluates many sets of matchers against labels at once.
+
+    Every set is a list of matchers that must all match. Every set owns one
+    bit. Matchers are indexed by label name. Evaluating labels collects the
+    bits of all sets with at least one failing matcher. The labels match if
+    any set is left without its bit. Results per label name and value are
+    memoized, because the same values repeat across alerts.
+
+    Args:
+        matcher_sets (list[list[Matcher]]): Sets of matchers.
+    """
+
+    def __init__(self, matcher_sets: list[list[Matcher]]) -> None:
+        self.matcher_sets = matcher_sets
+        self.all_sets = (1 << len(matcher_sets)) - 1
+
+        self._index: dict[str, list[tuple[int, Matcher]]] = {}
+        for position, matchers in enumerate(matcher_sets):
+            for matcher in matchers:
+                self._index.setdefault(matcher.name, []).append((1 << position, matcher))
+
+        self._memo: dict[tuple[str, str], int] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.matcher_sets)
+
+    def _failed(self, name: str, value: str) -> int:
+        key = (name, value)
+        failed = self._memo.get(key)
+        if failed is None:
+            failed = 0
+            for bit, matcher in self._index[name]:
+                if not matcher.matches(value):
+                    failed |= bit
+            if len(self._memo) < 2**16:
+                self._memo[key] = failed
+        return failed
+
+    def matches(self, labels: dict[str, str]) -> bool:
+        """Does any set of matchers match the given labels?"""
+
+        failed = 0
+        for name in self._index:
+            failed |= self._failed(name, labels.get(name, ""))
+            if failed == self.all_sets:
+                return False
+        return failed != self.all_sets
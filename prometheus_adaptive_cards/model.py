@@ -1,14 +1,20 @@
 """Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
 
 from datetime import datetime
+from typing import Optional, TypedDict
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
 
 from prometheus_adaptive_cards.config import Target
+from prometheus_adaptive_cards.interning import intern_table
 
 # ==============================================================================
 
 
+def _intern_items(cls, v: dict[str, str]) -> dict[str, str]:  # noqa
+    return intern_table.intern_items(v)
+
+
 class Alert(BaseModel):
     fingerprint: str
     status: str
@@ -18,6 +24,8 @@ class Alert(BaseModel):
     labels: dict[str, str]
     annotations: dict[str, str]
 
+    _intern = validator("labels", "annotations", allow_reuse=True)(_intern_items)
+
     class Config:
         extra = "allow"
 
@@ -34,6 +42,10 @@ class AlertGroup(BaseModel):
     common_annotations: dict[str, str] = Field(alias="commonAnnotations")
     alerts: list[Alert]
 
+    _intern = validator(
+        "group_labels", "common_labels", "common_annotations", allow_reuse=True
+    )(_intern_items)
+
     class Config:
         extra = "allow"
 
@@ -41,13 +53,93 @@ class AlertGroup(BaseModel):
 # ==============================================================================
 
 
-class EnhancedAlert(Alert):
-    specific_annotations: dict[str, str]
-    specific_labels: dict[str, str]
-
-
-class EnhancedAlertGroup(AlertGroup):
-    targets: list[Target]
+class EnhancedAlert:
+    """View on a parsed alert that adds fields for templating.
+
+    Wraps the alert instead of copying it. All fields of the wrapped alert
+    (including extra fields) are available as attributes.
+    """
+
+    __slots__ = ("alert", "specific_annotations", "specific_labels")
+
+    def __init__(
+        self,
+        alert: Alert,
+        specific_annotations: dict[str, str],
+        specific_labels: dict[str, str],
+    ) -> None:
+        self.alert = alert
+        self.specific_annotations = specific_annotations
+        self.specific_labels = specific_labels
+
+    def __getattr__(self, name: str):
+        if name in EnhancedAlert.__slots__:
+            raise AttributeError(name)
+        return getattr(self.alert, name)
+
+    def __eq__(self, other) -> bool:
+        return self.dict() == (other.dict() if hasattr(other, "dict") else other)
+
+    def __repr__(self) -> str:
+        return f"EnhancedAlert({self.dict()!r})"
+
+    def dict(self) -> dict:
+        return {
+            **self.alert.dict(),
+            "specific_annotations": self.specific_annotations,
+            "specific_labels": self.specific_labels,
+        }
+
+
+class AlertSummary(TypedDict):
+    """Alerts left out of an oversized alert group."""
+
+    # Number of alerts left out.
+    omitted: int
+    # Label name to value to number of left out alerts with that value.
+    counts: dict[str, dict[str, int]]
+
+
+class EnhancedAlertGroup:
+    """View on a preprocessed alert group that adds fields for templating.
+
+    Wraps the alert group instead of copying it. All fields of the wrapped
+    alert group except `alerts` are available as attributes. `summary` is
+    only set if alerts have been left out by the `summarize` route option.
+    """
+
+    __slots__ = ("alert_group", "alerts", "targets", "summary")
+
+    def __init__(
+        self,
+        alert_group: AlertGroup,
+        alerts: list[EnhancedAlert],
+        targets: list[Target],
+        summary: Optional[AlertSummary] = None,
+    ) -> None:
+        self.alert_group = alert_group
+        self.alerts = alerts
+        self.targets = targets
+        self.summary = summary
+
+    def __getattr__(self, name: str):
+        if name in EnhancedAlertGroup.__slots__:
+            raise AttributeError(name)
+        return getattr(self.alert_group, name)
+
+    def __eq__(self, other) -> bool:
+        return self.dict() == (other.dict() if hasattr(other, "dict") else other)
+
+    def __repr__(self) -> str:
+        return f"EnhancedAlertGroup({self.dict()!r})"
+
+    def dict(self) -> dict:
+        return {
+            **self.alert_group.dict(exclude={"alerts"}),
+            "alerts": [alert.dict() for alert in self.alerts],
+            "targets": [target.dict() for target in self.targets],
+            "summary": self.summary,
+        }
 
 
 # ==============================================================================
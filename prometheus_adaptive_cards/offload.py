@@ -0,0 +1,262 @@
+"""
+Runs preprocessing of huge alert groups in a process pool. Preprocessing is
+pure Python and holds the GIL. Thousands of alerts in a single request would
+otherwise stall every other request handled by the process.
+
+Alert groups are handed over as plain tuples instead of pickled Pydantic
+models. That keeps the serialized size and the time spent on both sides low.
+The routing settings are sent along with the first alert group of every
+version of the routing table. Workers keep them together with the compiled
+actions. Workers that missed them ask for them once.
+
+Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+from typing import Container, Optional
+
+from loguru import logger
+
+from prometheus_adaptive_cards.config import Route, Routing, Target
+from prometheus_adaptive_cards.model import (
+    Alert,
+    AlertGroup,
+    EnhancedAlert,
+    EnhancedAlertGroup,
+)
+from prometheus_adaptive_cards.preprocessing import Actions, compile_actions, preprocess
+from prometheus_adaptive_cards.routing import RoutePlan
+
+# ==============================================================================
+# Compact encoding
+
+_ALERT_FIELDS = tuple(Alert.__fields__)
+_GROUP_FIELDS = tuple(name for name in AlertGroup.__fields__ if name != "alerts")
+
+
+def _encode_model(values: dict, fields: tuple[str, ...]) -> tuple[tuple, Optional[dict]]:
+    extras = {
+        name: value
+        for name, value in values.items()
+        if name not in fields and name != "alerts"
+    }
+    return tuple(values.get(name) for name in fields), extras or None
+
+
+def encode_alert_group(alert_group: AlertGroup) -> tuple:
+    """Encodes alert group into nested tuples of plain values.
+
+    Field names are not repeated per alert, only extra fields are kept as
+    dicts. Decode with `decode_alert_group()`.
+    """
+
+    return (
+        _encode_model(alert_group.__dict__, _GROUP_FIELDS),
+        [_encode_model(alert.__dict__, _ALERT_FIELDS) for alert in alert_group.alerts],
+    )
+
+
+def decode_alert_group(encoded: tuple) -> AlertGroup:
+    """Decodes alert group encoded by `encode_alert_group()` without validation."""
+
+    (group_values, group_extras), alerts = encoded
+
+    return AlertGroup.construct(
+        **dict(zip(_GROUP_FIELDS, group_values)),
+        **(group_extras or {}),
+        alerts=[
+            Alert.construct(**dict(zip(_ALERT_FIELDS, values)), **(extras or {}))
+            for values, extras in alerts
+        ],
+    )
+
+
+def encode_enhanced_alert_group(enhanced_alert_group: EnhancedAlertGroup) -> tuple:
+    """Encodes enhanced alert group like `encode_alert_group()`.
+
+    Targets are not part of the encoding. Decode with
+    `decode_enhanced_alert_group()`.
+    """
+
+    return (
+        encode_alert_group(enhanced_alert_group.alert_group),
+        [alert.specific_annotations for alert in enhanced_alert_group.alerts],
+        [alert.specific_labels for alert in enhanced_alert_group.alerts],
+        enhanced_alert_group.summary,
+    )
+
+
+def decode_enhanced_alert_group(
+    encoded: tuple, targets: list[Target]
+) -> EnhancedAlertGroup:
+    """Decodes enhanced alert group encoded by `encode_enhanced_alert_group()`."""
+
+    encoded_alert_group, specific_annotations, specific_labels, summary = encoded
+    alert_group = decode_alert_group(encoded_alert_group)
+
+    return EnhancedAlertGroup(
+        alert_group,
+        alerts=[
+            EnhancedAlert(alert, annotations, labels)
+            for alert, annotations, labels in zip(
+                alert_group.alerts, specific_annotations, specific_labels
+            )
+        ],
+        targets=targets,
+        summary=summary,
+    )
+
+
+# Number of routing table versions a worker keeps. Requests that started
+# before a reload can still use the previous version.
+_MAX_VERSIONS = 2
+
+# Per worker process: version to routing settings and route name to route and
+# actions compiled on first use.
+_versions: dict[int, tuple[Routing, dict[str, tuple[Route, Actions]]]] = {}
+
+
+def _route_and_actions(version: int, name: str) -> Optional[tuple[Route, Actions]]:
+    entry = _versions.get(version)
+    if entry is None:
+        return None
+
+    routing, compiled = entry
+    if name not in compiled:
+        route = next(route for route in routing.routes if route.name == name)
+        compiled[name] = (route, compile_actions(routing, route))
+    return compiled[name]
+
+
+def _preprocess_encoded(
+    version: int,
+    name: str,
+    encoded: tuple,
+    specific: Container[str] = ("annotations", "labels"),
+    routing: Optional[Routing] = None,
+) -> Optional[list[tuple]]:
+    """Runs in a worker process. Returns encoded preprocessing results.
+
+    Returns `None` if the worker does not know the routing settings of the
+    given version yet. The caller then sends them along with `routing`.
+    """
+
+    if routing is not None and version not in _versions:
+        _versions[version] = (routing, {})
+        others = sorted(other for other in _versions if other != version)
+        for other in others[: len(others) - _MAX_VERSIONS + 1]:
+            del _versions[other]
+
+    route_and_actions = _route_and_actions(version, name)
+    if route_and_actions is None:
+        return None
+    route, actions = route_and_actions
+
+    return [
+        encode_enhanced_alert_group(enhanced_alert_group)
+        for enhanced_alert_group in preprocess(
+            _versions[version][0],
+            route,
+            decode_alert_group(encoded),
+            targets=[],
+            actions=actions,
+            specific=specific,
+        )
+    ]
+
+
+# ==============================================================================
+
+
+class Offloader:
+    """Preprocesses alert groups above a size threshold in a process pool.
+
+    The pool is started on first use and uses the `spawn` start method, so
+    it is safe to use from a threaded server.
+
+    Plans passed to `preprocess()` must come from the same routing table
+    holder, as workers identify the routing settings by the table version.
+
+    Args:
+        threshold (int): Minimum number of alerts for an alert group to be
+            preprocessed in the pool.
+        max_workers (Optional[int], optional): Number of worker processes. If
+            `None`, the number of CPUs is used. Defaults to `None`.
+    """
+
+    def __init__(self, threshold: int, max_workers: Optional[int] = None) -> None:
+        self.threshold = threshold
+        self.max_workers = max_workers
+
+        self._lock = Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._sent_versions: set[int] = set()
+
+    def should_offload(self, alert_group: AlertGroup) -> bool:
+        return len(alert_group.alerts) >= self.threshold
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                logger.bind(max_workers=self.max_workers).info(
+                    "Started process pool for preprocessing."
+                )
+            return self._pool
+
+    def _mark_sent(self, version: int) -> bool:
+        """Returns `True` if routing settings of the version were sent before."""
+
+        with self._lock:
+            if version in self._sent_versions:
+                return True
+            self._sent_versions.add(version)
+            others = sorted(other for other in self._sent_versions if other != version)
+            for other in others[: len(others) - _MAX_VERSIONS + 1]:
+                self._sent_versions.discard(other)
+            return False
+
+    def preprocess(
+        self,
+        plan: RoutePlan,
+        alert_group: AlertGroup,
+        targets: Optional[list[Target]] = None,
+    ) -> list[EnhancedAlertGroup]:
+        """Same as `preprocess()` but done in a worker process.
+
+        Blocks the calling thread until the result is ready, but releases the
+        GIL while waiting.
+        """
+
+        pool = self._get_pool()
+        encoded = encode_alert_group(alert_group)
+        args = (_preprocess_encoded, plan.version, plan.name, encoded, plan.specific)
+
+        if not self._mark_sent(plan.version):
+            # First request of this version handled by the pool.
+            args = (*args, plan.routing)
+
+        encoded_results = pool.submit(*args).result()
+        if encoded_results is None:
+            # First request of this version handled by another worker.
+            encoded_results = pool.submit(*args, plan.routing).result()
+
+        if targets is None:
+            targets = plan.route.targets
+
+        return [
+            decode_enhanced_alert_group(encoded, [target.copy() for target in targets])
+            for encoded in encoded_results
+        ]
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+            self._sent_versions.clear()
@@ -1,3 +1,5 @@
 """Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
 
+from .actions import Actions, apply_actions, compile_actions
 from .preprocessing import preprocess
+from .splitting import subgroup
@@ -1,196 +1,297 @@
 """Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
 
-from typing import Literal, Optional, Pattern
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, Literal, Optional, Pattern, Union
 
-from prometheus_adaptive_cards.config import Add, Override, Remove
-from prometheus_adaptive_cards.model import AlertGroup
+from prometheus_adaptive_cards.config import Route, Routing
+from prometheus_adaptive_cards.expansion import Expansion, compile_value
+from prometheus_adaptive_cards.matchers import MatcherIndex, parse_matchers
+from prometheus_adaptive_cards.model import Alert, AlertGroup
 
 # ==============================================================================
-# Remove action
+# Patterns
 
 
-def _remove(
-    target: Literal["annotations", "labels"], keys: list[str], alert_group: AlertGroup
-) -> None:
-    """Removes annotations / labels in-place from alert group.
+_NOT_COMBINABLE = re.compile(r"\\[1-9]|\\g<|\(\?P=|\(\?\(|^\(\?[aiLmsux]+\)")
+
+
+@lru_cache(maxsize=256)
+def _combine_patterns(patterns: tuple[Pattern, ...]) -> tuple[Pattern, ...]:
+    """Combines patterns into as few alternations as possible.
+
+    Patterns are grouped by flags. Patterns with backreferences, conditional
+    group references, named groups or global inline flags would change meaning
+    inside an alternation, so they are kept as they are.
 
     Args:
-        target (Literal["annotations", "labels"]): What to target.
-        keys (list[str]): Keys to remove.
-        alert_group (AlertGroup): Alert group to work with.
+        patterns (tuple[Pattern, ...]): Patterns to combine.
+
+    Returns:
+        tuple[Pattern, ...]: Patterns that match exactly if any of the given
+            patterns matches.
     """
 
-    for key in set(keys):
-        alert_group.__dict__[f"common_{target}"].pop(key, None)
-        for alert in alert_group.alerts:
-            alert.__dict__[target].pop(key, None)
+    separate = []
+    by_flags: dict[int, list[str]] = {}
 
+    for pattern in patterns:
+        if pattern.groupindex or _NOT_COMBINABLE.search(pattern.pattern):
+            separate.append(pattern)
+        else:
+            by_flags.setdefault(pattern.flags, []).append(pattern.pattern)
 
-def _remove_re(target: str, re_keys: list[Pattern], alert_group: AlertGroup) -> None:
-    """Removes annotations / labels in-place from alert group.
+    combined = []
+    for flags, sources in by_flags.items():
+        try:
+            combined.append(
+                re.compile("|".join(f"(?:{source})" for source in sources), flags)
+            )
+        except re.error:
+            separate.extend(re.compile(source, flags) for source in sources)
 
-    Args:
-        target (Literal["annotations", "labels"]): What to target.
-        re_keys (list[Pattern]): List of patterns.
-        alert_group (AlertGroup): Alert group to work with.
-    """
+    return tuple(combined + separate)
 
-    for pattern in re_keys:
-        elements = alert_group.__dict__[f"common_{target}"]
-        for element_to_pop in {e for e in elements if pattern.search(e)}:
-            elements.pop(element_to_pop)
 
-        for alert in alert_group.alerts:
-            elements = alert.__dict__[target]
-            for element_to_pop in {e for e in elements if pattern.search(e)}:
-                elements.pop(element_to_pop)
+# ==============================================================================
+# Fused actions
 
 
-def wrapped_remove(
-    a: Optional[Remove], b: Optional[Remove], alert_group: AlertGroup
-) -> None:
-    """Applies to Remove objects on alert group in-place.
+@dataclass(frozen=True)
+class TargetActions:
+    """Remove, add and override actions for either annotations or labels.
 
-    Args:
-        a (Optional[Remove]): Remove object 1.
-        b (Optional[Remove]): Remove object 2.
-        alert_group (AlertGroup): Data to mutate in-place.
+    Values of add and override that reference labels or annotations are
+    `Expansion` objects. All other values are plain strings.
     """
 
-    if a and b:
-        annotations = a.annotations + b.annotations
-        labels = a.labels + b.labels
-        re_annotations = a.re_annotations + b.re_annotations
-        re_labels = a.re_labels + b.re_labels
-    elif a:
-        annotations = a.annotations
-        labels = a.labels
-        re_annotations = a.re_annotations
-        re_labels = a.re_labels
-    elif b:
-        annotations = b.annotations
-        labels = b.labels
-        re_annotations = b.re_annotations
-        re_labels = b.re_labels
-    else:
-        return
-
-    if annotations:
-        _remove("annotations", annotations, alert_group)
-    if labels:
-        _remove("labels", labels, alert_group)
-    if re_annotations:
-        _remove_re("annotations", re_annotations, alert_group)
-    if re_labels:
-        _remove_re("labels", re_labels, alert_group)
+    remove: frozenset[str] = frozenset()
+    remove_re: tuple[Pattern, ...] = ()
+    add: dict[str, Union[str, Expansion]] = field(default_factory=dict)
+    override: dict[str, Union[str, Expansion]] = field(default_factory=dict)
 
+    def __bool__(self) -> bool:
+        return bool(self.remove or self.remove_re or self.add or self.override)
 
-# ==============================================================================
-# Add action
+    @property
+    def templated(self) -> bool:
+        return any(
+            isinstance(value, Expansion)
+            for value in (*self.add.values(), *self.override.values())
+        )
 
 
-def _add(
-    target: Literal["annotations", "labels"],
-    items: dict[str, str],
-    alert_group: AlertGroup,
-) -> None:
-    """Adds annotations / labels in-place from alert group without updating.
+@dataclass(frozen=True)
+class Actions:
+    """All actions of a route merged with the global ones.
 
-    Args:
-        target (Literal["annotations", "labels"]): What to target.
-        items (dict[str, str]): Items to add.
-        alert_group (AlertGroup): Alert group to work with.
+    Created once per route with `compile_actions()`.
     """
 
-    for name, value in items.items():
-        unique_values = set()
-        for alert in alert_group.alerts:
-            elements = alert.__dict__[target]
-            if name not in elements:
-                elements[name] = value
-                unique_values.add(value)
-            else:
-                unique_values.add(elements[name])
-        if len(unique_values) == 1 and value in unique_values:
-            alert_group.__dict__[f"common_{target}"][name] = value
+    annotations: TargetActions = TargetActions()
+    labels: TargetActions = TargetActions()
+    drop: MatcherIndex = MatcherIndex([])
 
+    @property
+    def templated(self) -> bool:
+        return self.annotations.templated or self.labels.templated
 
-def wrapped_add(a: Optional[Add], b: Optional[Add], alert_group: AlertGroup) -> None:
-    """Applies to Add objects on alert group in-place.
-
-    Args:
-        a (Optional[Add]): Add object 1.
-        b (Optional[Add]): Add object 2.
-        alert_group (AlertGroup): Data to mutate in-place.
-    """
 
+def _merge(a, b, attribute: str, empty):
     if a and b:
-        annotations = a.annotations | b.annotations
-        labels = a.labels | b.labels
+        x, y = getattr(a, attribute), getattr(b, attribute)
+        return x + y if isinstance(empty, list) else x | y
     elif a:
-        annotations = a.annotations
-        labels = a.labels
+        return getattr(a, attribute)
     elif b:
-        annotations = b.annotations
-        labels = b.labels
-    else:
-        return
+        return getattr(b, attribute)
+    return empty
 
-    if annotations:
-        _add("annotations", annotations, alert_group)
-    if labels:
-        _add("labels", labels, alert_group)
 
+def compile_actions(routing: Routing, route: Route) -> Actions:
+    """Merges global and route specific actions for `apply_actions()`.
 
-# ==============================================================================
+    Args:
+        routing (Routing): Routing related settings.
+        route (Route): Route related settings.
 
+    Returns:
+        Actions: Merged actions with combined patterns and templated values
+            compiled into expansions.
+    """
 
-def _override(
-    target: Literal["annotations", "labels"],
-    items: dict[str, str],
-    alert_group: AlertGroup,
+    def compile_values(values: dict[str, str]) -> dict[str, Union[str, Expansion]]:
+        return {name: compile_value(value) for name, value in values.items()}
+
+    def target_actions(name: str) -> TargetActions:
+        return TargetActions(
+            remove=frozenset(_merge(routing.remove, route.remove, name, [])),
+            remove_re=_combine_patterns(
+                tuple(_merge(routing.remove, route.remove, f"re_{name}", []))
+            ),
+            add=compile_values(_merge(routing.add, route.add, name, {})),
+            override=compile_values(_merge(routing.override, route.override, name, {})),
+        )
+
+    return Actions(
+        annotations=target_actions("annotations"),
+        labels=target_actions("labels"),
+        drop=MatcherIndex([parse_matchers(text) for text in routing.drop + route.drop]),
+    )
+
+
+def _matcher(
+    remove: frozenset[str], patterns: tuple[Pattern, ...]
+) -> Optional[Callable[[str], bool]]:
+    """Returns memoizing function that tells if a key is to be removed."""
+
+    if not (remove or patterns):
+        return None
+
+    memo: dict[str, bool] = {}
+
+    def matches(key: str) -> bool:
+        matched = memo.get(key)
+        if matched is None:
+            matched = memo[key] = key in remove or any(
+                pattern.search(key) for pattern in patterns
+            )
+        return matched
+
+    return matches
+
+
+def _pop_matching(elements: dict[str, str], matches: Callable[[str], bool]) -> None:
+    for element_to_pop in [e for e in elements if matches(e)]:
+        del elements[element_to_pop]
+
+
+def _expand(values: dict[str, Union[str, Expansion]], alert: Alert) -> dict[str, str]:
+    return {
+        name: (
+            value.expand(alert.labels, alert.annotations)
+            if isinstance(value, Expansion)
+            else value
+        )
+        for name, value in values.items()
+    }
+
+
+def _apply_expanded(
+    elements: dict[str, str],
+    expanded: tuple[dict[str, str], dict[str, str]],
+    added: dict[str, str],
+    overridden: dict[str, Optional[str]],
+    not_uniform: set[str],
 ) -> None:
-    """Adds and overrides annotations / labels in-place from alert group.
+    """Adds and overrides values expanded for a single alert.
 
-    Args:
-        target (Literal["annotations", "labels"]): What to target.
-        items (dict[str, str]): Items to override and add.
-        alert_group (AlertGroup): Alert group to work with.
+    Remembers the first value per name in `added` / `overridden`. Added names
+    whose value differs between alerts end up in `not_uniform`, overridden
+    ones are set to `None`.
     """
 
-    for name, value in items.items():
-        alert_group.__dict__[f"common_{target}"][name] = value
-        for alert in alert_group.alerts:
-            alert.__dict__[target][name] = value
+    add, override = expanded
+    for name, value in add.items():
+        current = elements.setdefault(name, value)
+        if current != value or added.setdefault(name, value) != value:
+            not_uniform.add(name)
+    for name, value in override.items():
+        elements[name] = value
+        if overridden.setdefault(name, value) != value:
+            overridden[name] = None
 
 
-def wrapped_override(
-    a: Optional[Override], b: Optional[Override], alert_group: AlertGroup
+def _override_common(
+    common: dict[str, str], overridden: dict[str, Optional[str]]
 ) -> None:
-    """Applies two Override objects on alert group in-place.
+    for name, value in overridden.items():
+        if value is None:
+            common.pop(name, None)
+        else:
+            common[name] = value
+
+
+def _apply_target(
+    target: Literal["annotations", "labels"],
+    actions: TargetActions,
+    alert_group: AlertGroup,
+    expanded: Optional[list[tuple[dict[str, str], dict[str, str]]]] = None,
+) -> None:
+    add = actions.add
+    override = actions.override
+    matches = _matcher(actions.remove, actions.remove_re)
+
+    # Values that become common if uniform. Filled per alert if expanded.
+    added = {} if expanded is not None else dict(add)
+    overridden = {} if expanded is not None else dict(override)
+    not_uniform: set[str] = set()
+
+    for position, alert in enumerate(alert_group.alerts):
+        elements = alert.__dict__[target]
+        if matches:
+            _pop_matching(elements, matches)
+        if expanded is not None:
+            _apply_expanded(elements, expanded[position], added, overridden, not_uniform)
+            continue
+        for name, value in add.items():
+            if elements.setdefault(name, value) != value:
+                not_uniform.add(name)
+        elements.update(override)
+
+    common = alert_group.__dict__[f"common_{target}"]
+    if matches:
+        _pop_matching(common, matches)
+    if alert_group.alerts:
+        for name, value in added.items():
+            if name not in not_uniform:
+                common[name] = value
+    _override_common(common, overridden)
+
+
+def apply_actions(actions: Actions, alert_group: AlertGroup) -> None:
+    """Applies remove, add and override in a single pass over all alerts.
+
+    Items are removed first, then added, then overridden. Added items only
+    become common if all alerts end up with the added value. Before that,
+    alerts whose labels match any of the drop matchers are dropped.
+
+    Templated values are expanded per alert against its labels and
+    annotations as they were before any action was applied. Overridden items
+    only become common if the value expanded to the same for all alerts.
 
     Args:
-        a (Optional[Override]): Override object 1.
-        b (Optional[Override]): Override object 2.
+        actions (Actions): Actions compiled with `compile_actions()`.
         alert_group (AlertGroup): Data to mutate in-place.
     """
 
-    if a and b:
-        annotations = a.annotations | b.annotations
-        labels = a.labels | b.labels
-    elif a:
-        annotations = a.annotations
-        labels = a.labels
-    elif b:
-        annotations = b.annotations
-        labels = b.labels
-    else:
-        return
-
-    if annotations:
-        _override("annotations", annotations, alert_group)
-    if labels:
-        _override("labels", labels, alert_group)
+    if actions.drop:
+        alert_group.alerts = [
+            alert
+            for alert in alert_group.alerts
+            if not actions.drop.matches(alert.labels)
+        ]
+
+    expanded = {}
+    if actions.templated:
+        for target in ("annotations", "labels"):
+            target_actions = getattr(actions, target)
+            if target_actions.templated:
+                expanded[target] = [
+                    (
+                        _expand(target_actions.add, alert),
+                        _expand(target_actions.override, alert),
+                    )
+                    for alert in alert_group.alerts
+                ]
+
+    if actions.annotations:
+        _apply_target(
+            "annotations", actions.annotations, alert_group, expanded.get("annotations")
+        )
+    if actions.labels:
+        _apply_target("labels", actions.labels, alert_group, expanded.get("labels"))
 
 
 # ==============================================================================
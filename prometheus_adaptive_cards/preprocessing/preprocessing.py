@@ -1,19 +1,31 @@
 """Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
 
-from prometheus_adaptive_cards.config import Route, Routing
+from typing import Container, Literal, Optional
+
+from loguru import logger
+
+from prometheus_adaptive_cards.config import Route, Routing, Summarize, Target
 from prometheus_adaptive_cards.model import (
     AlertGroup,
+    AlertSummary,
     EnhancedAlert,
     EnhancedAlertGroup,
 )
 
-from .actions import wrapped_add, wrapped_override, wrapped_remove
-from .splitting import split
-from .utils import add_specific
+from . import columnar
+from .actions import Actions, apply_actions, compile_actions
+from .splitting import split_with_specific
+from .summarizing import summarize
+from .utils import specific as specific_items
 
 
 def preprocess(
-    routing: Routing, route: Route, alert_group: AlertGroup
+    routing: Routing,
+    route: Route,
+    alert_group: AlertGroup,
+    targets: Optional[list[Target]] = None,
+    actions: Optional[Actions] = None,
+    specific: Container[str] = ("annotations", "labels"),
 ) -> list[EnhancedAlertGroup]:
     """Preprocess payload from Alertmanager.
 
@@ -21,35 +33,120 @@ def preprocess(
         routing (Routing): Routing related settings.
         route (Route): Route related settings.
         data (AlertGroup): Alertmanager payload.
+        targets (Optional[list[Target]], optional): Targets resolved for the
+            current request. If `None`, the targets of `route` are used.
+            Defaults to `None`.
+        actions (Optional[Actions], optional): Actions compiled from `routing`
+            and `route`. If `None`, they are compiled on the fly. Defaults to
+            `None`.
+        specific (Container[str], optional): Targets (`"annotations"`,
+            `"labels"`) to derive specific items for. Leave out targets whose
+            specific items are never rendered, they are left empty then.
+            Defaults to both.
 
     Returns:
         list[EnhancedAlertGroup]: List of one or more alert group. List will
             only contain more than one if the `split_by` feature is used.
     """
 
-    wrapped_remove(routing.remove, route.remove, alert_group)
-    wrapped_add(routing.add, route.add, alert_group)
-    wrapped_override(routing.override, route.override, alert_group)
+    if actions is None:
+        actions = compile_actions(routing, route)
+    apply_actions(actions, alert_group)
 
-    alert_groups = (
-        split(route.split_by.target, route.split_by.value, alert_group)
-        if route.split_by
-        else [alert_group]
-    )
+    if not alert_group.alerts:
+        logger.bind(route=route.name).info("All alerts have been dropped.")
+        return []
+
+    if targets is None:
+        targets = route.targets
+
+    threshold = routing.columnar_threshold
+    if not route.split_by:
+        parts = [
+            (
+                alert_group,
+                _specific(alert_group, "annotations", specific),
+                _specific(alert_group, "labels", specific),
+            )
+        ]
+    elif (
+        threshold is not None
+        and columnar.available()
+        and len(alert_group.alerts) >= threshold
+    ):
+        parts = columnar.split_columnar(
+            alert_group, route.split_by.keys, route.split_by.max_groups, specific
+        )
+    else:
+        parts = split_with_specific(
+            route.split_by.keys, alert_group, route.split_by.max_groups, specific
+        )
 
     enhanced_alert_groups = []
 
-    for alert_group in alert_groups:
-        add_specific(alert_group)
+    for alert_group, specific_annotations, specific_labels in parts:
+        summary = None
+        if route.summarize and len(alert_group.alerts) > route.summarize.max_alerts:
+            alert_group, specific_annotations, specific_labels, summary = _summarize(
+                route.summarize, alert_group, specific_annotations, specific_labels
+            )
 
         enhanced_alerts = [
-            EnhancedAlert.construct(**alert.dict()) for alert in alert_group.alerts
+            EnhancedAlert(alert, annotations, labels)
+            for alert, annotations, labels in zip(
+                alert_group.alerts, specific_annotations, specific_labels
+            )
         ]
-        del alert_group.alerts
 
-        enhanced_alert_group = EnhancedAlertGroup.construct(**alert_group.dict())
-        enhanced_alert_group.alerts = enhanced_alerts
-        enhanced_alert_group.targets = [target.copy() for target in route.targets]
-        enhanced_alert_groups.append(enhanced_alert_group)
+        enhanced_alert_groups.append(
+            EnhancedAlertGroup(
+                alert_group,
+                alerts=enhanced_alerts,
+                targets=[target.copy() for target in targets],
+                summary=summary,
+            )
+        )
 
     return enhanced_alert_groups
+
+
+def _summarize(
+    settings: Summarize,
+    alert_group: AlertGroup,
+    specific_annotations: list[dict[str, str]],
+    specific_labels: list[dict[str, str]],
+) -> tuple[AlertGroup, list[dict[str, str]], list[dict[str, str]], AlertSummary]:
+    """Keeps only the top alerts of the group. Common items stay as they are."""
+
+    rows, summary = summarize(settings, alert_group.alerts)
+
+    logger.bind(kept=len(rows), omitted=summary["omitted"]).debug(
+        "Summarized oversized alert group."
+    )
+
+    alerts = alert_group.alerts
+    alert_group = alert_group.copy()
+    alert_group.alerts = [alerts[row] for row in rows]
+
+    return (
+        alert_group,
+        [specific_annotations[row] for row in rows],
+        [specific_labels[row] for row in rows],
+        summary,
+    )
+
+
+def _specific(
+    alert_group: AlertGroup,
+    target: Literal["annotations", "labels"],
+    specific: Container[str],
+) -> list[dict[str, str]]:
+    """Returns specific items of target per alert. Empty if not in `specific`."""
+
+    if target not in specific:
+        return [{} for _ in alert_group.alerts]
+
+    common = alert_group.__dict__[f"common_{target}"]
+    return [
+        specific_items(alert.__dict__[target], common) for alert in alert_group.alerts
+    ]
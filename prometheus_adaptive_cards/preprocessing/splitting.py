@@ -1,82 +1,169 @@
 """Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
 
-from typing import Literal
+from typing import Container, Optional
 
 from loguru import logger
 
+from prometheus_adaptive_cards.config import SplitKey
 from prometheus_adaptive_cards.model import Alert, AlertGroup
 
+from .utils import common, common_and_specific
 
-def _group_alerts(
-    target: Literal["annotations", "labels"], group_by: str, alerts: list[Alert]
+
+def _group_alerts_by_keys(
+    keys: list[SplitKey], alerts: list[Alert], max_groups: Optional[int] = None
 ) -> list[list[Alert]]:
-    """Creates a list with lists of alerts grouped by target value.
+    """Groups alerts by the values of multiple keys in a single pass.
 
     Args:
-        target (Literal["annotations", "labels"]): What to target?
-        group_by (str): Name to group by (either annotatation or label name).
-        alerts (list[dict]): Alerts to group by target. Not mutated.
+        keys (list[SplitKey]): Keys to group by.
+        alerts (list[Alert]): Alerts to group. Not mutated.
+        max_groups (Optional[int], optional): Maximum number of groups with
+            values. Alerts that would create more groups are collected in a
+            single overflow group. Defaults to `None`.
 
     Returns:
-        list[list[Alert]]: A list that contains lists that contain alerts.
+        list[list[Alert]]: Alerts that have none of the keys, then one list
+            per combination of values in order of first appearance, then the
+            overflow. Empty lists are left out.
     """
 
-    alerts_without_target = []
-    alerts_grouped_by_value = {}
-
     if len(alerts) == 1:
         return [alerts]
 
-    for alert in alerts:
-        targets = alert.__dict__[target]
-        if group_by in targets:
-            value = targets[group_by]
-            if alerts_grouped_by_value.get(value):
-                alerts_grouped_by_value[value].append(alert)
-            else:
-                alerts_grouped_by_value[value] = [alert]
-        else:
-            alerts_without_target.append(alert)
-
-    return [alerts_without_target] + list(alerts_grouped_by_value.values())
+    names = [(f"{key.target}s", key.value) for key in keys]
+    missing = (None,) * len(names)
 
+    alerts_without_keys = []
+    alerts_grouped_by_values: dict[tuple, list[Alert]] = {}
+    overflow = []
 
-def _create_alert_group(base: AlertGroup, alerts: list[Alert]) -> AlertGroup:
+    for alert in alerts:
+        values = tuple(alert.__dict__[target].get(name) for target, name in names)
+        if values == missing:
+            alerts_without_keys.append(alert)
+            continue
+        group = alerts_grouped_by_values.get(values)
+        if group is None:
+            if max_groups is not None and len(alerts_grouped_by_values) >= max_groups:
+                overflow.append(alert)
+                continue
+            group = alerts_grouped_by_values[values] = []
+        group.append(alert)
+
+    if overflow:
+        logger.bind(max_groups=max_groups, overflow=len(overflow)).warning(
+            "Too many groups while splitting. Put remaining alerts into overflow group."
+        )
+
+    groups = [alerts_without_keys, *alerts_grouped_by_values.values(), overflow]
+    return [group for group in groups if group]
+
+
+def _create_alert_group(
+    base: AlertGroup,
+    alerts: list[Alert],
+    common_annotations: Optional[dict[str, str]] = None,
+    common_labels: Optional[dict[str, str]] = None,
+) -> AlertGroup:
     base = base.copy()
     base.alerts = alerts
 
-    if len(alerts) > 1:
-        list_of_sets_of_keys = [set(alert.annotations.keys()) for alert in alerts]
-        common_keys = set.intersection(*list_of_sets_of_keys)
-        for common_key in list(common_keys):
-            values = {alert.annotations[common_key] for alert in alerts}
-            if len(values) > 1:
-                common_keys.remove(common_key)
-        base.common_annotations = {key: alerts[0].annotations[key] for key in common_keys}
-    else:
-        base.common_annotations = alerts[0].annotations
-
-    if len(alerts) > 1:
-        list_of_sets_of_keys = [set(alert.labels.keys()) for alert in alerts]
-        common_keys = set.intersection(*list_of_sets_of_keys)
-        for common_key in list(common_keys):
-            values = {alert.labels[common_key] for alert in alerts}
-            if len(values) > 1:
-                common_keys.remove(common_key)
-        base.common_labels = {key: alerts[0].labels[key] for key in common_keys}
-    else:
-        base.common_labels = alerts[0].labels
-
-    for key in list(base.group_labels.keys()):
-        if key not in base.common_labels:
-            del base.group_labels[key]
+    if common_annotations is None:
+        common_annotations = common([alert.annotations for alert in alerts])
+    base.common_annotations = common_annotations
+
+    if common_labels is None:
+        common_labels = common([alert.labels for alert in alerts])
+    base.common_labels = common_labels
+
+    # Group labels are shared with the original alert group, so never mutate.
+    base.group_labels = {
+        key: value
+        for key, value in base.group_labels.items()
+        if key in base.common_labels
+    }
 
     return base
 
 
-def split(
-    target: Literal["annotation", "label"], by: str, alert_group: AlertGroup
-) -> list[AlertGroup]:
-    logger.bind(target=target, by=by).debug("Try to split given alert group.")
-    grouped_alerts = _group_alerts(f"{target}s", by, alert_group.alerts)
-    return [_create_alert_group(alert_group, alerts) for alerts in grouped_alerts]
+def subgroup(
+    base: AlertGroup,
+    alerts: list[Alert],
+    common_annotations: Optional[dict[str, str]] = None,
+    common_labels: Optional[dict[str, str]] = None,
+) -> AlertGroup:
+    """Creates alert group with some alerts of base.
+
+    Args:
+        base (AlertGroup): Alert group the alerts belong to. Not mutated.
+        alerts (list[Alert]): Alerts of the new alert group. Not empty.
+        common_annotations (Optional[dict[str, str]], optional): Common
+            annotations of `alerts` if already known. Recomputed if `None`.
+            Defaults to `None`.
+        common_labels (Optional[dict[str, str]], optional): Common labels of
+            `alerts` if already known. Recomputed if `None`. Defaults to `None`.
+
+    Returns:
+        AlertGroup: New alert group.
+    """
+
+    return _create_alert_group(base, alerts, common_annotations, common_labels)
+
+
+def _common_and_specific(
+    items: list[dict[str, str]], with_specific: bool
+) -> tuple[dict[str, str], list[dict[str, str]]]:
+    if with_specific:
+        return common_and_specific(items)
+    return common(items), [{} for _ in items]
+
+
+def split_with_specific(
+    keys: list[SplitKey],
+    alert_group: AlertGroup,
+    max_groups: Optional[int] = None,
+    specific: Container[str] = ("annotations", "labels"),
+) -> list[tuple[AlertGroup, list[dict[str, str]], list[dict[str, str]]]]:
+    """Splits alert group and derives specific items per alert.
+
+    Common and specific items of every resulting group are computed together
+    in a single pass.
+
+    Args:
+        keys (list[SplitKey]): Keys to split by.
+        alert_group (AlertGroup): Alert group to split. Not mutated.
+        max_groups (Optional[int], optional): Maximum number of groups with
+            values before the overflow group is used. Defaults to `None`.
+        specific (Container[str], optional): Targets (`"annotations"`,
+            `"labels"`) to derive specific items for. Specific items of other
+            targets are left empty. Defaults to both.
+
+    Returns:
+        list[tuple[AlertGroup, list[dict[str, str]], list[dict[str, str]]]]:
+            Per resulting alert group the group itself, specific annotations
+            and specific labels of its alerts.
+    """
+
+    logger.bind(keys=[key.dict() for key in keys]).debug("Try to split alert group.")
+
+    results = []
+
+    for alerts in _group_alerts_by_keys(keys, alert_group.alerts, max_groups):
+        common_annotations, specific_annotations = _common_and_specific(
+            [alert.annotations for alert in alerts], "annotations" in specific
+        )
+        common_labels, specific_labels = _common_and_specific(
+            [alert.labels for alert in alerts], "labels" in specific
+        )
+        results.append(
+            (
+                _create_alert_group(
+                    alert_group, alerts, common_annotations, common_labels
+                ),
+                specific_annotations,
+                specific_labels,
+            )
+        )
+
+    return results
@@ -0,0 +1,104 @@
+"""
+Summaries of oversized alert groups. Only the top alerts by a configurable
+order are kept. They are selected with a heap in `O(n log k)` instead of
+sorting all alerts. The remaining alerts are reduced to counts per value of
+the chosen labels, computed in a single pass.
+
+Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0
+"""
+
+import heapq
+from typing import Any, Callable
+
+from prometheus_adaptive_cards.config import OrderKey, Summarize
+from prometheus_adaptive_cards.model import Alert, AlertSummary
+
+
+class _Descending:
+    """Wraps a value to invert its order."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any) -> None:
+        self.value = value
+
+    def __lt__(self, other: "_Descending") -> bool:
+        return other.value < self.value
+
+    def __eq__(self, other) -> bool:
+        return self.value == other.value
+
+
+def _getter(key: OrderKey) -> Callable[[Alert], tuple]:
+    """Returns function that creates the part of the sort key for `key`.
+
+    Ranked values come first in order of the ranking, then all other values
+    in their natural order. Alerts without the item always come last.
+    """
+
+    descending = key.descending
+
+    if key.target == "starts_at":
+        if descending:
+            return lambda alert: (0, _Descending(alert.starts_at))
+        return lambda alert: (0, alert.starts_at)
+
+    target = f"{key.target}s"
+    name = key.value
+    ranking = {value: rank for rank, value in enumerate(key.ranking)}
+
+    def get(alert: Alert) -> tuple:
+        value = alert.__dict__[target].get(name)
+        if value is None:
+            return (1,)
+        rank = ranking.get(value)
+        element = (0, rank) if rank is not None else (1, value)
+        return (0, _Descending(element) if descending else element)
+
+    return get
+
+
+def sort_key(order_by: list[OrderKey]) -> Callable[[Alert], tuple]:
+    """Returns function that creates the sort key of an alert."""
+
+    getters = [_getter(key) for key in order_by]
+    return lambda alert: tuple(get(alert) for get in getters)
+
+
+def summarize(settings: Summarize, alerts: list[Alert]) -> tuple[list[int], AlertSummary]:
+    """Selects the top alerts and summarizes the remaining ones.
+
+    Args:
+        settings (Summarize): Summary related settings of the route.
+        alerts (list[Alert]): Alerts to select from. Not mutated.
+
+    Returns:
+        tuple[list[int], AlertSummary]: Positions of the selected alerts in
+            `alerts`, in order, and the summary of all other alerts. Ties
+            keep the original order of the alerts.
+    """
+
+    key = sort_key(settings.order_by)
+    selected = heapq.nsmallest(
+        settings.max_alerts, range(len(alerts)), key=lambda row: key(alerts[row])
+    )
+
+    counts: dict[str, dict[str, int]] = {name: {} for name in settings.count_by}
+    kept = set(selected)
+
+    for row, alert in enumerate(alerts):
+        if row in kept:
+            continue
+        labels = alert.labels
+        for name, values in counts.items():
+            value = labels.get(name)
+            if value is not None:
+                values[value] = values.get(value, 0) + 1
+
+    return selected, AlertSummary(
+        omitted=len(alerts) - len(selected),
+        counts={
+            name: dict(sorted(values.items(), key=lambda item: -item[1]))
+            for name, values in counts.items()
+        },
+    )
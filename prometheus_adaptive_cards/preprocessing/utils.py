@@ -1,18 +1,98 @@
 """Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
 
-from prometheus_adaptive_cards.model import AlertGroup
+_MISSING = object()
 
 
-def add_specific(alert_group: AlertGroup) -> None:
-    alerts = alert_group.alerts
+def specific(items: dict[str, str], common: dict[str, str]) -> dict[str, str]:
+    """Returns all items whose name is not part of the common items.
 
-    for alert in alerts:
-        alert.specific_annotations = {
-            name: alert.annotations[name]
-            for name in set(alert.annotations) - set(alert_group.common_annotations)
-        }
+    Args:
+        items (dict[str, str]): Annotations / labels of a single alert.
+        common (dict[str, str]): Common annotations / labels of the group.
 
-        alert.specific_labels = {
-            name: alert.labels[name]
-            for name in set(alert.labels) - set(alert_group.common_labels)
-        }
+    Returns:
+        dict[str, str]: New dict with the specific items.
+    """
+
+    return {name: value for name, value in items.items() if name not in common}
+
+
+def common(items: list[dict[str, str]]) -> dict[str, str]:
+    """Computes the items all alerts have in common.
+
+    Same as the first result of `common_and_specific()` without creating any
+    specific items.
+
+    Args:
+        items (list[dict[str, str]]): Annotations / labels of all alerts.
+
+    Returns:
+        dict[str, str]: Items all alerts have in common.
+    """
+
+    if not items:
+        return {}
+
+    candidates = dict(items[0])
+
+    for index in range(1, len(items)):
+        if not candidates:
+            break
+        current = items[index]
+        evicted = [
+            name
+            for name, value in candidates.items()
+            if current.get(name, _MISSING) != value
+        ]
+        for name in evicted:
+            del candidates[name]
+
+    return candidates
+
+
+def common_and_specific(
+    items: list[dict[str, str]],
+) -> tuple[dict[str, str], list[dict[str, str]]]:
+    """Computes common and specific items in a single pass.
+
+    Keeps a dict of candidates for common items that shrinks whenever an
+    alert has a different value or lacks the name. Evicted names are moved
+    into the specific items of the alerts already seen. Nothing is allocated
+    per alert except for the resulting dicts.
+
+    Args:
+        items (list[dict[str, str]]): Annotations / labels of all alerts.
+
+    Returns:
+        tuple[dict[str, str], list[dict[str, str]]]: Items all alerts have in
+            common and per alert the items that are not common.
+    """
+
+    if not items:
+        return {}, []
+
+    candidates = dict(items[0])
+    specifics: list[dict[str, str]] = [{}]
+
+    for index in range(1, len(items)):
+        current = items[index]
+        evicted = None
+
+        for name, value in candidates.items():
+            other = current.get(name, _MISSING)
+            if other is not value and other != value:
+                if evicted is None:
+                    evicted = []
+                evicted.append(name)
+
+        if evicted:
+            for name in evicted:
+                del candidates[name]
+                for seen in range(index):
+                    specifics[seen][name] = items[seen][name]
+
+        specifics.append(
+            {name: value for name, value in current.items() if name not in candidates}
+        )
+
+    return candidates, specifics
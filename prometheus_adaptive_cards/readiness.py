@@ -0,0 +1,94 @@
+"""
+Readiness of PromAC based on cheap counters that reflect saturation. Used by
+the `/ready` endpoint so that load balancers can shift traffic away from busy
+replicas before latency spikes.
+
+Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0
+"""
+
+import asyncio
+from contextlib import contextmanager
+from threading import Lock
+from typing import Iterator
+
+from prometheus_adaptive_cards.config import Readiness
+from prometheus_adaptive_cards.distribution import DeliveryTracker
+
+
+class ReadinessProbe:
+    """Collects saturation signals and compares them with thresholds.
+
+    Args:
+        readiness (Readiness): Thresholds. Unset thresholds are not checked.
+        deliveries (DeliveryTracker): Source for delivery related counters.
+    """
+
+    def __init__(self, readiness: Readiness, deliveries: DeliveryTracker) -> None:
+        self.readiness = readiness
+        self.deliveries = deliveries
+
+        self.requests_in_flight = 0
+        self.event_loop_lag = 0.0
+
+        self._lock = Lock()
+
+    @contextmanager
+    def track_request(self) -> Iterator[None]:
+        """Counts a request while it is in flight."""
+
+        with self._lock:
+            self.requests_in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.requests_in_flight -= 1
+
+    async def monitor_event_loop(self) -> None:
+        """Measures event loop lag forever. Run it as a background task.
+
+        The lag is the time a sleep takes longer than requested. A blocked
+        event loop delays every request handled by it.
+        """
+
+        loop = asyncio.get_running_loop()
+        interval = self.readiness.lag_probe_interval
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            self.event_loop_lag = max(0.0, loop.time() - start - interval)
+
+    def check(self) -> tuple[bool, dict]:
+        """Checks all signals against their thresholds.
+
+        Returns:
+            tuple[bool, dict]: Whether PromAC is ready and a status with all
+                signals plus the names of the exceeded thresholds.
+        """
+
+        status = {
+            "accepting": self.deliveries.accepting,
+            "requests_in_flight": self.requests_in_flight,
+            "pending_deliveries": self.deliveries.pending,
+            "oldest_pending_seconds": self.deliveries.oldest_pending_age(),
+            "event_loop_lag_seconds": self.event_loop_lag,
+        }
+
+        limits = {
+            "requests_in_flight": self.readiness.max_requests_in_flight,
+            "pending_deliveries": self.readiness.max_pending_deliveries,
+            "oldest_pending_seconds": self.readiness.max_oldest_pending_seconds,
+            "event_loop_lag_seconds": self.readiness.max_event_loop_lag_seconds,
+        }
+
+        exceeded = [
+            name
+            for name, limit in limits.items()
+            if limit is not None and status[name] > limit
+        ]
+
+        status["exceeded"] = exceeded
+        ready = status["accepting"] and not exceeded
+        status["ready"] = ready
+
+        return ready, status
@@ -0,0 +1,5 @@
+"""Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
+
+from .dispatch import Dispatcher
+from .reload import Reloader
+from .table import RoutePlan, RoutingTable, RoutingTableHolder, compile_routing_table
@@ -0,0 +1,110 @@
+"""
+Content-based routing. Picks the routes for every alert of a group based on
+the `matchers` of the routes, so that a single Alertmanager receiver can feed
+many routes. An inverted index from label name and value to routes keeps the
+number of routes that must be evaluated per alert small.
+
+Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0
+"""
+
+from typing import Optional
+
+from prometheus_adaptive_cards.matchers import Matcher, MatcherIndex, parse_matchers
+from prometheus_adaptive_cards.model import Alert, AlertGroup
+from prometheus_adaptive_cards.preprocessing import subgroup
+
+# ==============================================================================
+
+
+class Dispatcher:
+    """Selects routes for alerts by their labels.
+
+    For every matcher set of a route one equality matcher is picked as anchor
+    and the route is put into the index under the anchor's name and value.
+    Only routes found in the index for the labels of an alert plus routes
+    without any anchor are evaluated completely.
+
+    Args:
+        routes (dict[str, list[str]]): Route name to matchers of the route.
+            Routes without matchers are never selected.
+    """
+
+    def __init__(self, routes: dict[str, list[str]]) -> None:
+        self.names: list[str] = []
+        self.indexes: list[MatcherIndex] = []
+
+        self._index: dict[tuple[str, str], int] = {}
+        self._always = 0
+
+        for name, texts in routes.items():
+            if not texts:
+                continue
+            matcher_sets = [parse_matchers(text) for text in texts]
+            bit = 1 << len(self.names)
+            self.names.append(name)
+            self.indexes.append(MatcherIndex(matcher_sets))
+
+            for matchers in matcher_sets:
+                anchor = _anchor(matchers)
+                if anchor is None:
+                    self._always |= bit
+                else:
+                    key = (anchor.name, anchor.value)
+                    self._index[key] = self._index.get(key, 0) | bit
+
+    def __bool__(self) -> bool:
+        return bool(self.names)
+
+    def select(self, labels: dict[str, str]) -> list[str]:
+        """Returns names of all routes whose matchers match the labels."""
+
+        candidates = self._always
+        index = self._index
+        for item in labels.items():
+            candidates |= index.get(item, 0)
+
+        selected = []
+        position = 0
+        while candidates:
+            if candidates & 1 and self.indexes[position].matches(labels):
+                selected.append(self.names[position])
+            candidates >>= 1
+            position += 1
+
+        return selected
+
+    def dispatch(self, alert_group: AlertGroup) -> dict[str, AlertGroup]:
+        """Splits alert group into one alert group per selected route.
+
+        Alerts selected by multiple routes are copied, so that every route can
+        mutate its alert group independently.
+
+        Args:
+            alert_group (AlertGroup): Alert group to dispatch. Not mutated.
+
+        Returns:
+            dict[str, AlertGroup]: Route name to alert group with the alerts
+                selected for the route. Routes without alerts are left out.
+        """
+
+        alerts_per_route: dict[str, list[Alert]] = {}
+
+        for alert in alert_group.alerts:
+            for position, name in enumerate(self.select(alert.labels)):
+                alerts_per_route.setdefault(name, []).append(
+                    alert if position == 0 else alert.copy(deep=True)
+                )
+
+        return {
+            name: subgroup(alert_group, alerts)
+            for name, alerts in alerts_per_route.items()
+        }
+
+
+def _anchor(matchers: list[Matcher]) -> Optional[Matcher]:
+    """Returns an equality matcher that requires a non-empty value or `None`."""
+
+    for matcher in matchers:
+        if matcher.op == "=" and matcher.value:
+            return matcher
+    return None
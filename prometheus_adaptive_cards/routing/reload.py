@@ -0,0 +1,141 @@
+"""
+Reloads the routing settings at runtime. Triggered by `SIGHUP` and / or by
+changes to the configuration files. All the work is done in a background
+thread, so neither the signal handler nor the request handlers are blocked.
+
+Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0
+"""
+
+import os
+import signal
+from threading import Event, Thread
+from typing import Callable, Optional
+
+from loguru import logger
+
+from prometheus_adaptive_cards.config import Routing
+
+from .table import RoutingTableHolder
+
+# ==============================================================================
+
+
+def _mtimes(paths: list[str]) -> dict[str, Optional[float]]:
+    """Returns modification time for every path or `None` if it does not exist."""
+
+    mtimes = {}
+    for path in paths:
+        try:
+            mtimes[path] = os.stat(path).st_mtime
+        except OSError:
+            mtimes[path] = None
+    return mtimes
+
+
+class Reloader:
+    """Loads new routing settings and swaps them into the holder.
+
+    Args:
+        holder (RoutingTableHolder): Holder of the routing table to replace.
+        load (Callable[[], Routing]): Parses and validates routing settings.
+            Raising any exception aborts the reload and keeps the current table.
+        watch_paths (list[str], optional): Files to watch for changes. If
+            empty, only explicit requests trigger reloads. Defaults to `[]`.
+        interval (float, optional): Seconds between checks of `watch_paths`.
+            Defaults to `5.0`.
+    """
+
+    def __init__(
+        self,
+        holder: RoutingTableHolder,
+        load: Callable[[], Routing],
+        watch_paths: list[str] = [],
+        interval: float = 5.0,
+    ) -> None:
+        self.holder = holder
+        self.load = load
+        self.watch_paths = list(watch_paths)
+        self.interval = interval
+
+        self._requested = Event()
+        self._stopped = Event()
+        self._thread: Optional[Thread] = None
+        self._mtimes = _mtimes(self.watch_paths)
+
+    def reload(self) -> bool:
+        """Loads settings and swaps in a new routing table.
+
+        Returns:
+            bool: `True` if the new table is in use.
+        """
+
+        logger.info("Reload routing settings.")
+
+        try:
+            routing = self.load()
+            self.holder.swap(routing)
+        except Exception:
+            logger.opt(exception=True).error(
+                "Reloading routing settings failed. Keep current routing table."
+            )
+            return False
+
+        return True
+
+    def request_reload(self) -> None:
+        """Requests a reload. Safe to call from signal handlers."""
+
+        self._requested.set()
+
+    def install_signal_handler(self, signum: int = signal.SIGHUP) -> None:
+        """Requests a reload whenever the process receives the given signal.
+
+        Must be called from the main thread.
+        """
+
+        signal.signal(signum, lambda *_: self.request_reload())
+        logger.bind(signal=signal.Signals(signum).name).debug(
+            "Installed signal handler for reloads."
+        )
+
+    def _files_changed(self) -> bool:
+        if not self.watch_paths:
+            return False
+
+        mtimes = _mtimes(self.watch_paths)
+        changed = mtimes != self._mtimes
+        self._mtimes = mtimes
+
+        if changed:
+            logger.bind(watch_paths=self.watch_paths).info("Config files changed.")
+
+        return changed
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            requested = self._requested.wait(
+                timeout=self.interval if self.watch_paths else None
+            )
+            if self._stopped.is_set():
+                break
+            if requested:
+                self._requested.clear()
+                self._mtimes = _mtimes(self.watch_paths)
+                self.reload()
+            elif self._files_changed():
+                self.reload()
+
+    def start(self) -> "Reloader":
+        """Starts the background thread. Returns itself."""
+
+        self._thread = Thread(target=self._run, name="promac-reloader", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stops the background thread."""
+
+        self._stopped.set()
+        self._requested.set()
+        if self._thread:
+            self._thread.join()
@@ -0,0 +1,184 @@
+"""
+Compiled, immutable view of the routing settings. Request handlers look up
+everything they need for a route in a single `RoutePlan` taken from the
+current `RoutingTable` snapshot. Reloads build a new table and swap it in.
+
+Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0
+"""
+
+from dataclasses import dataclass
+from threading import Lock
+from typing import Callable, Container, Optional
+
+from loguru import logger
+
+from prometheus_adaptive_cards.config import Route, Routing, Sending
+from prometheus_adaptive_cards.preprocessing import Actions, compile_actions
+
+from .dispatch import Dispatcher
+
+# Returns names of all data model fields the template of a route references
+# or `None` if that is unknown.
+FieldsLookup = Callable[[Route], Optional[frozenset[str]]]
+
+_SPECIFIC = frozenset(("annotations", "labels"))
+
+# ==============================================================================
+
+
+@dataclass(frozen=True)
+class RoutePlan:
+    """Everything needed to process requests for a single route.
+
+    `specific` contains the targets (`"annotations"`, `"labels"`) whose
+    specific items are referenced by the template and must be derived.
+    """
+
+    name: str
+    version: int
+    routing: Routing
+    route: Route
+    sending: Sending
+    actions: Actions
+    specific: frozenset[str] = _SPECIFIC
+
+
+@dataclass(frozen=True)
+class RoutingTable:
+    """Snapshot of all routes. Never mutated after creation."""
+
+    version: int
+    routing: Routing
+    routes: dict[str, RoutePlan]
+    dispatcher: Dispatcher
+    fields: Optional[FieldsLookup] = None
+    templates: Optional[Container[str]] = None
+
+    def get(self, name: str) -> Optional[RoutePlan]:
+        return self.routes.get(name)
+
+
+def compile_routing_table(
+    routing: Routing,
+    version: int = 1,
+    fields: Optional[FieldsLookup] = None,
+    templates: Optional[Container[str]] = None,
+) -> RoutingTable:
+    """Compiles routing settings into a routing table.
+
+    The given settings must not be mutated afterwards, the table and its plans
+    keep references to them.
+
+    Args:
+        routing (Routing): Validated routing settings.
+        version (int, optional): Version of the table. Should be increased
+            with every reload. Defaults to `1`.
+        fields (Optional[FieldsLookup], optional): Looks up the fields
+            referenced by the template of a route. Used to skip deriving
+            specific items no template renders. Kept for later reloads. If
+            `None`, everything is derived. Defaults to `None`.
+        templates (Optional[Container[str]], optional): Names of all available
+            templates. Kept for later reloads. If `None`, template names are
+            not checked. Defaults to `None`.
+
+    Returns:
+        RoutingTable: Compiled routing table.
+
+    Raises:
+        ValueError: If a route or target selects a template not in `templates`.
+    """
+
+    if templates is not None:
+        for route in routing.routes:
+            _check_templates(route, templates)
+
+    routes = {
+        route.name: RoutePlan(
+            name=route.name,
+            version=version,
+            routing=routing,
+            route=route,
+            sending=route.sending or routing.sending,
+            actions=compile_actions(routing, route),
+            specific=_specific(fields(route) if fields else None),
+        )
+        for route in routing.routes
+    }
+
+    logger.bind(version=version, routes=list(routes)).debug("Compiled routing table.")
+
+    dispatcher = Dispatcher({route.name: route.matchers for route in routing.routes})
+
+    return RoutingTable(
+        version=version,
+        routing=routing,
+        routes=routes,
+        dispatcher=dispatcher,
+        fields=fields,
+        templates=templates,
+    )
+
+
+def _check_templates(route: Route, templates: Container[str]) -> None:
+    names = [route.template] + [t.template for t in route.targets if t.template]
+    for name in names:
+        if name not in templates:
+            raise ValueError(f"Template '{name}' of route '{route.name}' does not exist.")
+
+
+def _specific(fields: Optional[frozenset[str]]) -> frozenset[str]:
+    if fields is None:
+        return _SPECIFIC
+    return frozenset(target for target in _SPECIFIC if f"specific_{target}" in fields)
+
+
+# ==============================================================================
+
+
+class RoutingTableHolder:
+    """Holds the current routing table and allows swapping it atomically.
+
+    Readers only access `current` once per request and keep working with that
+    snapshot. Reading is a single attribute access and therefore needs no
+    lock. Only writers are serialized.
+    """
+
+    def __init__(self, table: RoutingTable) -> None:
+        self._table = table
+        self._write_lock = Lock()
+        self._listeners: list[Callable[[RoutingTable], None]] = []
+
+    def add_listener(self, listener: Callable[[RoutingTable], None]) -> None:
+        """Calls `listener` with the new table after every swap."""
+
+        self._listeners.append(listener)
+
+    @property
+    def current(self) -> RoutingTable:
+        return self._table
+
+    def swap(self, routing: Routing) -> RoutingTable:
+        """Compiles a new routing table and makes it the current one.
+
+        Args:
+            routing (Routing): Validated routing settings.
+
+        Returns:
+            RoutingTable: The new routing table.
+        """
+
+        with self._write_lock:
+            table = compile_routing_table(
+                routing,
+                version=self._table.version + 1,
+                fields=self._table.fields,
+                templates=self._table.templates,
+            )
+            self._table = table
+
+        logger.bind(version=table.version).info("Swapped in new routing table.")
+
+        for listener in self._listeners:
+            listener(table)
+
+        return table
@@ -0,0 +1,172 @@
+"""
+Remembers what has been delivered for every alert group. Routes can use it to
+skip re-notifications that contain no changes or to only send the alerts that
+are new or changed their status.
+
+States of groups whose alerts have all resolved are dropped. The store is
+bounded by the number of groups and by the age of their last update.
+
+Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0
+"""
+
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Optional
+
+from prometheus_adaptive_cards.model import Alert, AlertGroup
+
+
+def alert_states(alert_group: AlertGroup) -> dict[str, str]:
+    """Returns status of every alert in the group keyed by its fingerprint."""
+
+    return {alert.fingerprint: alert.status for alert in alert_group.alerts}
+
+
+def changed_alerts(previous: dict[str, str], alert_group: AlertGroup) -> list[Alert]:
+    """Returns alerts that are new or changed their status since `previous`."""
+
+    return [
+        alert
+        for alert in alert_group.alerts
+        if previous.get(alert.fingerprint) != alert.status
+    ]
+
+
+# Number of updates after which expired and surplus rows are deleted from the
+# database.
+_PRUNE_INTERVAL = 1000
+
+
+class GroupStateStore:
+    """Last delivered alert states per group. Thread-safe.
+
+    Kept in memory. If a path is given, every update is also written to a
+    SQLite database and states missing in memory are looked up there, so
+    they survive restarts.
+
+    Putting a state in which every alert is resolved removes the group. The
+    least recently updated groups are removed once there are more than
+    `max_items`. States not updated for `max_age` seconds are treated as
+    missing and removed.
+
+    Args:
+        path (Optional[str], optional): Path to SQLite database. Created if
+            it does not exist. Defaults to `None`.
+        max_items (int, optional): Maximum number of groups. Defaults to
+            `65536`.
+        max_age (Optional[float], optional): Seconds after which states
+            expire. If `None`, states never expire. Defaults to one week.
+        clock (Callable[[], float], optional): Returns the current time in
+            seconds since the epoch. Defaults to `time.time`.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_items: int = 65536,
+        max_age: Optional[float] = 7 * 24 * 3600,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = path
+        self.max_items = max_items
+        self.max_age = max_age
+
+        self._clock = clock
+        self._lock = Lock()
+        # Key to update time and state, least recently updated first.
+        self._states: OrderedDict[str, tuple[float, dict[str, str]]] = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._updates = 0
+
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS group_state "
+                "(key TEXT PRIMARY KEY, state TEXT, updated REAL)"
+            )
+            self._prune_db()
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def _expired(self, updated: float) -> bool:
+        return self.max_age is not None and self._clock() - updated > self.max_age
+
+    def get(self, key: str) -> Optional[dict[str, str]]:
+        """Returns last delivered state or `None` if there is none."""
+
+        with self._lock:
+            entry = self._states.get(key)
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT updated, state FROM group_state WHERE key = ?", (key,)
+                ).fetchone()
+                if row:
+                    entry = (row[0], json.loads(row[1]))
+                    self._remember(key, entry)
+
+            if entry is None:
+                return None
+            if self._expired(entry[0]):
+                self._forget(key)
+                return None
+            return entry[1]
+
+    def put(self, key: str, state: dict[str, str]) -> None:
+        """Records state as delivered. Forgets the group if all are resolved."""
+
+        with self._lock:
+            if all(status == "resolved" for status in state.values()):
+                self._forget(key)
+                return
+
+            entry = (self._clock(), state)
+            self._remember(key, entry)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO group_state (key, state, updated) "
+                    "VALUES (?, ?, ?)",
+                    (key, json.dumps(state), entry[0]),
+                )
+                self._db.commit()
+                self._updates += 1
+                if self._updates % _PRUNE_INTERVAL == 0:
+                    self._prune_db()
+
+    def _remember(self, key: str, entry: tuple[float, dict[str, str]]) -> None:
+        """Keeps entry in memory. Only the database keeps evicted entries."""
+
+        self._states[key] = entry
+        self._states.move_to_end(key)
+        while len(self._states) > self.max_items:
+            self._states.popitem(last=False)
+
+    def _forget(self, key: str) -> None:
+        self._states.pop(key, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM group_state WHERE key = ?", (key,))
+            self._db.commit()
+
+    def _prune_db(self) -> None:
+        """Deletes expired rows and rows beyond `max_items` from the database."""
+
+        if self.max_age is not None:
+            self._db.execute(
+                "DELETE FROM group_state WHERE updated < ?",
+                (self._clock() - self.max_age,),
+            )
+        self._db.execute(
+            "DELETE FROM group_state WHERE key NOT IN "
+            "(SELECT key FROM group_state ORDER BY updated DESC LIMIT ?)",
+            (self.max_items,),
+        )
+        self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
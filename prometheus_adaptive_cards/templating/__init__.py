@@ -1 +1,12 @@
 """Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
+
+from .cards import TEAMS_MAX_BYTES, CardBuilder
+from .scripts import ScriptError, ScriptPool
+from .templating import (
+    TemplateEngine,
+    current_engine,
+    setup_templating,
+    template,
+    template_fields,
+    template_names,
+)
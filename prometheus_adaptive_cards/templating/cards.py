@@ -0,0 +1,224 @@
+"""
+Builds Adaptive Card messages by writing JSON straight into a byte buffer.
+No nested dict of the complete card is created. The size of the encoded card
+is known at any time, so elements that do not fit into the size limit of the
+receiver are left out and a notice about them is added instead.
+
+Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0
+"""
+
+import json
+from json.encoder import encode_basestring
+from typing import Any, Iterable, Union
+
+# Maximum size of a message posted to a Microsoft Teams incoming webhook.
+TEAMS_MAX_BYTES = 28 * 1024
+
+_PREFIX = (
+    b'{"type":"message","attachments":[{'
+    b'"contentType":"application/vnd.microsoft.card.adaptive","content":{'
+    b'"$schema":"http://adaptivecards.io/schemas/adaptive-card.json",'
+    b'"type":"AdaptiveCard","version":"1.2","body":['
+)
+_SUFFIX = b"}}]}"
+_NOTICE = "{} more items have been left out to stay below the size limit."
+
+
+def _string(value: str) -> bytes:
+    return encode_basestring(value).encode()
+
+
+def _properties(properties: dict[str, Any]) -> bytes:
+    return b"".join(
+        b"," + _string(name) + b":" + json.dumps(value, ensure_ascii=False).encode()
+        for name, value in properties.items()
+    )
+
+
+def _text_block(text: str, properties: dict[str, Any]) -> bytes:
+    return b'{"type":"TextBlock","text":' + _string(text) + _properties(properties) + b"}"
+
+
+def _notice(truncated: int) -> bytes:
+    return _text_block(_NOTICE.format(truncated), {"isSubtle": True, "wrap": True})
+
+
+class CardBuilder:
+    """Writes an Adaptive Card message as JSON bytes.
+
+    Elements are appended to the body of the card or to the innermost open
+    container. Once an element would push the card above `max_bytes`, it and
+    all following elements are left out. `build()` then adds a text block
+    that tells how many items (elements and facts) are missing. The result
+    never exceeds `max_bytes`.
+
+    Args:
+        max_bytes (int, optional): Maximum size of the encoded message.
+            Defaults to `TEAMS_MAX_BYTES`.
+
+    Raises:
+        ValueError: If not even an empty card with the notice fits into
+            `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int = TEAMS_MAX_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.truncated = 0
+
+        self._buffer = bytearray(_PREFIX)
+        self._actions = bytearray()
+        # Closing bytes of open containers, innermost last.
+        self._open: list[bytes] = []
+        # Size of everything that is still to be written by `build()`.
+        self._pending = len(b"]" + _SUFFIX)
+        # Whether the body or container on each level is still empty.
+        self._empty = [True]
+        # Open containers that have been left out.
+        self._skipped = 0
+
+        self._reserved = len(b"," + _notice(10**9))
+
+        if len(self) + self._reserved > max_bytes:
+            raise ValueError(f"Card can not be built within {max_bytes} bytes.")
+
+    def __len__(self) -> int:
+        """Size of the message if it was built now, without any notice."""
+
+        return len(self._buffer) + self._pending
+
+    def _closing(self) -> bytes:
+        if self._actions:
+            return b'],"actions":[' + bytes(self._actions) + b"]" + _SUFFIX
+        return b"]" + _SUFFIX
+
+    def _fits(self, size: int) -> bool:
+        return len(self) + size + self._reserved <= self.max_bytes
+
+    def _skip(self, count: int = 1) -> None:
+        """Counts left out items. Items in left out containers do not count."""
+
+        if not self._skipped:
+            self.truncated += count
+
+    def _append(self, element: bytes) -> bool:
+        """Appends element if it fits. Returns whether it has been appended.
+
+        Once anything has been left out, all following elements are left out
+        as well. That keeps the order of the card intact.
+        """
+
+        separator = b"" if self._empty[-1] else b","
+        if self.truncated or not self._fits(len(separator) + len(element)):
+            self._skip()
+            return False
+
+        self._buffer += separator
+        self._buffer += element
+        self._empty[-1] = False
+        return True
+
+    # ==========================================================================
+
+    def text_block(self, text: str, **properties: Any) -> "CardBuilder":
+        """Appends a `TextBlock`. Properties like `wrap=True` are added as is."""
+
+        self._append(_text_block(text, properties))
+        return self
+
+    def element(self, encoded: Union[str, bytes]) -> "CardBuilder":
+        """Appends an element that is already encoded as JSON, as it is."""
+
+        if isinstance(encoded, str):
+            encoded = encoded.encode()
+        self._append(encoded)
+        return self
+
+    def fact_set(self, facts: Iterable[tuple[str, str]]) -> "CardBuilder":
+        """Appends a `FactSet`. Facts that do not fit are left out."""
+
+        encoded = (
+            b'{"title":' + _string(title) + b',"value":' + _string(value) + b"}"
+            for title, value in facts
+        )
+
+        first = next(encoded, None)
+        if first is None:
+            return self
+        if not self._append(b'{"type":"FactSet","facts":[' + first + b"]}"):
+            self._skip(sum(1 for _ in encoded))
+            return self
+
+        # Reopen the fact list to append the remaining facts in place.
+        del self._buffer[-2:]
+        self._pending += 2
+        for fact in encoded:
+            if not self._fits(1 + len(fact)):
+                self._skip(1 + sum(1 for _ in encoded))
+                break
+            self._buffer += b","
+            self._buffer += fact
+        self._buffer += b"]}"
+        self._pending -= 2
+
+        return self
+
+    def begin_container(self, **properties: Any) -> "CardBuilder":
+        """Opens a `Container`. Following elements go into it until closed."""
+
+        if self._skipped or not self._append(
+            b'{"type":"Container"' + _properties(properties) + b',"items":['
+        ):
+            self._skipped += 1
+            return self
+
+        self._open.append(b"]}")
+        self._pending += 2
+        self._empty.append(True)
+        return self
+
+    def end_container(self) -> "CardBuilder":
+        """Closes the innermost open container."""
+
+        if self._skipped:
+            self._skipped -= 1
+            return self
+
+        self._empty.pop()
+        closing = self._open.pop()
+        self._buffer += closing
+        self._pending -= len(closing)
+        return self
+
+    def open_url(self, title: str, url: str) -> "CardBuilder":
+        """Adds an `Action.OpenUrl` to the actions of the card."""
+
+        action = (
+            b'{"type":"Action.OpenUrl","title":'
+            + _string(title)
+            + b',"url":'
+            + _string(url)
+            + b"}"
+        )
+        size = len(action) + (1 if self._actions else len(b',"actions":[]'))
+        if self.truncated or not self._fits(size):
+            self._skip()
+            return self
+
+        if self._actions:
+            self._actions += b","
+        self._actions += action
+        self._pending += size
+        return self
+
+    def build(self) -> bytes:
+        """Closes all open containers and returns the encoded message."""
+
+        while self._skipped or self._open:
+            self.end_container()
+
+        if self.truncated:
+            if not self._empty[-1]:
+                self._buffer += b","
+            self._buffer += _notice(self.truncated)
+
+        return bytes(self._buffer + self._closing())
@@ -0,0 +1,220 @@
+"""
+Python script templates. A script is a Python file that defines
+`render(data) -> dict | bytes`, where `data` is the preprocessed alert group
+and the returned dict or JSON bytes are the payload. Scripts can use
+`CardBuilder` to write the payload straight into bytes.
+
+Scripts run in a pool of worker processes that is started together with the
+engine. Every worker loads all scripts once. Renders are limited in CPU time,
+wall time and memory, so a slow or runaway script fails its render instead of
+stalling the server. Alert groups are handed over in the compact encoding
+also used for offloading preprocessing.
+
+Exceeded time limits raise an exception that does not derive from
+`Exception`, so scripts do not swallow it by accident. Workers that still
+keep running are killed: the operating system stops workers that use far
+more CPU time than allowed, and the pool is replaced if a worker does not
+respond in time.
+
+The limits protect the server from mistakes, not from malicious scripts.
+Scripts can do anything the PromAC process can do.
+
+Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0
+"""
+
+import math
+import multiprocessing
+import resource
+import runpy
+import signal
+from multiprocessing.pool import Pool
+from threading import Lock
+from typing import Callable, Optional, Union
+
+from loguru import logger
+
+from prometheus_adaptive_cards.config import Target
+from prometheus_adaptive_cards.model import EnhancedAlertGroup
+from prometheus_adaptive_cards.offload import (
+    decode_enhanced_alert_group,
+    encode_enhanced_alert_group,
+)
+
+
+class ScriptError(Exception):
+    """Rendering with a script failed or exceeded a limit."""
+
+
+# ==============================================================================
+# Worker process
+
+# Seconds of CPU time on top of the limit of a render before the operating
+# system kills a worker whose script swallowed `_LimitExceeded`.
+_CPU_GRACE = 1
+
+_scripts: dict[str, Callable[[EnhancedAlertGroup], Union[dict, bytes]]] = {}
+
+
+class _LimitExceeded(BaseException):
+    """Raised in workers by the timers. Not caught by `except Exception`."""
+
+
+def _on_timer(signum, frame):
+    kind = "CPU" if signum == signal.SIGPROF else "wall"
+    raise _LimitExceeded(f"Script exceeded {kind} time limit.")
+
+
+def _limit_cpu(cpu_time: float) -> None:
+    """Makes the OS kill the worker once the render exceeds `cpu_time` by far."""
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = math.ceil(usage.ru_utime + usage.ru_stime + cpu_time) + _CPU_GRACE
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _init_worker(paths: dict[str, str], max_memory: Optional[int]) -> None:
+    """Loads all scripts and sets up limits. Runs once per worker."""
+
+    for name, path in paths.items():
+        _scripts[name] = runpy.run_path(path, run_name=f"promac_script_{name}")["render"]
+
+    signal.signal(signal.SIGPROF, _on_timer)
+    signal.signal(signal.SIGALRM, _on_timer)
+
+    if max_memory is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (max_memory, max_memory))
+
+
+def _render_encoded(
+    name: str, encoded: tuple, cpu_time: float, wall_time: float
+) -> Union[dict, bytes]:
+    """Runs in a worker process. Renders with the script within the limits."""
+
+    data = decode_enhanced_alert_group(
+        encoded[0], [Target.construct(**t) for t in encoded[1]]
+    )
+
+    _limit_cpu(cpu_time)
+    signal.setitimer(signal.ITIMER_PROF, cpu_time)
+    signal.setitimer(signal.ITIMER_REAL, wall_time)
+    try:
+        try:
+            return _scripts[name](data)
+        finally:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    except _LimitExceeded as e:
+        raise ScriptError(str(e)) from None
+    except MemoryError:
+        raise ScriptError("Script exceeded memory limit.") from None
+
+
+# ==============================================================================
+
+
+class ScriptPool:
+    """Renders alert groups with Python scripts in worker processes.
+
+    All workers are started and load all scripts on creation. Workers that
+    die are replaced by the pool. If a worker does not respond in time, the
+    whole pool is terminated and replaced, failing other renders in flight.
+
+    Args:
+        paths (dict[str, str]): Script name to path of the script.
+        workers (int, optional): Number of worker processes. Defaults to `2`.
+        cpu_time (float, optional): CPU seconds a single render may use.
+            Defaults to `1.0`.
+        wall_time (float, optional): Seconds a single render may take.
+            Defaults to `5.0`.
+        max_memory (Optional[int], optional): Address space limit of every
+            worker process in bytes. Defaults to `512 * 2**20`.
+
+    Raises:
+        SyntaxError: If any script is invalid.
+    """
+
+    def __init__(
+        self,
+        paths: dict[str, str],
+        workers: int = 2,
+        cpu_time: float = 1.0,
+        wall_time: float = 5.0,
+        max_memory: Optional[int] = 512 * 2**20,
+    ) -> None:
+        self.paths = paths
+        self.workers = workers
+        self.cpu_time = cpu_time
+        self.wall_time = wall_time
+        self.max_memory = max_memory
+
+        # Fail at startup and not only in the workers.
+        for path in paths.values():
+            with open(path) as f:
+                compile(f.read(), path, "exec")
+
+        self._lock = Lock()
+        self._pool: Optional[Pool] = self._start()
+
+    def _start(self) -> Pool:
+        pool = multiprocessing.get_context("spawn").Pool(
+            processes=self.workers,
+            initializer=_init_worker,
+            initargs=(self.paths, self.max_memory),
+        )
+        logger.bind(scripts=sorted(self.paths), workers=self.workers).info(
+            "Started worker processes for script templates."
+        )
+        return pool
+
+    def _replace(self, pool: Pool) -> None:
+        """Replaces pool with stuck worker unless that already happened."""
+
+        with self._lock:
+            if self._pool is not pool:
+                return
+            pool.terminate()
+            self._pool = self._start()
+
+        logger.warning("Replaced worker processes after a worker did not respond.")
+
+    def render(
+        self, name: str, enhanced_alert_group: EnhancedAlertGroup
+    ) -> Union[dict, bytes]:
+        """Renders alert group with the given script.
+
+        Raises:
+            ScriptError: If the script failed, exceeded a limit or the worker
+                did not respond in time.
+        """
+
+        encoded = (
+            encode_enhanced_alert_group(enhanced_alert_group),
+            [target.dict() for target in enhanced_alert_group.targets],
+        )
+        pool = self._pool
+        result = pool.apply_async(
+            _render_encoded, (name, encoded, self.cpu_time, self.wall_time)
+        )
+
+        try:
+            # The worker enforces the limits. Only a worker that died or is
+            # stuck never answers, so give it a little slack.
+            return result.get(timeout=self.wall_time + 1)
+        except multiprocessing.TimeoutError:
+            self._replace(pool)
+            raise ScriptError(
+                f"Worker did not respond while rendering '{name}'."
+            ) from None
+        except ScriptError:
+            raise
+        except Exception as e:
+            raise ScriptError(f"Script '{name}' failed: {e!r}") from e
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool = None
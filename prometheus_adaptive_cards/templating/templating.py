@@ -0,0 +1,412 @@
+"""
+Renders preprocessed alert groups into payloads with Jinja2 templates. All
+templates are loaded and compiled once at startup. Compiled bytecode can be
+kept on disk, so restarts skip parsing and compiling the templates.
+
+Templates are looked up by name without the `.json.j2` extension in the
+configured directories first and in the built-in templates second. Every
+template renders JSON with the data to render available as `data`. The
+rendered JSON is used as payload as it is. Templates can build cards with
+`CardBuilder` to stay below the size limit of Microsoft Teams.
+
+Templates can also be Python scripts named `<name>.py` in the configured
+directories. They are run in worker processes, see `scripts`.
+
+Targets can select their own template, for example to render the same alert
+group for Microsoft Teams and Slack. Every distinct template is rendered once
+per alert group and the payload is shared by all targets that use it.
+
+A template can come with a fragment template named `<name>.alert` in the same
+directory that renders the section of a single alert. Rendered fragments are
+cached per alert, so alerts that did not change since the last notification
+are not rendered again.
+
+Templates are analyzed once to find the fields of the data model they
+reference. Preprocessing skips deriving fields no template renders.
+
+Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0
+"""
+
+import itertools
+import json
+import os
+from typing import Callable, Hashable, Optional, Union
+
+from jinja2 import (
+    ChoiceLoader,
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    Template,
+    nodes,
+)
+from loguru import logger
+
+from prometheus_adaptive_cards.cache import LRUCache
+from prometheus_adaptive_cards.config import Scripts, Target, Templating
+from prometheus_adaptive_cards.distribution import Payload
+from prometheus_adaptive_cards.model import EnhancedAlert, EnhancedAlertGroup
+
+from .cards import CardBuilder
+from .scripts import ScriptPool
+
+BUILTIN_DIR = os.path.join(os.path.dirname(__file__), "templates")
+EXTENSION = ".json.j2"
+ERROR_TEMPLATE = "error"
+FRAGMENT_SUFFIX = ".alert"
+
+_versions = itertools.count()
+
+# Accessing any of these exposes all fields at once.
+_OPAQUE = {"dict", "__dict__", "alert", "alert_group"}
+
+# ==============================================================================
+
+
+class TemplateEngine:
+    """Loads, compiles and renders templates. Thread-safe after creation.
+
+    Args:
+        directories (list[str], optional): Directories with custom templates.
+            Take precedence over built-in templates with the same name.
+            Defaults to `[]`.
+        bytecode_cache_dir (Optional[str], optional): Directory to keep
+            compiled templates in. Created if it does not exist. If `None`,
+            templates are compiled on every start. Defaults to `None`.
+        fragment_cache (Optional[LRUCache], optional): Cache for rendered
+            fragments. If `None`, fragments are rendered every time. Defaults
+            to `None`.
+        scripts (Scripts, optional): Limits for script templates. Worker
+            processes are only started if there are any scripts. Defaults to
+            `Scripts()`.
+
+    Raises:
+        jinja2.TemplateSyntaxError: If any template is invalid.
+        SyntaxError: If any script is invalid.
+    """
+
+    def __init__(
+        self,
+        directories: list[str] = [],
+        bytecode_cache_dir: Optional[str] = None,
+        fragment_cache: Optional[LRUCache] = None,
+        scripts: Scripts = Scripts(),
+    ) -> None:
+        # Part of fragment cache keys. Fragments cached by other engines with
+        # possibly different templates are never used.
+        self.version = next(_versions)
+        self.fragment_cache = fragment_cache
+
+        bytecode_cache = None
+        if bytecode_cache_dir:
+            os.makedirs(bytecode_cache_dir, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(bytecode_cache_dir)
+
+        self.environment = Environment(
+            loader=ChoiceLoader(
+                [FileSystemLoader(directories), FileSystemLoader(BUILTIN_DIR)]
+            ),
+            bytecode_cache=bytecode_cache,
+            auto_reload=False,
+            cache_size=-1,
+            trim_blocks=True,
+            lstrip_blocks=True,
+            extensions=["jinja2.ext.do"],
+        )
+        # Output is JSON, not HTML. Skips escaping of HTML special characters
+        # done by the built-in filter, which is a large part of render time.
+        self.environment.filters["tojson"] = json.dumps
+        self.environment.globals["CardBuilder"] = CardBuilder
+
+        self.templates: dict[str, Template] = {
+            name[: -len(EXTENSION)]: self.environment.get_template(name)
+            for name in self.environment.list_templates(
+                filter_func=lambda name: name.endswith(EXTENSION)
+            )
+        }
+
+        # Custom templates that replace built-in ones must not be paired with
+        # the built-in fragment templates.
+        self.fragment_templates: dict[str, Template] = {}
+        for name, template in self.templates.items():
+            fragment_template = self.templates.get(name + FRAGMENT_SUFFIX)
+            if fragment_template is not None and os.path.dirname(
+                fragment_template.filename
+            ) == os.path.dirname(template.filename):
+                self.fragment_templates[name] = fragment_template
+
+        self._fields: dict[str, Optional[frozenset[str]]] = {
+            name: _referenced_fields(
+                self.environment,
+                [name]
+                + ([name + FRAGMENT_SUFFIX] if name in self.fragment_templates else []),
+            )
+            for name in self.templates
+        }
+
+        logger.bind(
+            templates=sorted(self.templates), bytecode_cache_dir=bytecode_cache_dir
+        ).info("Loaded and compiled templates.")
+
+        self.script_pool: Optional[ScriptPool] = None
+        script_paths = _script_paths(directories)
+        if script_paths:
+            self.script_pool = ScriptPool(
+                script_paths,
+                workers=scripts.workers,
+                cpu_time=scripts.cpu_time,
+                wall_time=scripts.wall_time,
+                max_memory=scripts.max_memory,
+            )
+
+    def get(self, name: str) -> Template:
+        """Returns compiled template.
+
+        Raises:
+            KeyError: If there is no template with the given name.
+        """
+
+        try:
+            return self.templates[name]
+        except KeyError:
+            raise KeyError(f"Template '{name}' does not exist.") from None
+
+    @property
+    def names(self) -> frozenset[str]:
+        """Names of all templates and scripts that can be rendered."""
+
+        scripts = self.script_pool.paths if self.script_pool is not None else {}
+        return frozenset(self.templates) | frozenset(scripts)
+
+    def fields(self, name: str) -> Optional[frozenset[str]]:
+        """Returns names of all fields the template references.
+
+        Names of attributes and constant keys are collected from the template
+        and its fragment template without telling apart what they are accessed
+        on. So the result can contain more than the fields of the data model,
+        but never misses one.
+
+        Returns:
+            Optional[frozenset[str]]: Referenced names or `None` if they can
+                not be determined, for example for scripts, unknown templates
+                or templates that include other templates.
+        """
+
+        if self.script_pool is not None and name in self.script_pool.paths:
+            return None
+        return self._fields.get(name)
+
+    def render(
+        self, enhanced_alert_group: EnhancedAlertGroup, name: str = "default"
+    ) -> tuple[list[Payload], Callable[[dict], dict]]:
+        """Renders alert group once per template used by its targets.
+
+        Args:
+            enhanced_alert_group (EnhancedAlertGroup): Data to render.
+            name (str, optional): Name of template for targets that do not
+                select their own. Defaults to `"default"`.
+
+        Returns:
+            tuple[list[Payload], Callable[[dict], dict]]: One payload per
+                distinct template with all targets using it and error parser
+                that renders info about a failed send.
+
+        Raises:
+            ScriptError: If rendering with a script failed.
+        """
+
+        targets_per_template: dict[str, list[Target]] = {}
+        for target in enhanced_alert_group.targets:
+            targets_per_template.setdefault(target.template or name, []).append(target)
+
+        payloads = [
+            Payload.construct(
+                data=self._render_data(enhanced_alert_group, template_name),
+                targets=targets,
+            )
+            for template_name, targets in targets_per_template.items()
+        ]
+
+        return payloads, self.render_error
+
+    def _render_data(
+        self, enhanced_alert_group: EnhancedAlertGroup, name: str
+    ) -> Union[dict, bytes]:
+        if self.script_pool is not None and name in self.script_pool.paths:
+            return self.script_pool.render(name, enhanced_alert_group)
+
+        fragment_template = self.fragment_templates.get(name)
+        fragments = (
+            self._render_fragments(name, fragment_template, enhanced_alert_group.alerts)
+            if fragment_template is not None
+            else []
+        )
+
+        return (
+            self.get(name).render(data=enhanced_alert_group, fragments=fragments).encode()
+        )
+
+    def _render_fragments(
+        self, name: str, fragment_template: Template, alerts: list[EnhancedAlert]
+    ) -> list[str]:
+        """Renders fragment per alert. Cached fragments are reused."""
+
+        cache = self.fragment_cache
+        if cache is None:
+            return [fragment_template.render(alert=alert) for alert in alerts]
+
+        fragments = []
+        for alert in alerts:
+            key = (self.version, name, _fragment_key(alert))
+            fragment = cache.get(key)
+            if fragment is None:
+                fragment = fragment_template.render(alert=alert)
+                cache.put(key, fragment, len(fragment))
+            fragments.append(fragment)
+
+        return fragments
+
+    def render_error(self, info: dict) -> dict:
+        """Renders info about a failed send with the error template."""
+
+        return json.loads(self.get(ERROR_TEMPLATE).render(data=info))
+
+    def close(self) -> None:
+        """Stops worker processes of script templates."""
+
+        if self.script_pool is not None:
+            self.script_pool.close()
+
+
+def _script_paths(directories: list[str]) -> dict[str, str]:
+    """Returns script name to path. Earlier directories take precedence."""
+
+    paths = {}
+    for directory in reversed(directories):
+        if not os.path.isdir(directory):
+            continue
+        for file_name in sorted(os.listdir(directory)):
+            if file_name.endswith(".py") and not file_name.startswith("_"):
+                paths[file_name[:-3]] = os.path.join(directory, file_name)
+    return paths
+
+
+def _referenced_fields(
+    environment: Environment, names: list[str]
+) -> Optional[frozenset[str]]:
+    """Collects attribute names and constant keys used by the templates.
+
+    Returns `None` if the templates access fields in ways that can not be
+    analyzed statically.
+    """
+
+    fields: set[str] = set()
+
+    for name in names:
+        source, _, _ = environment.loader.get_source(environment, name + EXTENSION)
+        ast = environment.parse(source)
+
+        if any(
+            ast.find_all((nodes.Extends, nodes.Include, nodes.Import, nodes.FromImport))
+        ):
+            return None
+
+        for node in ast.find_all((nodes.Getattr, nodes.Const, nodes.Filter)):
+            if isinstance(node, nodes.Getattr):
+                fields.add(node.attr)
+            elif isinstance(node, nodes.Const):
+                if isinstance(node.value, str) and node.value.isidentifier():
+                    fields.add(node.value)
+            elif node.name == "attr" and not all(
+                isinstance(arg, nodes.Const) for arg in node.args
+            ):
+                return None
+
+    if fields & _OPAQUE:
+        return None
+
+    return frozenset(fields)
+
+
+def _fragment_key(alert: EnhancedAlert) -> Hashable:
+    """Returns everything about an alert that a fragment can depend on."""
+
+    return (
+        alert.fingerprint,
+        alert.status,
+        alert.starts_at,
+        alert.ends_at,
+        alert.generator_url,
+        tuple(alert.labels.items()),
+        tuple(alert.annotations.items()),
+        tuple(alert.specific_labels.items()),
+        tuple(alert.specific_annotations.items()),
+    )
+
+
+# ==============================================================================
+
+
+_engine: Optional[TemplateEngine] = None
+
+
+def setup_templating(templating: Templating = Templating()) -> TemplateEngine:
+    """Creates the engine used by `template()`. Call once at startup."""
+
+    global _engine
+
+    fragment_cache = None
+    if templating.fragment_cache.enabled:
+        fragment_cache = LRUCache(
+            max_items=templating.fragment_cache.max_items,
+            max_bytes=templating.fragment_cache.max_bytes,
+        )
+
+    _engine = TemplateEngine(
+        templating.directories,
+        templating.bytecode_cache_dir,
+        fragment_cache,
+        templating.scripts,
+    )
+    return _engine
+
+
+def current_engine() -> Optional[TemplateEngine]:
+    """Returns the engine used by `template()` or `None` if not set up yet."""
+
+    return _engine
+
+
+def template(
+    enhanced_alert_group: EnhancedAlertGroup, name: str = "default"
+) -> tuple[list[Payload], Callable[[dict], dict]]:
+    """Renders alert group with the engine created by `setup_templating()`.
+
+    If templating has not been set up, an engine with only the built-in
+    templates is created on first use.
+    """
+
+    engine = _engine or setup_templating()
+    return engine.render(enhanced_alert_group, name)
+
+
+def template_names() -> frozenset[str]:
+    """Returns names of all templates of the engine used by `template()`.
+
+    If templating has not been set up, an engine with only the built-in
+    templates is created on first use.
+    """
+
+    engine = _engine or setup_templating()
+    return engine.names
+
+
+def template_fields(name: str = "default") -> Optional[frozenset[str]]:
+    """Returns fields referenced by a template of the engine used by `template()`.
+
+    If templating has not been set up, an engine with only the built-in
+    templates is created on first use.
+    """
+
+    engine = _engine or setup_templating()
+    return engine.fields(name)
@@ -251,6 +251,62 @@ def test_split_by_invalid():
         )
 
 
+def test_split_by_keys():
+    route = settings.Route(
+        **{
+            "name": "name",
+            "split_by": {
+                "target": "label",
+                "value": "namespace",
+                "keys": [{"target": "annotation", "value": "team"}],
+                "max_groups": 10,
+            },
+        }
+    )
+
+    assert [key.value for key in route.split_by.keys] == ["namespace", "team"]
+    assert route.split_by.max_groups == 10
+    assert settings.SplitBy(**route.split_by.dict()) == route.split_by
+
+
+def test_split_by_keys_invalid():
+    with pytest.raises(ValidationError):
+        _ = settings.SplitBy()
+    with pytest.raises(ValidationError):
+        _ = settings.SplitBy(target="label")
+    with pytest.raises(ValidationError):
+        _ = settings.SplitBy(target="label", value="x", max_groups=0)
+
+
+def test_summarize():
+    route = settings.Route(name="name", summarize={"max_alerts": 10})
+
+    assert route.summarize.max_alerts == 10
+    assert [key.target for key in route.summarize.order_by] == ["label", "starts_at"]
+    assert route.summarize.count_by == ["alertname", "severity"]
+
+
+def test_summarize_invalid():
+    with pytest.raises(ValidationError):
+        _ = settings.Summarize(max_alerts=0)
+    with pytest.raises(ValidationError):
+        _ = settings.OrderKey(target="label")
+    with pytest.raises(ValidationError):
+        _ = settings.OrderKey(target="starts_at", value="x")
+
+
+def test_route_drop_invalid():
+    with pytest.raises(ValidationError):
+        _ = settings.Route(name="name", drop=["severity"])
+
+
+def test_add_templated_invalid():
+    with pytest.raises(ValidationError):
+        _ = settings.Add(labels={"link": "{alertname}"})
+    with pytest.raises(ValidationError):
+        _ = settings.Override(annotations={"link": "{labels[a]"})
+
+
 # ==============================================================================
 # Target
 
@@ -289,6 +345,12 @@ def test_sending_default():
 # Route
 
 
+def test_route_template_default():
+    assert settings.Route(name="name").template == "default"
+    assert settings.Settings().templating.bytecode_cache_dir is None
+    assert settings.Settings().templating.fragment_cache.enabled
+
+
 def test_route_invalid_name():
     with pytest.raises(ValidationError):
         _ = settings.Route(**{"name": "HALLO ROUTE"})
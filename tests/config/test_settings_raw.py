@@ -97,6 +97,14 @@ def test_parse_files_local(tmp_path):
 # ==============================================================================
 
 
+def test_config_file_locations():
+    assert settings_raw.config_file_locations(["--config_file", "foo/bar.yml"]) == [
+        "foo/bar.yml",
+        "foo/bar.local.yml",
+    ]
+    assert "/etc/promac/promac.local.yml" in settings_raw.config_file_locations([])
+
+
 def test_cast_vars(helpers):
     box = Box(
         {
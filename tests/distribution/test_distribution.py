@@ -72,6 +72,8 @@ def test_handle_send_failure_as_post_to_notify_url_successful():
         )
         assert response.status_code == 199
         assert response.request.method == "POST"
+        assert mocker.last_request.json() == {"wup": "die"}
+        assert mocker.last_request.headers["Content-Type"] == "application/json"
 
 
 # ==============================================================================
@@ -111,6 +113,18 @@ def test_send_single_payload_successfully():
         assert responses[1].request.url == URL2
         assert responses[0].status_code == 200
         assert responses[1].status_code == 200
+        assert mocker.last_request.json() == {"hello": "world"}
+        assert mocker.last_request.headers["Content-Type"] == "application/json"
+
+
+@pytest.mark.slow
+def test_send_bytes_payload():
+    payload = Payload(data=b'{"hello":"world"}', targets=[Target(url=URL1)])
+    with requests_mock.Mocker() as mocker:
+        mocker.post(URL1, text="hallo", status_code=200)
+        distribution.send([payload], SENDING, error_parser)
+        assert mocker.last_request.body == b'{"hello":"world"}'
+        assert mocker.last_request.headers["Content-Type"] == "application/json"
 
 
 @pytest.mark.slow
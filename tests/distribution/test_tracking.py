@@ -0,0 +1,114 @@
+"""Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
+
+import os
+
+import requests_mock
+
+from prometheus_adaptive_cards.config import Sending, Target
+from prometheus_adaptive_cards.distribution import (
+    DeliveryTracker,
+    Payload,
+    distribution,
+    load_persisted,
+)
+
+# ==============================================================================
+
+URL1 = "http://www.url1.com/"
+URL2 = "http://www.url2.com/"
+PAYLOAD = Payload(data={"hello": "world"}, targets=[Target(url=URL1), Target(url=URL2)])
+
+
+def test_begin_shutdown():
+    tracker = DeliveryTracker()
+    assert tracker.accepting is True
+    assert tracker.expired() is False
+
+    tracker.begin_shutdown(grace_period=60)
+    assert tracker.accepting is False
+    assert tracker.expired() is False
+
+    tracker.begin_shutdown(grace_period=0)
+    assert tracker.expired() is False
+
+
+def test_track_counts_finished_during_shutdown():
+    tracker = DeliveryTracker()
+
+    with tracker.track():
+        assert tracker.in_flight == 1
+        tracker.begin_shutdown(grace_period=60)
+
+    assert tracker.in_flight == 0
+    assert tracker.report() == {
+        "finished": 1,
+        "persisted": 0,
+        "dropped": 0,
+        "in_flight": 0,
+        "pending": 0,
+    }
+
+
+def test_drained_waits_for_pending():
+    tracker = DeliveryTracker()
+    assert tracker.drained()
+
+    token = tracker.enqueue(2)
+    assert not tracker.drained()
+
+    with tracker.track(token):
+        assert not tracker.drained()
+    assert tracker.in_flight == 0
+    assert not tracker.drained()
+
+    tracker.dequeue(token)
+    assert tracker.drained()
+
+
+def test_send_after_grace_period_drops():
+    tracker = DeliveryTracker()
+    tracker.begin_shutdown(grace_period=0)
+
+    with requests_mock.Mocker() as mocker:
+        responses = distribution.send([PAYLOAD], Sending(), tracker=tracker)
+        assert mocker.call_count == 0
+
+    assert responses == []
+    assert tracker.report()["dropped"] == 2
+
+
+def test_send_after_grace_period_persists_and_resend(tmp_path):
+    tracker = DeliveryTracker(persist_dir=str(tmp_path))
+    tracker.begin_shutdown(grace_period=0)
+
+    distribution.send([PAYLOAD], Sending(), tracker=tracker)
+
+    assert tracker.report()["persisted"] == 2
+
+    persisted = list(load_persisted(str(tmp_path)))
+    assert len(persisted) == 1
+    path, payloads = persisted[0]
+    assert [payload.targets[0].url for payload in payloads] == [URL1, URL2]
+    assert payloads[0].data == {"hello": "world"}
+
+    with requests_mock.Mocker() as mocker:
+        mocker.post(URL1, text="hallo", status_code=200)
+        mocker.post(URL2, text="hallo", status_code=200)
+        assert distribution.resend_persisted(str(tmp_path), Sending()) == 2
+        assert mocker.call_count == 2
+
+    assert not os.path.exists(path)
+
+
+def test_persist_bytes_payload(tmp_path):
+    tracker = DeliveryTracker(persist_dir=str(tmp_path))
+    payload = Payload(data='{"text":"ü"}'.encode(), targets=[Target(url=URL1)])
+
+    tracker.abandon(payload, payload.targets[0], URL1)
+
+    _, payloads = next(load_persisted(str(tmp_path)))
+    assert payloads[0].data == payload.data
+
+
+def test_load_persisted_missing_dir(tmp_path):
+    assert list(load_persisted(f"{tmp_path}/does-not-exist")) == []
@@ -1,12 +1,16 @@
 """Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
 
 import prometheus_adaptive_cards.preprocessing.actions as actions
-from prometheus_adaptive_cards.config.settings import Add
+from prometheus_adaptive_cards.config.settings import Add, Route, Routing
 from prometheus_adaptive_cards.model import Alert, AlertGroup
 
 # ==============================================================================
 
 
+def _apply(routing: Routing, route: Route, alert_group: AlertGroup) -> None:
+    actions.apply_actions(actions.compile_actions(routing, route), alert_group)
+
+
 def test_add():
     alert_group = AlertGroup.construct(
         common_labels={
@@ -28,13 +32,16 @@ def test_add():
         ],
     )
 
-    actions._add(
-        "labels",
-        {
-            "tim": "schwonkel",
-            "ute": "freier",
-            "frank": "sohn",
-        },
+    actions.apply_actions(
+        actions.Actions(
+            labels=actions.TargetActions(
+                add={
+                    "tim": "schwonkel",
+                    "ute": "freier",
+                    "frank": "sohn",
+                }
+            )
+        ),
         alert_group,
     )
 
@@ -57,7 +64,7 @@ def test_add():
 # ==============================================================================
 
 
-def test_wrapped_add_none_none():
+def test_add_none_none():
     alert_group = AlertGroup.construct(
         common_labels={
             "tim": "schwenke",
@@ -82,7 +89,7 @@ def test_wrapped_add_none_none():
         ],
     )
 
-    actions.wrapped_add(None, None, alert_group)
+    _apply(Routing(add=None), Route(name="x", add=None), alert_group)
 
     assert alert_group.common_labels == {
         "tim": "schwenke",
@@ -101,7 +108,7 @@ def test_wrapped_add_none_none():
     }
 
 
-def test_wrapped_add_a1_none():
+def test_add_a1_none():
     alert_group = AlertGroup.construct(
         common_labels={
             "tim": "schwenke",
@@ -131,7 +138,7 @@ def test_wrapped_add_a1_none():
     )
     a2 = None
 
-    actions.wrapped_add(a1, a2, alert_group)
+    _apply(Routing(add=a1), Route(name="x", add=a2), alert_group)
 
     assert alert_group.common_labels == {
         "tim": "schwenke",
@@ -149,7 +156,7 @@ def test_wrapped_add_a1_none():
     }
 
 
-def test_wrapped_add_none_a2():
+def test_add_none_a2():
     alert_group = AlertGroup.construct(
         common_labels={
             "tim": "schwenke",
@@ -179,7 +186,7 @@ def test_wrapped_add_none_a2():
     )
     a1 = None
 
-    actions.wrapped_add(a1, a2, alert_group)
+    _apply(Routing(add=a1), Route(name="x", add=a2), alert_group)
 
     assert alert_group.common_labels == {
         "tim": "schwenke",
@@ -197,7 +204,7 @@ def test_wrapped_add_none_a2():
     }
 
 
-def test_wrapped_add_a1_a2():
+def test_add_a1_a2():
     alert_group = AlertGroup.construct(
         common_labels={
             "tim": "schwenke",
@@ -231,7 +238,7 @@ def test_wrapped_add_a1_a2():
         }
     )
 
-    actions.wrapped_add(a1, a2, alert_group)
+    _apply(Routing(add=a1), Route(name="x", add=a2), alert_group)
 
     assert alert_group.common_labels == {
         "tim": "schwenke",
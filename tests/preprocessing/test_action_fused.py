@@ -0,0 +1,176 @@
+"""Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
+
+import copy
+from typing import Any
+
+import prometheus_adaptive_cards.preprocessing.actions as actions
+from prometheus_adaptive_cards.config.settings import (
+    Add,
+    Override,
+    Remove,
+    Route,
+    Routing,
+)
+from prometheus_adaptive_cards.model import Alert, AlertGroup
+
+# ==============================================================================
+
+
+def _alert_group() -> AlertGroup:
+    return AlertGroup.construct(
+        common_labels={"job": "node", "__meta": "x", "team": "a"},
+        common_annotations={"summary": "Down"},
+        alerts=[
+            Alert.construct(
+                labels={"job": "node", "__meta": "x", "team": "a", "env": "prod"},
+                annotations={"summary": "Down", "secret": "1"},
+            ),
+            Alert.construct(
+                labels={"job": "node", "__meta": "x", "team": "a"},
+                annotations={"summary": "Down", "runbook": "x"},
+            ),
+        ],
+    )
+
+
+def _merged(routing: Routing, route: Route, kind: str, attribute: str) -> Any:
+    a, b = getattr(routing, kind), getattr(route, kind)
+    values = [getattr(x, attribute) for x in (a, b) if x]
+    if kind == "remove":
+        return [value for part in values for value in part]
+    return {name: value for part in values for name, value in part.items()}
+
+
+def _remove(elements: list[dict[str, str]], keys: list[str], patterns: list) -> None:
+    for items in elements:
+        for key in [k for k in items if k in keys or any(p.search(k) for p in patterns)]:
+            del items[key]
+
+
+def _add(alert_group: AlertGroup, target: str, added: dict[str, str]) -> None:
+    for name, value in added.items():
+        values = {
+            alert.__dict__[target].setdefault(name, value) for alert in alert_group.alerts
+        }
+        if values == {value}:
+            alert_group.__dict__[f"common_{target}"][name] = value
+
+
+def _sequential(routing: Routing, route: Route, alert_group: AlertGroup) -> None:
+    """Removes, adds and overrides one action after the other.
+
+    Independent reference for `apply_actions()` with the original semantics.
+    """
+
+    for target in ("annotations", "labels"):
+        common = alert_group.__dict__[f"common_{target}"]
+        elements = [common] + [alert.__dict__[target] for alert in alert_group.alerts]
+
+        _remove(
+            elements,
+            _merged(routing, route, "remove", target),
+            _merged(routing, route, "remove", f"re_{target}"),
+        )
+        _add(alert_group, target, _merged(routing, route, "add", target))
+        for items in elements:
+            items.update(_merged(routing, route, "override", target))
+
+
+def test_apply_actions_equals_sequential():
+    routing = Routing(
+        remove=Remove(labels=["team"], re_labels=["^__"], re_annotations=["^secret$"]),
+        add=Add(labels={"env": "dev", "region": "eu"}, annotations={"runbook": "y"}),
+        override=Override(labels={"job": "overridden"}),
+    )
+    route = Route(
+        name="x",
+        remove=Remove(annotations=["nope"]),
+        add=Add(labels={"team": "b"}),
+        override=Override(annotations={"summary": "Overridden"}),
+    )
+
+    expected = _alert_group()
+    _sequential(routing, route, expected)
+
+    actual = _alert_group()
+    actions.apply_actions(actions.compile_actions(routing, route), actual)
+
+    assert actual.common_labels == expected.common_labels
+    assert actual.common_annotations == expected.common_annotations
+    assert [a.labels for a in actual.alerts] == [a.labels for a in expected.alerts]
+    assert [a.annotations for a in actual.alerts] == [
+        a.annotations for a in expected.alerts
+    ]
+
+    # Added items only become common if uniform.
+    assert "env" not in actual.common_labels
+    assert actual.common_labels["region"] == "eu"
+    assert actual.common_labels["team"] == "b"
+
+
+def test_apply_actions_nothing():
+    alert_group = _alert_group()
+    original = copy.deepcopy(alert_group)
+
+    compiled = actions.compile_actions(Routing(), Route(name="x"))
+    actions.apply_actions(compiled, alert_group)
+
+    assert not compiled.labels and not compiled.annotations
+    assert alert_group == original
+
+
+def test_apply_actions_no_alerts():
+    alert_group = AlertGroup.construct(common_labels={}, common_annotations={}, alerts=[])
+
+    compiled = actions.compile_actions(
+        Routing(add=Add(labels={"a": "b"})), Route(name="x")
+    )
+    actions.apply_actions(compiled, alert_group)
+
+    assert alert_group.common_labels == {}
+
+
+def test_apply_actions_drop():
+    routing = Routing(drop=['severity="info"'])
+    route = Route(name="x", drop=['{env="prod", team=~"a|b"}'])
+    alert_group = AlertGroup.construct(
+        common_labels={},
+        common_annotations={},
+        alerts=[
+            Alert.construct(labels={"severity": "info"}, annotations={}),
+            Alert.construct(labels={"env": "prod", "team": "a"}, annotations={}),
+            Alert.construct(labels={"env": "prod", "team": "c"}, annotations={}),
+        ],
+    )
+
+    actions.apply_actions(actions.compile_actions(routing, route), alert_group)
+
+    assert [alert.labels for alert in alert_group.alerts] == [
+        {"env": "prod", "team": "c"}
+    ]
+
+
+def test_apply_actions_templated():
+    routing = Routing(
+        remove=Remove(annotations=["runbook"]),
+        add=Add(
+            annotations={"runbook": "https://wiki/{labels[job]}"},
+            labels={"link": "{labels[env]}/{annotations[secret]}"},
+        ),
+        override=Override(labels={"team": "{labels[team]}-{labels[env]}"}),
+    )
+    alert_group = _alert_group()
+
+    actions.apply_actions(actions.compile_actions(routing, Route(name="x")), alert_group)
+
+    assert [a.annotations["runbook"] for a in alert_group.alerts] == [
+        "https://wiki/node",
+        "https://wiki/node",
+    ]
+    assert alert_group.common_annotations["runbook"] == "https://wiki/node"
+
+    assert [a.labels["link"] for a in alert_group.alerts] == ["prod/1", "/"]
+    assert "link" not in alert_group.common_labels
+
+    assert [a.labels["team"] for a in alert_group.alerts] == ["a-prod", "a-"]
+    assert "team" not in alert_group.common_labels
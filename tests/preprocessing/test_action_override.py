@@ -1,12 +1,16 @@
 """Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
 
 import prometheus_adaptive_cards.preprocessing.actions as actions
-from prometheus_adaptive_cards.config.settings import Override
+from prometheus_adaptive_cards.config.settings import Override, Route, Routing
 from prometheus_adaptive_cards.model import Alert, AlertGroup
 
 # ==============================================================================
 
 
+def _apply(routing: Routing, route: Route, alert_group: AlertGroup) -> None:
+    actions.apply_actions(actions.compile_actions(routing, route), alert_group)
+
+
 def test_override():
     alert_group = AlertGroup.construct(
         common_labels={
@@ -28,13 +32,16 @@ def test_override():
         ],
     )
 
-    actions._override(
-        "labels",
-        {
-            "tim": "schwonkel",
-            "ute": "freier",
-            "frank": "sohn",
-        },
+    actions.apply_actions(
+        actions.Actions(
+            labels=actions.TargetActions(
+                override={
+                    "tim": "schwonkel",
+                    "ute": "freier",
+                    "frank": "sohn",
+                }
+            )
+        ),
         alert_group,
     )
 
@@ -58,7 +65,7 @@ def test_override():
 # ==============================================================================
 
 
-def test_wrapped_override_none_none():
+def test_override_none_none():
     alert_group = AlertGroup.construct(
         common_labels={
             "tim": "schwenke",
@@ -86,7 +93,7 @@ def test_wrapped_override_none_none():
     a = None
     b = None
 
-    actions.wrapped_override(a, b, alert_group)
+    _apply(Routing(override=a), Route(name="x", override=b), alert_group)
 
     assert alert_group.common_labels == {
         "tim": "schwenke",
@@ -105,7 +112,7 @@ def test_wrapped_override_none_none():
     }
 
 
-def test_wrapped_override_a_none():
+def test_override_a_none():
     alert_group = AlertGroup.construct(
         common_labels={
             "tim": "schwenke",
@@ -135,7 +142,7 @@ def test_wrapped_override_a_none():
     )
     b = None
 
-    actions.wrapped_override(a, b, alert_group)
+    _apply(Routing(override=a), Route(name="x", override=b), alert_group)
 
     assert alert_group.common_labels == {
         "tim": "schwonkel",
@@ -154,7 +161,7 @@ def test_wrapped_override_a_none():
     }
 
 
-def test_wrapped_override_none_b():
+def test_override_none_b():
     alert_group = AlertGroup.construct(
         common_labels={
             "tim": "schwenke",
@@ -184,7 +191,7 @@ def test_wrapped_override_none_b():
     )
     a = None
 
-    actions.wrapped_override(a, b, alert_group)
+    _apply(Routing(override=a), Route(name="x", override=b), alert_group)
 
     assert alert_group.common_labels == {
         "tim": "schwonkel",
@@ -203,7 +210,7 @@ def test_wrapped_override_none_b():
     }
 
 
-def test_wrapped_override_a_b():
+def test_override_a_b():
     alert_group = AlertGroup.construct(
         common_labels={
             "tim": "schwenke",
@@ -237,7 +244,7 @@ def test_wrapped_override_a_b():
         }
     )
 
-    actions.wrapped_override(a, b, alert_group)
+    _apply(Routing(override=a), Route(name="x", override=b), alert_group)
 
     assert alert_group.common_labels == {
         "tim": "schwonkel",
@@ -3,12 +3,16 @@
 import re
 
 import prometheus_adaptive_cards.preprocessing.actions as actions
-from prometheus_adaptive_cards.config.settings import Remove
+from prometheus_adaptive_cards.config.settings import Remove, Route, Routing
 from prometheus_adaptive_cards.model import Alert, AlertGroup
 
 # ==============================================================================
 
 
+def _apply(routing: Routing, route: Route, alert_group: AlertGroup) -> None:
+    actions.apply_actions(actions.compile_actions(routing, route), alert_group)
+
+
 def test_remove():
     target = "labels"
     keys = ["tim", "hans", "ute", "furz", "soda"]
@@ -42,7 +46,10 @@ def test_remove():
         }
     )
 
-    actions._remove(target, keys, alert_group)
+    actions.apply_actions(
+        actions.Actions(labels=actions.TargetActions(remove=frozenset(keys))),
+        alert_group,
+    )
 
     assert alert_group.__dict__[f"common_{target}"] == {}
     assert alert_group.alerts[0].__dict__[target] == {"ronald": "fritz"}
@@ -85,17 +92,60 @@ def test_remove_re():
         }
     )
 
-    actions._remove_re(target, keys, alert_group)
+    actions.apply_actions(
+        actions.Actions(labels=actions.TargetActions(remove_re=tuple(keys))),
+        alert_group,
+    )
 
     assert alert_group.__dict__[f"common_{target}"] == {}
     assert alert_group.alerts[0].__dict__[target] == {"ronald": "fritz"}
     assert alert_group.alerts[1].__dict__[target] == {}
 
 
+def test_combine_patterns():
+    patterns = (
+        re.compile("^__"),
+        re.compile("secret$"),
+        re.compile("(a)\\1"),
+        re.compile("(?P<x>tok)en"),
+        re.compile("PASS", re.IGNORECASE),
+    )
+
+    combined = actions._combine_patterns(patterns)
+
+    assert len(combined) == 4
+    for key in ["__meta", "my_secret", "aa", "token", "password", "other", "a1"]:
+        expected = any(p.search(key) for p in patterns)
+        assert any(p.search(key) for p in combined) == expected
+
+
+def test_combine_patterns_conditional_reference():
+    patterns = (re.compile("(x)y"), re.compile("(a)?(?(1)b|c)$"))
+
+    combined = actions._combine_patterns(patterns)
+
+    assert len(combined) == 2
+    for key in ["xy", "ab", "c", "b", "a"]:
+        expected = any(p.search(key) for p in patterns)
+        assert any(p.search(key) for p in combined) == expected
+
+
+def test_matcher():
+    matches = actions._matcher(frozenset(["b"]), (re.compile("^__"),))
+
+    assert [matches(key) for key in ["__a", "b", "c", "__a"]] == [
+        True,
+        True,
+        False,
+        True,
+    ]
+    assert actions._matcher(frozenset(), ()) is None
+
+
 # ==============================================================================
 
 
-def test_wrapped_remove_none_none():
+def test_remove_none_none():
     alert_group = AlertGroup.construct(
         common_labels={
             "tim": "schwenke",
@@ -123,7 +173,7 @@ def test_wrapped_remove_none_none():
     a = None
     b = None
 
-    actions.wrapped_remove(a, b, alert_group)
+    _apply(Routing(remove=a), Route(name="x", remove=b), alert_group)
 
     assert alert_group.common_labels == {
         "tim": "schwenke",
@@ -143,7 +193,7 @@ def test_wrapped_remove_none_none():
     }
 
 
-def test_wrapped_remove_a_none():
+def test_remove_a_none():
     alert_group = AlertGroup.construct(
         common_labels={
             "tim": "schwenke",
@@ -171,14 +221,14 @@ def test_wrapped_remove_a_none():
     a = Remove(re_labels=[re.compile("^(tim|hans|ute|furz|soda)$")])
     b = None
 
-    actions.wrapped_remove(a, b, alert_group)
+    _apply(Routing(remove=a), Route(name="x", remove=b), alert_group)
 
     assert alert_group.common_labels == {}
     assert alert_group.alerts[0].labels == {"ronald": "fritz"}
     assert alert_group.alerts[1].labels == {}
 
 
-def test_wrapped_remove_none_b():
+def test_remove_none_b():
     alert_group = AlertGroup.construct(
         common_labels={
             "tim": "schwenke",
@@ -206,14 +256,14 @@ def test_wrapped_remove_none_b():
     a = None
     b = Remove(re_labels=[re.compile("^(tim|hans|ute|furz|soda)$")])
 
-    actions.wrapped_remove(a, b, alert_group)
+    _apply(Routing(remove=a), Route(name="x", remove=b), alert_group)
 
     assert alert_group.common_labels == {}
     assert alert_group.alerts[0].labels == {"ronald": "fritz"}
     assert alert_group.alerts[1].labels == {}
 
 
-def test_wrapped_remove_a_b():
+def test_remove_a_b():
     alert_group = AlertGroup.construct(
         common_annotations={},
         common_labels={
@@ -250,7 +300,7 @@ def test_wrapped_remove_a_b():
         re_labels=[re.compile("^(tim|hans)$")],
     )
 
-    actions.wrapped_remove(a, b, alert_group)
+    _apply(Routing(remove=a), Route(name="x", remove=b), alert_group)
 
     assert alert_group.common_annotations == {}
     assert alert_group.common_labels == {}
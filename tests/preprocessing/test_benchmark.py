@@ -0,0 +1,177 @@
+"""
+Benchmarks for the preprocessing pipeline. Marked as slow. Run them with
+`pytest -m slow -s tests/preprocessing/test_benchmark.py` to see the numbers.
+
+Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0
+"""
+
+import json
+import time
+import tracemalloc
+
+import pytest
+
+from prometheus_adaptive_cards.config import Route, Routing, SplitBy, Target
+from prometheus_adaptive_cards.interning import intern_table
+from prometheus_adaptive_cards.model import Alert, AlertGroup
+from prometheus_adaptive_cards.preprocessing import preprocess
+from prometheus_adaptive_cards.preprocessing.utils import specific
+
+# ==============================================================================
+
+
+def _alert_group(size: int) -> AlertGroup:
+    return AlertGroup.parse_raw(_payload(size))
+
+
+def _payload(size: int) -> str:
+    return json.dumps(
+        {
+            "receiver": "generic",
+            "status": "firing",
+            "externalURL": "http://alertmanager:9093",
+            "version": "4",
+            "groupKey": "{}:{alertname='KubePodCrashLooping'}",
+            "groupLabels": {"alertname": "KubePodCrashLooping"},
+            "commonLabels": {"alertname": "KubePodCrashLooping", "job": "kube"},
+            "commonAnnotations": {"summary": "Pod is crash looping."},
+            "alerts": [
+                {
+                    "fingerprint": f"{i:016x}",
+                    "status": "firing",
+                    "startsAt": "2020-11-03T17:51:36.14925565Z",
+                    "endsAt": "0001-01-01T00:00:00Z",
+                    "generatorURL": "http://prometheus:9090/graph",
+                    "labels": {
+                        "alertname": "KubePodCrashLooping",
+                        "job": "kube",
+                        "namespace": f"namespace-{i % 50}",
+                        "pod": f"pod-{i}",
+                        "severity": "warning" if i % 3 else "critical",
+                    },
+                    "annotations": {
+                        "summary": "Pod is crash looping.",
+                        "description": f"Pod pod-{i} is restarting.",
+                    },
+                }
+                for i in range(size)
+            ],
+        }
+    )
+
+
+def _legacy_enhance(alert_group: AlertGroup, targets: list[Target]) -> list:
+    """Enhancement as it has been done before with Pydantic copies."""
+
+    class LegacyEnhancedAlert(Alert):
+        specific_annotations: dict[str, str]
+        specific_labels: dict[str, str]
+
+    class LegacyEnhancedAlertGroup(AlertGroup):
+        targets: list[Target]
+
+    for alert in alert_group.alerts:
+        alert.specific_annotations = specific(
+            alert.annotations, alert_group.common_annotations
+        )
+        alert.specific_labels = specific(alert.labels, alert_group.common_labels)
+    enhanced_alerts = [
+        LegacyEnhancedAlert.construct(**alert.dict()) for alert in alert_group.alerts
+    ]
+    del alert_group.alerts
+    enhanced_alert_group = LegacyEnhancedAlertGroup.construct(**alert_group.dict())
+    enhanced_alert_group.alerts = enhanced_alerts
+    enhanced_alert_group.targets = [target.copy() for target in targets]
+    return [enhanced_alert_group]
+
+
+def _measure(function, *args) -> tuple[float, int]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args)
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert result
+    return duration, peak
+
+
+@pytest.mark.slow
+def test_benchmark_enhance_10k_alerts():
+    routing = Routing()
+    route = Route(name="benchmark", targets=[Target(url="http://target")])
+
+    legacy_time, legacy_peak = _measure(
+        _legacy_enhance, _alert_group(10_000), route.targets
+    )
+    time_, peak = _measure(preprocess, routing, route, _alert_group(10_000))
+
+    print(
+        f"\nEnhance 10k alerts: legacy {legacy_time * 1000:.1f} ms "
+        f"{legacy_peak / 2**20:.1f} MiB, now {time_ * 1000:.1f} ms "
+        f"{peak / 2**20:.1f} MiB"
+    )
+
+    assert peak < legacy_peak
+
+
+def _retained(function, *args) -> int:
+    tracemalloc.start()
+    result = function(*args)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert result
+    return current
+
+
+@pytest.mark.slow
+def test_benchmark_interning_10k_alerts(monkeypatch):
+    intern_table.clear()
+    payload = _payload(10_000)
+    interned = _retained(AlertGroup.parse_raw, payload)
+
+    intern_table.clear()
+    monkeypatch.setattr(intern_table, "max_length", -1)
+    plain = _retained(AlertGroup.parse_raw, payload)
+
+    print(
+        f"\nParse 10k alerts: without interning {plain / 2**20:.1f} MiB, "
+        f"with interning {interned / 2**20:.1f} MiB retained"
+    )
+
+    assert interned < plain
+
+
+def _best(runs: int, function, *args) -> float:
+    durations = []
+    for _ in range(runs):
+        copies = [
+            arg.copy(deep=True) if isinstance(arg, AlertGroup) else arg for arg in args
+        ]
+        start = time.perf_counter()
+        function(*copies)
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("size", [1_000, 10_000])
+def test_benchmark_columnar_split(size):
+    pytest.importorskip("numpy")
+
+    route = Route(name="benchmark", split_by=SplitBy(target="label", value="namespace"))
+    rows = Routing(columnar_threshold=None)
+    columns = Routing(columnar_threshold=1)
+    alert_group = _alert_group(size)
+
+    assert preprocess(columns, route, alert_group.copy(deep=True)) == preprocess(
+        rows, route, alert_group.copy(deep=True)
+    )
+
+    rows_time = _best(5, preprocess, rows, route, alert_group)
+    columns_time = _best(5, preprocess, columns, route, alert_group)
+
+    print(
+        f"\nSplit {size} alerts: rows {rows_time * 1000:.1f} ms, "
+        f"columnar {columns_time * 1000:.1f} ms"
+    )
@@ -0,0 +1,146 @@
+"""Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
+
+import pytest
+
+import prometheus_adaptive_cards.preprocessing.splitting as splitting
+from prometheus_adaptive_cards.config.settings import Route, Routing, SplitBy, SplitKey
+from prometheus_adaptive_cards.model import Alert, AlertGroup
+from prometheus_adaptive_cards.preprocessing.preprocessing import preprocess
+from prometheus_adaptive_cards.preprocessing.utils import specific
+
+np = pytest.importorskip("numpy")
+
+import prometheus_adaptive_cards.preprocessing.columnar as columnar  # noqa: E402
+
+# ==============================================================================
+
+
+def _alert_group() -> AlertGroup:
+    alerts = []
+    for i in range(40):
+        labels = {"alertname": "Disk", "instance": f"host-{i % 7}", "job": "node"}
+        if i % 3:
+            labels["team"] = f"team-{i % 2}"
+        annotations = {"summary": "Disk full"}
+        if i % 5 == 0:
+            annotations["runbook"] = "https://runbooks/disk"
+        alerts.append(Alert.construct(labels=labels, annotations=annotations))
+
+    return AlertGroup.construct(
+        group_labels={"alertname": "Disk", "job": "node"},
+        common_labels={"alertname": "Disk", "job": "node"},
+        common_annotations={"summary": "Disk full"},
+        alerts=alerts,
+    )
+
+
+def test_columns():
+    columns = columnar.Columns.from_items(
+        [{"a": "1", "b": "x"}, {"a": "1", "b": "y"}, {"a": "1"}]
+    )
+
+    assert columns.names == {"a": 0, "b": 1}
+    assert columns.values == [["1"], ["x", "y"]]
+    assert columns.codes.tolist() == [[0, 0, 0], [0, 1, -1]]
+    assert columns.common() == {"a": "1"}
+    assert columns.specific({"a": "1"}) == [{"b": "x"}, {"b": "y"}, {}]
+    assert columns.take(np.array([0])).common() == {"a": "1", "b": "x"}
+
+
+def test_group_rows_missing_first_then_appearance():
+    columns = columnar.Columns.from_items(
+        [{"k": "b"}, {"k": "a"}, {}, {"k": "b"}, {"k": "c"}]
+    )
+
+    groups = [rows.tolist() for rows in columnar.group_rows([(columns, "k")])]
+
+    assert groups == [[2], [0, 3], [1], [4]]
+    assert [r.tolist() for r in columnar.group_rows([(columns, "nope")])] == [
+        [0, 1, 2, 3, 4]
+    ]
+
+
+def test_group_rows_multiple_keys_and_overflow():
+    columns = columnar.Columns.from_items(
+        [{"a": "1", "b": "x"}, {"a": "1"}, {}, {"a": "1", "b": "x"}, {"b": "y"}]
+    )
+    keys = [(columns, "a"), (columns, "b")]
+
+    groups = [rows.tolist() for rows in columnar.group_rows(keys)]
+    assert groups == [[2], [0, 3], [1], [4]]
+
+    groups = [rows.tolist() for rows in columnar.group_rows(keys, max_groups=1)]
+    assert groups == [[2], [0, 3], [1, 4]]
+
+
+@pytest.mark.parametrize("target,by", [("label", "team"), ("annotation", "runbook")])
+def test_split_columnar_equals_rows(target, by):
+    alert_group = _alert_group()
+
+    keys = [SplitKey(target=target, value=by)]
+    expected = splitting.split_with_specific(keys, alert_group)
+    actual = columnar.split_columnar(alert_group, keys)
+
+    assert len(actual) == len(expected)
+    for (group, specific_annotations, specific_labels), (
+        other,
+        other_annotations,
+        other_labels,
+    ) in zip(actual, expected):
+        assert group.alerts == other.alerts
+        assert group.common_labels == other.common_labels
+        assert group.common_annotations == other.common_annotations
+        assert group.group_labels == other.group_labels
+        assert (
+            specific_labels
+            == other_labels
+            == [specific(alert.labels, other.common_labels) for alert in other.alerts]
+        )
+        assert (
+            specific_annotations
+            == other_annotations
+            == [
+                specific(alert.annotations, other.common_annotations)
+                for alert in other.alerts
+            ]
+        )
+
+
+@pytest.mark.parametrize(
+    "split_by",
+    [
+        SplitBy(target="label", value="instance"),
+        SplitBy(
+            keys=[
+                SplitKey(target="label", value="team"),
+                SplitKey(target="annotation", value="runbook"),
+            ]
+        ),
+        SplitBy(target="label", value="instance", max_groups=3),
+    ],
+)
+def test_preprocess_columnar_equals_rows(split_by):
+    route = Route(name="x", split_by=split_by)
+
+    row = preprocess(Routing(columnar_threshold=None), route, _alert_group())
+    col = preprocess(Routing(columnar_threshold=2), route, _alert_group())
+
+    assert col == row
+
+
+@pytest.mark.parametrize("split_by", [None, SplitBy(target="label", value="instance")])
+@pytest.mark.parametrize("threshold", [None, 2])
+def test_preprocess_without_specific(split_by, threshold):
+    route = Route(name="x", split_by=split_by)
+    routing = Routing(columnar_threshold=threshold)
+
+    full = preprocess(routing, route, _alert_group())
+    partial = preprocess(routing, route, _alert_group(), specific={"labels"})
+
+    assert len(partial) == len(full)
+    for group, expected in zip(partial, full):
+        assert group.common_annotations == expected.common_annotations
+        assert group.common_labels == expected.common_labels
+        for alert, expected_alert in zip(group.alerts, expected.alerts):
+            assert alert.specific_annotations == {}
+            assert alert.specific_labels == expected_alert.specific_labels
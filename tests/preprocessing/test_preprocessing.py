@@ -108,3 +108,14 @@ def test_preprocess(helpers):
         "bmw": "value",
         "yung": "hurn",
     }
+
+
+def test_preprocess_all_dropped():
+    alert_group = AlertGroup.construct(
+        group_labels={},
+        common_labels={},
+        common_annotations={},
+        alerts=[Alert.construct(labels={"severity": "info"}, annotations={})],
+    )
+
+    assert preprocess(Routing(drop=["severity=info"]), Route(name="x"), alert_group) == []
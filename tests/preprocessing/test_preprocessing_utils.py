@@ -1,7 +1,11 @@
 """Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
 
+import pytest
+
 import prometheus_adaptive_cards.preprocessing.utils as utils
+from prometheus_adaptive_cards.config import Route, Routing
 from prometheus_adaptive_cards.model import Alert, AlertGroup
+from prometheus_adaptive_cards.preprocessing import preprocess
 
 # ==============================================================================
 
@@ -50,7 +54,7 @@ DATA = {
 }
 
 
-def test_add_specific_annotations():
+def test_preprocess_specific_annotations():
     alert_group = AlertGroup.construct(
         common_labels={
             "alertname": "JustATestAlert",
@@ -96,19 +100,22 @@ def test_add_specific_annotations():
         ],
     )
 
-    utils.add_specific(alert_group)
+    enhanced_alert_group = preprocess(Routing(), Route(name="x"), alert_group)[0]
 
-    assert alert_group.alerts[0].specific_annotations["specific"] == "specific"
-    assert alert_group.alerts[0].specific_annotations["very_specific"] == "very_specific"
+    assert enhanced_alert_group.alerts[0].specific_annotations["specific"] == "specific"
+    assert (
+        enhanced_alert_group.alerts[0].specific_annotations["very_specific"]
+        == "very_specific"
+    )
 
-    assert alert_group.alerts[0].specific_annotations is not None
-    assert alert_group.alerts[1].specific_annotations is not None
+    assert enhanced_alert_group.alerts[0].specific_annotations is not None
+    assert enhanced_alert_group.alerts[1].specific_annotations is not None
 
-    assert alert_group.alerts[0].specific_labels is not None
-    assert alert_group.alerts[1].specific_labels is not None
+    assert enhanced_alert_group.alerts[0].specific_labels is not None
+    assert enhanced_alert_group.alerts[1].specific_labels is not None
 
 
-def test_add_specific_labels():
+def test_preprocess_specific_labels():
     alert_group = AlertGroup.construct(
         common_labels={
             "alertname": "JustATestAlert",
@@ -156,12 +163,52 @@ def test_add_specific_labels():
         ],
     )
 
-    utils.add_specific(alert_group)
+    enhanced_alert_group = preprocess(Routing(), Route(name="x"), alert_group)[0]
+
+    assert enhanced_alert_group.alerts[0].specific_labels["specific"] == "specific"
+
+    assert enhanced_alert_group.alerts[0].specific_labels is not None
+    assert enhanced_alert_group.alerts[1].specific_labels is not None
+
+
+# ==============================================================================
+
 
-    assert alert_group.alerts[0].specific_labels["specific"] == "specific"
+def test_common_and_specific():
+    items = [
+        {"a": "1", "b": "x", "c": "same"},
+        {"a": "1", "b": "y", "c": "same"},
+        {"a": "1", "c": "same", "d": "z"},
+    ]
 
-    assert alert_group.alerts[0].specific_labels is not None
-    assert alert_group.alerts[1].specific_labels is not None
+    common, specifics = utils.common_and_specific(items)
+
+    assert common == {"a": "1", "c": "same"}
+    assert specifics == [{"b": "x"}, {"b": "y"}, {"d": "z"}]
+    for item, specific in zip(items, specifics):
+        assert specific == utils.specific(item, common)
+
+
+@pytest.mark.parametrize(
+    "items",
+    [
+        [],
+        [{"a": "1"}],
+        [{"a": "1"}, {"a": "2"}],
+        [{"a": "1", "b": "x"}, {"a": "1", "b": "y"}, {"a": "1", "c": "z"}],
+    ],
+)
+def test_common(items):
+    assert utils.common(items) == utils.common_and_specific(items)[0]
+
+
+def test_common_and_specific_edge_cases():
+    assert utils.common_and_specific([]) == ({}, [])
+    assert utils.common_and_specific([{"a": "1"}]) == ({"a": "1"}, [{}])
+    assert utils.common_and_specific([{"a": "1"}, {"a": "2"}]) == (
+        {},
+        [{"a": "1"}, {"a": "2"}],
+    )
 
 
 # ==============================================================================
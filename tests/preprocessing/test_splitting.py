@@ -1,14 +1,20 @@
 """Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
 
 import prometheus_adaptive_cards.preprocessing.splitting as splitting
+from prometheus_adaptive_cards.config import SplitKey
 from prometheus_adaptive_cards.model import Alert, AlertGroup
 
 # ==============================================================================
 
 
+def _split(key: SplitKey, alert_group: AlertGroup) -> list[AlertGroup]:
+    return [group for group, _, _ in splitting.split_with_specific([key], alert_group)]
+
+
 def test_group_alerts_single_alert():
-    list_of_alert_lists = splitting._group_alerts(
-        "annotations", "foo", [Alert.construct(annotations={"foo": "bar"})]
+    list_of_alert_lists = splitting._group_alerts_by_keys(
+        [SplitKey(target="annotation", value="foo")],
+        [Alert.construct(annotations={"foo": "bar"})],
     )
 
     assert isinstance(list_of_alert_lists[0][0], Alert)
@@ -16,8 +22,9 @@ def test_group_alerts_single_alert():
     assert len(list_of_alert_lists[0]) == 1
     assert list_of_alert_lists[0][0] == Alert.construct(annotations={"foo": "bar"})
 
-    list_of_alert_lists = splitting._group_alerts(
-        "labels", "foo", [Alert.construct(labels={"foo": "bar"})]
+    list_of_alert_lists = splitting._group_alerts_by_keys(
+        [SplitKey(target="label", value="foo")],
+        [Alert.construct(labels={"foo": "bar"})],
     )
 
     assert isinstance(list_of_alert_lists[0][0], Alert)
@@ -73,7 +80,9 @@ def test_group_alerts(helpers):
         ),
     ]
 
-    grouped_alerts = splitting._group_alerts("annotations", "target_link", alerts)
+    grouped_alerts = splitting._group_alerts_by_keys(
+        [SplitKey(target="annotation", value="target_link")], alerts
+    )
     helpers.print_struct(grouped_alerts, "grouped_alerts")
 
     assert len(grouped_alerts) == 3
@@ -259,7 +268,7 @@ def test_split(caplog, helpers):
         }
     )
 
-    alert_groups = splitting.split("annotation", "common", alert_group)
+    alert_groups = _split(SplitKey(target="annotation", value="common"), alert_group)
     helpers.print_struct(alert_groups, "alert_groups")
 
     assert alert_groups[0].receiver == "cisco webex"
@@ -275,3 +284,46 @@ def test_split(caplog, helpers):
     ]
     assert alert_groups[1].common_annotations == {"common": "common"}
     assert alert_groups[0].common_annotations == {}
+
+
+def test_group_alerts_by_keys():
+    alerts = [
+        Alert.construct(labels={"ns": "a", "severity": "critical"}, annotations={}),
+        Alert.construct(labels={"ns": "a"}, annotations={}),
+        Alert.construct(labels={}, annotations={}),
+        Alert.construct(labels={"ns": "a", "severity": "critical"}, annotations={}),
+        Alert.construct(labels={"ns": "b"}, annotations={}),
+        Alert.construct(labels={"ns": "c"}, annotations={}),
+    ]
+    keys = [
+        SplitKey(target="label", value="ns"),
+        SplitKey(target="label", value="severity"),
+    ]
+
+    groups = splitting._group_alerts_by_keys(keys, alerts)
+    assert groups == [
+        [alerts[2]],
+        [alerts[0], alerts[3]],
+        [alerts[1]],
+        [alerts[4]],
+        [alerts[5]],
+    ]
+
+    groups = splitting._group_alerts_by_keys(keys, alerts, max_groups=2)
+    assert groups == [[alerts[2]], [alerts[0], alerts[3]], [alerts[1]], alerts[4:]]
+
+
+def test_split_all_alerts_have_key():
+    alert_group = AlertGroup.construct(
+        group_labels={},
+        common_labels={},
+        common_annotations={},
+        alerts=[
+            Alert.construct(labels={"ns": "a"}, annotations={}),
+            Alert.construct(labels={"ns": "b"}, annotations={}),
+        ],
+    )
+
+    groups = _split(SplitKey(target="label", value="ns"), alert_group)
+
+    assert [group.common_labels for group in groups] == [{"ns": "a"}, {"ns": "b"}]
@@ -0,0 +1,132 @@
+"""Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
+
+import random
+from datetime import datetime, timedelta
+
+import prometheus_adaptive_cards.preprocessing.summarizing as summarizing
+from prometheus_adaptive_cards.config import OrderKey, Route, Routing, Summarize
+from prometheus_adaptive_cards.model import Alert, AlertGroup
+from prometheus_adaptive_cards.preprocessing.preprocessing import preprocess
+
+# ==============================================================================
+
+_START = datetime(2020, 1, 1)
+
+
+def _alert(i: int, **labels: str) -> Alert:
+    return Alert.construct(
+        fingerprint=str(i),
+        starts_at=_START + timedelta(minutes=i),
+        labels={"alertname": "Disk", **labels},
+        annotations={},
+    )
+
+
+def _alert_group(alerts: list[Alert]) -> AlertGroup:
+    return AlertGroup.construct(
+        group_labels={"alertname": "Disk"},
+        common_labels={"alertname": "Disk"},
+        common_annotations={},
+        alerts=alerts,
+    )
+
+
+def test_summarize_default_order():
+    alerts = [
+        _alert(0, severity="warning"),
+        _alert(1, severity="critical"),
+        _alert(2),
+        _alert(3, severity="critical"),
+        _alert(4, severity="page"),
+        _alert(5, severity="info"),
+    ]
+
+    rows, summary = summarizing.summarize(Summarize(max_alerts=4), alerts)
+
+    # Critical newest first, then ranked, then unranked, then missing.
+    assert rows == [3, 1, 0, 5]
+    assert summary == {
+        "omitted": 2,
+        "counts": {"alertname": {"Disk": 2}, "severity": {"page": 1}},
+    }
+
+
+def test_summarize_order_keys():
+    alerts = [
+        _alert(0, team="b"),
+        _alert(1, team="a"),
+        _alert(2, team="c"),
+        _alert(3),
+        _alert(4, team="a"),
+    ]
+
+    def select(*order_by: OrderKey) -> list[int]:
+        settings = Summarize(max_alerts=len(alerts), order_by=list(order_by))
+        return summarizing.summarize(settings, alerts)[0]
+
+    assert select(OrderKey(target="label", value="team")) == [1, 4, 0, 2, 3]
+    assert select(OrderKey(target="label", value="team", descending=True)) == [
+        2,
+        0,
+        1,
+        4,
+        3,
+    ]
+    assert select(
+        OrderKey(target="label", value="team", ranking=["c"]),
+        OrderKey(target="starts_at", descending=True),
+    ) == [2, 4, 1, 0, 3]
+    assert select() == [0, 1, 2, 3, 4]
+
+
+def test_summarize_equals_sorting():
+    rng = random.Random(3)
+    severities = ["critical", "warning", "info", "none", None]
+    alerts = []
+    for i in range(500):
+        severity = rng.choice(severities)
+        labels = {} if severity is None else {"severity": severity}
+        alerts.append(_alert(rng.randrange(100), **labels, pod=f"pod-{i % 13}"))
+
+    settings = Summarize(max_alerts=25, count_by=["severity", "pod"])
+    rows, summary = summarizing.summarize(settings, alerts)
+
+    key = summarizing.sort_key(settings.order_by)
+    expected = sorted(range(len(alerts)), key=lambda row: key(alerts[row]))[:25]
+    assert rows == expected
+
+    kept = set(rows)
+    omitted = [alert for row, alert in enumerate(alerts) if row not in kept]
+    assert summary["omitted"] == 475
+    assert sum(summary["counts"]["pod"].values()) == 475
+    assert summary["counts"]["severity"].get("critical", 0) == sum(
+        1 for alert in omitted if alert.labels.get("severity") == "critical"
+    )
+    counts = list(summary["counts"]["pod"].values())
+    assert counts == sorted(counts, reverse=True)
+
+
+def test_preprocess_summarize():
+    alerts = [_alert(i, severity="critical" if i % 4 else "warning") for i in range(10)]
+    route = Route(name="x", summarize=Summarize(max_alerts=3))
+
+    enhanced_alert_group = preprocess(Routing(), route, _alert_group(alerts))[0]
+
+    assert [alert.fingerprint for alert in enhanced_alert_group.alerts] == ["9", "7", "6"]
+    assert all(alert.specific_labels for alert in enhanced_alert_group.alerts)
+    assert enhanced_alert_group.common_labels == {"alertname": "Disk"}
+    assert enhanced_alert_group.summary["omitted"] == 7
+    assert enhanced_alert_group.summary["counts"]["severity"] == {
+        "critical": 4,
+        "warning": 3,
+    }
+
+
+def test_preprocess_summarize_small_group():
+    alerts = [_alert(i, severity="critical") for i in range(3)]
+    route = Route(name="x", summarize=Summarize(max_alerts=3))
+
+    enhanced_alert_group = preprocess(Routing(), route, _alert_group(alerts))[0]
+
+    assert len(enhanced_alert_group.alerts) == 3
+    assert enhanced_alert_group.summary is None
@@ -0,0 +1,54 @@
+"""Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
+
+from prometheus_adaptive_cards.model import Alert, AlertGroup
+from prometheus_adaptive_cards.routing import Dispatcher
+
+# ==============================================================================
+
+
+def _dispatcher() -> Dispatcher:
+    return Dispatcher(
+        {
+            "db": ['team="db"'],
+            "critical": ['severity="critical", env!="dev"', 'page="true"'],
+            "not-prod": ['env!~"prod"'],
+            "unused": [],
+        }
+    )
+
+
+def test_select():
+    dispatcher = _dispatcher()
+
+    assert dispatcher.select({"team": "db", "env": "prod"}) == ["db"]
+    assert dispatcher.select({"severity": "critical", "env": "prod"}) == ["critical"]
+    assert dispatcher.select({"severity": "critical", "env": "dev"}) == ["not-prod"]
+    assert dispatcher.select({"page": "true", "env": "prod", "team": "db"}) == [
+        "db",
+        "critical",
+    ]
+    assert dispatcher.select({"env": "prod"}) == []
+    assert not Dispatcher({"a": []})
+
+
+def test_dispatch():
+    alerts = [
+        Alert.construct(labels={"team": "db", "env": "prod"}, annotations={}),
+        Alert.construct(labels={"team": "db", "page": "true"}, annotations={}),
+        Alert.construct(labels={"team": "web", "env": "prod"}, annotations={}),
+    ]
+    alert_group = AlertGroup.construct(
+        group_labels={"team": "db"},
+        common_labels={},
+        common_annotations={},
+        alerts=alerts,
+    )
+
+    alert_groups = _dispatcher().dispatch(alert_group)
+
+    assert list(alert_groups) == ["db", "critical", "not-prod"]
+    assert alert_groups["db"].alerts[0] is alerts[0]
+    assert alert_groups["db"].common_labels == {"team": "db"}
+    assert alert_groups["critical"].alerts == [alerts[1]]
+    assert alert_groups["critical"].alerts[0] is not alerts[1]
+    assert alert_group.alerts == alerts
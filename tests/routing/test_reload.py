@@ -0,0 +1,148 @@
+"""Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
+
+import os
+import time
+
+import pytest
+
+from prometheus_adaptive_cards.config.settings import Route, Routing, Target
+from prometheus_adaptive_cards.routing import (
+    Reloader,
+    RoutingTableHolder,
+    compile_routing_table,
+)
+
+# ==============================================================================
+
+
+def test_compile_routing_table():
+    routing = Routing(routes=[Route(name="a"), Route(name="b")])
+    table = compile_routing_table(routing, version=3)
+
+    assert table.version == 3
+    assert set(table.routes) == {"a", "b"}
+    assert table.get("a").sending is routing.sending
+    assert table.get("a").version == 3
+    assert table.get("c") is None
+
+
+def test_compile_routing_table_specific():
+    routing = Routing(
+        routes=[
+            Route(name="a", template="a"),
+            Route(name="b", template="b"),
+            Route(name="c", template="c"),
+        ]
+    )
+    fields = {"a": frozenset({"specific_labels"}), "b": frozenset(), "c": None}
+    table = compile_routing_table(routing, fields=lambda route: fields[route.template])
+
+    assert table.get("a").specific == {"labels"}
+    assert table.get("b").specific == set()
+    assert table.get("c").specific == {"annotations", "labels"}
+    assert compile_routing_table(routing).get("b").specific == {"annotations", "labels"}
+
+    holder = RoutingTableHolder(table)
+    assert holder.swap(routing).get("b").specific == set()
+
+
+def test_compile_routing_table_unknown_template():
+    templates = {"default", "other"}
+    routing = Routing(
+        routes=[Route(name="a"), Route(name="b", template="other")],
+    )
+
+    assert compile_routing_table(routing, templates=templates).templates is templates
+
+    with pytest.raises(ValueError, match="'nope' of route 'c'"):
+        compile_routing_table(
+            Routing(routes=[Route(name="c", template="nope")]), templates=templates
+        )
+    with pytest.raises(ValueError, match="'nope' of route 'd'"):
+        compile_routing_table(
+            Routing(
+                routes=[
+                    Route(name="d", targets=[Target(url="http://x", template="nope")])
+                ]
+            ),
+            templates=templates,
+        )
+
+
+def test_holder_swap_keeps_old_snapshot():
+    holder = RoutingTableHolder(compile_routing_table(Routing(routes=[Route(name="a")])))
+    snapshot = holder.current
+
+    holder.swap(Routing(routes=[Route(name="b")]))
+
+    assert holder.current.version == 2
+    assert holder.current.get("a") is None
+    assert snapshot.get("a") is not None
+    assert snapshot.version == 1
+
+
+# ==============================================================================
+
+
+def test_reloader_reload():
+    holder = RoutingTableHolder(compile_routing_table(Routing(routes=[Route(name="a")])))
+    reloader = Reloader(holder, load=lambda: Routing(routes=[Route(name="b")]))
+
+    assert reloader.reload() is True
+    assert holder.current.get("b") is not None
+
+
+def test_reloader_reload_failure_keeps_table():
+    holder = RoutingTableHolder(compile_routing_table(Routing(routes=[Route(name="a")])))
+
+    def load():
+        raise ValueError("Invalid.")
+
+    assert Reloader(holder, load=load).reload() is False
+    assert holder.current.version == 1
+    assert holder.current.get("a") is not None
+
+
+def test_reloader_unknown_template_keeps_table():
+    holder = RoutingTableHolder(
+        compile_routing_table(Routing(routes=[Route(name="a")]), templates={"default"})
+    )
+    reloader = Reloader(
+        holder, load=lambda: Routing(routes=[Route(name="a", template="nope")])
+    )
+
+    assert reloader.reload() is False
+    assert holder.current.version == 1
+    assert holder.current.get("a").route.template == "default"
+
+
+def test_reloader_request_reload():
+    holder = RoutingTableHolder(compile_routing_table(Routing()))
+    reloader = Reloader(holder, load=lambda: Routing(routes=[Route(name="b")])).start()
+
+    reloader.request_reload()
+    for _ in range(100):
+        if holder.current.version == 2:
+            break
+        time.sleep(0.01)
+    reloader.stop()
+
+    assert holder.current.get("b") is not None
+
+
+def test_reloader_watch(tmp_path):
+    path = f"{tmp_path}/promac.yml"
+    holder = RoutingTableHolder(compile_routing_table(Routing()))
+    reloader = Reloader(holder, load=lambda: Routing(), watch_paths=[path])
+
+    assert reloader._files_changed() is False
+
+    with open(path, "w") as f:
+        f.write("---")
+
+    assert reloader._files_changed() is True
+    assert reloader._files_changed() is False
+
+    os.utime(path, (0, 0))
+
+    assert reloader._files_changed() is True
@@ -0,0 +1,95 @@
+"""Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
+
+import json
+
+import pytest
+
+from prometheus_adaptive_cards.templating import TEAMS_MAX_BYTES, CardBuilder
+
+# ==============================================================================
+
+
+def _content(encoded: bytes) -> dict:
+    return json.loads(encoded)["attachments"][0]["content"]
+
+
+def _build(max_bytes: int = TEAMS_MAX_BYTES, alerts: int = 3) -> CardBuilder:
+    builder = CardBuilder(max_bytes)
+    builder.text_block('Alert "Down" ü\n', size="Large", wrap=True)
+    builder.open_url("Open Alertmanager", "http://localhost:9093")
+    for i in range(alerts):
+        builder.begin_container(separator=True)
+        builder.text_block(f"Alert {i}")
+        builder.fact_set([(f"label{j}", f"value\t{j}") for j in range(4)])
+        builder.end_container()
+    return builder
+
+
+def test_build():
+    builder = _build()
+    encoded = builder.build()
+
+    assert builder.truncated == 0
+    content = _content(encoded)
+    assert content["type"] == "AdaptiveCard"
+    assert content["body"][0] == {
+        "type": "TextBlock",
+        "text": 'Alert "Down" ü\n',
+        "size": "Large",
+        "wrap": True,
+    }
+    assert content["body"][3]["items"][1]["facts"][3] == {
+        "title": "label3",
+        "value": "value\t3",
+    }
+    assert content["actions"] == [
+        {
+            "type": "Action.OpenUrl",
+            "title": "Open Alertmanager",
+            "url": "http://localhost:9093",
+        }
+    ]
+
+
+def test_build_element():
+    builder = CardBuilder(600)
+    builder.element('{"type": "Container", "items": []}')
+    builder.element(b'{"type": "TextBlock", "text": "' + b"x" * 600 + b'"}')
+    content = _content(builder.build())
+
+    assert content["body"][0] == {"type": "Container", "items": []}
+    assert content["body"][1]["text"].startswith("1 more items")
+
+
+def test_build_empty_elements():
+    builder = CardBuilder()
+    builder.fact_set([])
+    builder.begin_container().end_container()
+    assert _content(builder.build())["body"] == [{"type": "Container", "items": []}]
+
+
+@pytest.mark.parametrize("max_bytes", range(500, 3000, 97))
+def test_build_truncated(max_bytes):
+    builder = _build(max_bytes, alerts=20)
+    builder.begin_container()
+    encoded = builder.build()
+
+    assert len(encoded) <= max_bytes
+    assert builder.truncated > 0
+    content = _content(encoded)
+    assert content["body"][-1]["text"].startswith(f"{builder.truncated} more items")
+
+
+def test_build_truncated_counts_facts():
+    builder = CardBuilder(1000)
+    builder.fact_set([("name", "x" * 20)] * 50)
+    encoded = builder.build()
+
+    facts = _content(encoded)["body"][0]["facts"]
+    assert 0 < len(facts) < 50
+    assert builder.truncated == 50 - len(facts)
+
+
+def test_build_too_small():
+    with pytest.raises(ValueError):
+        CardBuilder(100)
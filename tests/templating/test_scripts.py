@@ -0,0 +1,144 @@
+"""Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
+
+import json
+import os
+import textwrap
+
+import pytest
+
+from prometheus_adaptive_cards.config import Route, Routing, Scripts, Target
+from prometheus_adaptive_cards.model import AlertGroup
+from prometheus_adaptive_cards.preprocessing import preprocess
+from prometheus_adaptive_cards.templating import ScriptError, ScriptPool, TemplateEngine
+
+# ==============================================================================
+
+SCRIPT = """
+import time
+
+from prometheus_adaptive_cards.templating import CardBuilder
+
+LOADS = []
+LOADS.append(1)
+
+
+def render(data):
+    action = data.common_labels.get("action")
+    if action == "loop":
+        while True:
+            pass
+    if action == "sleep":
+        time.sleep(10)
+    if action == "swallow":
+        while True:
+            try:
+                sum(range(1000))
+            except Exception:
+                pass
+    if action == "ignore_cpu":
+        while True:
+            try:
+                sum(range(1000))
+            except BaseException:
+                pass
+    if action == "ignore_wall":
+        while True:
+            try:
+                time.sleep(10)
+            except BaseException:
+                pass
+    if action == "allocate":
+        return {"size": len(bytearray(2**30))}
+    if action == "fail":
+        raise ValueError("nope")
+    if action == "card":
+        return CardBuilder().text_block(data.status).build()
+    return {
+        "loads": len(LOADS),
+        "alerts": len(data.alerts),
+        "status": data.status,
+        "specific": data.alerts[1].specific_labels,
+        "targets": [target.url for target in data.targets],
+    }
+"""
+
+
+def _enhanced_alert_group(action: str = ""):
+    with open(f"{os.path.dirname(__file__)}/../data/payload-simple-01.json") as f:
+        payload = json.load(f)
+    payload["commonLabels"]["action"] = action
+    payload["alerts"].append({**payload["alerts"][0], "labels": {"pod": "a"}})
+    return preprocess(
+        Routing(),
+        Route(name="x", targets=[Target(url="http://localhost")]),
+        AlertGroup.parse_obj(payload),
+    )[0]
+
+
+@pytest.fixture(scope="module")
+def script_dir(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("scripts")
+    (directory / "card.py").write_text(textwrap.dedent(SCRIPT))
+    return directory
+
+
+@pytest.fixture(scope="module")
+def pool(script_dir):
+    pool = ScriptPool(
+        {"card": str(script_dir / "card.py")}, workers=1, cpu_time=0.3, wall_time=0.6
+    )
+    yield pool
+    pool.close()
+
+
+def test_render(pool):
+    for _ in range(2):
+        assert pool.render("card", _enhanced_alert_group()) == {
+            "loads": 1,
+            "alerts": 2,
+            "status": "firing",
+            "specific": {"pod": "a"},
+            "targets": ["http://localhost"],
+        }
+
+
+@pytest.mark.parametrize(
+    "action,message",
+    [
+        ("loop", "CPU time"),
+        ("sleep", "wall time"),
+        ("swallow", "CPU time"),
+        ("ignore_cpu", "did not respond"),
+        ("ignore_wall", "did not respond"),
+        ("allocate", "memory"),
+        ("fail", "ValueError"),
+    ],
+)
+def test_render_limits(pool, action, message):
+    with pytest.raises(ScriptError, match=message):
+        pool.render("card", _enhanced_alert_group(action))
+
+    assert pool.render("card", _enhanced_alert_group())["alerts"] == 2
+
+
+def test_invalid_script(tmp_path):
+    (tmp_path / "broken.py").write_text("def render(data)\n")
+    with pytest.raises(SyntaxError):
+        ScriptPool({"broken": str(tmp_path / "broken.py")})
+
+
+def test_engine_renders_scripts(script_dir):
+    engine = TemplateEngine([str(script_dir)], scripts=Scripts(workers=1))
+    try:
+        assert set(engine.script_pool.paths) == {"card"}
+        payloads, error_parser = engine.render(_enhanced_alert_group(), "card")
+        assert payloads[0].data["alerts"] == 2
+        assert payloads[0].targets == [Target(url="http://localhost")]
+        default = engine.render(_enhanced_alert_group())[0][0].data
+        assert json.loads(default)["type"] == "message"
+        encoded = engine.render(_enhanced_alert_group("card"), "card")[0][0].data
+        assert json.loads(encoded)["type"] == "message"
+    finally:
+        engine.close()
+
+    assert TemplateEngine().script_pool is None
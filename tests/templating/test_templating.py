@@ -0,0 +1,212 @@
+"""
+Tests and benchmark for templating. Run the benchmark with
+`pytest -m slow -s tests/templating/test_templating.py` to see the numbers.
+
+Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0
+"""
+
+import json
+import os
+import time
+
+import pytest
+from jinja2 import TemplateSyntaxError
+
+from prometheus_adaptive_cards.cache import LRUCache
+from prometheus_adaptive_cards.config import Route, Routing, Target
+from prometheus_adaptive_cards.model import AlertGroup
+from prometheus_adaptive_cards.preprocessing import preprocess
+from prometheus_adaptive_cards.templating import TEAMS_MAX_BYTES, TemplateEngine
+
+# ==============================================================================
+
+
+def _enhanced_alert_group(size: int = 1):
+    with open(f"{os.path.dirname(__file__)}/../data/payload-simple-01.json") as f:
+        payload = json.load(f)
+    template = payload["alerts"][0]
+    payload["alerts"] = [
+        {**template, "labels": {**template["labels"], "pod": f'pod-"{i}"'}}
+        for i in range(size)
+    ]
+    return preprocess(
+        Routing(),
+        Route(name="x", targets=[Target(url="http://localhost")]),
+        AlertGroup.parse_obj(payload),
+    )[0]
+
+
+def test_render_default():
+    payloads, error_parser = TemplateEngine().render(_enhanced_alert_group(2))
+
+    assert len(payloads) == 1
+    assert payloads[0].targets == [Target(url="http://localhost")]
+
+    assert isinstance(payloads[0].data, bytes)
+    card = json.loads(payloads[0].data)["attachments"][0]["content"]
+    assert card["type"] == "AdaptiveCard"
+    assert card["body"][0]["text"] == "[FIRING] WhatEver"
+    containers = [item for item in card["body"] if item["type"] == "Container"]
+    assert len(containers) == 2
+    assert containers[1]["items"][-1]["facts"] == [{"title": "pod", "value": 'pod-"1"'}]
+
+    error = error_parser(
+        {"response": {"status_code": 400, "text": "nope", "request_url": "http://x"}}
+    )
+    assert error["attachments"][0]["content"]["body"][1]["facts"][0]["value"] == "400"
+
+
+def test_render_fragments_cached():
+    cache = LRUCache()
+    engine = TemplateEngine(fragment_cache=cache)
+    enhanced_alert_group = _enhanced_alert_group(3)
+
+    first = engine.render(enhanced_alert_group)[0][0].data
+    assert cache.stats()["misses"] == 3
+
+    enhanced_alert_group.alerts[0].alert.status = "resolved"
+    second = engine.render(enhanced_alert_group)[0][0].data
+    assert cache.stats()["misses"] == 4
+    assert cache.stats()["hits"] == 2
+
+    uncached = TemplateEngine().render(enhanced_alert_group)[0][0].data
+    assert second == uncached
+    assert second != first
+
+    other_engine = TemplateEngine(fragment_cache=cache)
+    other_engine.render(enhanced_alert_group)
+    assert cache.stats()["misses"] == 7
+
+
+def test_custom_template_and_bytecode_cache(tmp_path):
+    templates = tmp_path / "templates"
+    templates.mkdir()
+    (templates / "default.json.j2").write_text('{"text": {{ data.status | tojson }}}')
+    (templates / "other.json.j2").write_text('{"count": {{ data.alerts | length }}}')
+    cache = tmp_path / "cache"
+
+    engine = TemplateEngine([str(templates)], str(cache))
+
+    assert {"default", "other", "error"} <= set(engine.templates)
+    assert engine.render(_enhanced_alert_group())[0][0].data == b'{"text": "firing"}'
+    assert engine.render(_enhanced_alert_group(3), "other")[0][0].data == b'{"count": 3}'
+    assert "default" not in engine.fragment_templates
+    assert len(os.listdir(cache)) == len(engine.templates)
+
+    with pytest.raises(KeyError):
+        engine.render(_enhanced_alert_group(), "missing")
+
+
+def test_render_default_summary():
+    enhanced_alert_group = _enhanced_alert_group(2)
+    enhanced_alert_group.summary = {
+        "omitted": 7,
+        "counts": {"severity": {"critical": 5, "warning": 2}, "team": {}},
+    }
+
+    payload = TemplateEngine().render(enhanced_alert_group)[0][0]
+    body = json.loads(payload.data)["attachments"][0]["content"]["body"]
+
+    assert body[-2]["text"] == "7 more alerts are not shown."
+    assert body[-1]["facts"] == [
+        {"title": "severity=critical", "value": "5"},
+        {"title": "severity=warning", "value": "2"},
+    ]
+
+
+def test_render_default_size_limit():
+    data = TemplateEngine().render(_enhanced_alert_group(500))[0][0].data
+
+    assert len(data) <= TEAMS_MAX_BYTES
+    card = json.loads(data)["attachments"][0]["content"]
+    assert card["body"][0]["text"] == "[FIRING] WhatEver"
+    assert card["body"][-1]["text"].endswith("left out to stay below the size limit.")
+    assert card["actions"][0]["title"] == "Open Alertmanager"
+
+
+def test_render_once_per_template(tmp_path, monkeypatch):
+    (tmp_path / "slack.json.j2").write_text('{"text": {{ data.status | tojson }}}')
+    engine = TemplateEngine([str(tmp_path)])
+
+    rendered = []
+    render_data = engine._render_data
+    monkeypatch.setattr(
+        engine,
+        "_render_data",
+        lambda data, name: rendered.append(name) or render_data(data, name),
+    )
+
+    enhanced_alert_group = _enhanced_alert_group()
+    enhanced_alert_group.targets = [
+        Target(url="http://teams/1"),
+        Target(url="http://slack/1", template="slack"),
+        Target(url="http://teams/2", template="default"),
+        Target(url="http://slack/2", template="slack"),
+    ]
+
+    payloads, _ = engine.render(enhanced_alert_group)
+
+    assert rendered == ["default", "slack"]
+    assert [[t.url for t in p.targets] for p in payloads] == [
+        ["http://teams/1", "http://teams/2"],
+        ["http://slack/1", "http://slack/2"],
+    ]
+    assert json.loads(payloads[0].data)["type"] == "message"
+    assert payloads[1].data == b'{"text": "firing"}'
+
+
+def test_fields(tmp_path):
+    (tmp_path / "plain.json.j2").write_text(
+        '{"text": {{ data.common_labels.get("alertname") | tojson }},'
+        ' "count": {{ data.alerts | length }}}'
+    )
+    (tmp_path / "keyed.json.j2").write_text(
+        '{"first": {{ data.alerts[0]["specific_labels"] | tojson }}}'
+    )
+    (tmp_path / "opaque.json.j2").write_text("{{ data.dict() | tojson }}")
+    (tmp_path / "dynamic.json.j2").write_text(
+        '{% set name = "specific_" ~ "labels" %}{{ data | attr(name) | tojson }}'
+    )
+    (tmp_path / "included.json.j2").write_text('{% include "plain.json.j2" %}')
+
+    engine = TemplateEngine([str(tmp_path)])
+
+    assert {"specific_labels", "specific_annotations"} <= engine.fields("default")
+    assert {"common_labels", "alerts", "alertname"} <= engine.fields("plain")
+    assert "specific_labels" not in engine.fields("plain")
+    assert "specific_labels" in engine.fields("keyed")
+    assert engine.fields("opaque") is None
+    assert engine.fields("dynamic") is None
+    assert engine.fields("included") is None
+    assert engine.fields("missing") is None
+
+
+def test_invalid_template(tmp_path):
+    (tmp_path / "broken.json.j2").write_text("{% if %}")
+    with pytest.raises(TemplateSyntaxError):
+        TemplateEngine([str(tmp_path)])
+
+
+@pytest.mark.slow
+def test_benchmark_render_default():
+    engine = TemplateEngine()
+    enhanced_alert_group = _enhanced_alert_group(500)
+
+    cached_engine = TemplateEngine(fragment_cache=LRUCache())
+
+    def measure(engine: TemplateEngine) -> float:
+        runs = 20
+        start = time.perf_counter()
+        for _ in range(runs):
+            engine.render(enhanced_alert_group)
+        return (time.perf_counter() - start) / runs
+
+    elapsed = measure(engine)
+    elapsed_cached = measure(cached_engine)
+
+    print(
+        f"\nRendered 500 alerts in {elapsed * 1000:.2f} ms on average, "
+        f"{elapsed_cached * 1000:.2f} ms with cached fragments."
+    )
+    assert elapsed < 0.05
+    assert elapsed_cached < elapsed
@@ -1,11 +1,59 @@
 """Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
 
+import asyncio
+import base64
+import json
+import os
+import time
+from threading import Timer
+from types import SimpleNamespace
+
 import pytest
+import requests_mock
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
 
 import prometheus_adaptive_cards.app as app
-from prometheus_adaptive_cards.config.settings import Route, Routing
+from prometheus_adaptive_cards.cache import LRUCache
+from prometheus_adaptive_cards.config.settings import (
+    Batch,
+    Route,
+    Routing,
+    Sending,
+    Shutdown,
+    Target,
+)
+from prometheus_adaptive_cards.distribution import Payload
+from prometheus_adaptive_cards.model import AlertGroup
+from prometheus_adaptive_cards.routing import RoutingTableHolder, compile_routing_table
+from prometheus_adaptive_cards.state import GroupStateStore
+from prometheus_adaptive_cards.templating import TemplateEngine
+
+
+@pytest.fixture
+def processed(monkeypatch) -> list[SimpleNamespace]:
+    """Replaces `app._process()` and records the calls made to it."""
+
+    calls = []
+
+    def fake_process(
+        plan,
+        alert_group,
+        targets=None,
+        session=None,
+        tracker=None,
+        cache=None,
+        store=None,
+        offloader=None,
+    ):
+        calls.append(SimpleNamespace(plan=plan, alert_group=alert_group, session=session))
+        return [[]]
+
+    monkeypatch.setattr(app, "_process", fake_process)
+    return calls
+
+
+# ==============================================================================
 
 
 def test_route_health():
@@ -15,6 +63,43 @@ def test_route_health():
     assert response.json() == {"message": "OK", "symbol": "👌"}
 
 
+def test_route_ready():
+    fastapi_app = app.setup_routes(
+        app=app.create_fastapi_base(), routing=Routing(routes=[Route(name="route1")])
+    )
+    client = TestClient(fastapi_app)
+
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["ready"] is True
+    assert response.json()["pending_deliveries"] == 0
+
+    fastapi_app.state.deliveries.begin_shutdown(grace_period=10)
+
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["ready"] is False
+    assert response.json()["accepting"] is False
+
+    with open(f"{os.path.dirname(__file__)}/data/payload-simple-01.json") as f:
+        response = client.post("/route/route1/", json=json.load(f))
+    assert response.status_code == 503
+
+
+def test_shutdown_drains_pending_deliveries():
+    fastapi_app = app.create_fastapi_base(shutdown=Shutdown(grace_period=10))
+    deliveries = fastapi_app.state.deliveries
+    token = deliveries.enqueue(1)
+    timer = Timer(0.3, deliveries.dequeue, [token])
+
+    start = time.monotonic()
+    with TestClient(fastapi_app):
+        timer.start()
+
+    assert 0.3 <= time.monotonic() - start < 10
+    assert deliveries.drained()
+
+
 def test_setup_routes_number_of_routes():
     fastapi_app = app.setup_routes(
         app=FastAPI(),
@@ -26,16 +111,7 @@ def test_setup_routes_number_of_routes():
             ]
         ),
     )
-    assert (
-        len(
-            [
-                route.path
-                for route in fastapi_app.routes
-                if route.path.startswith("/route")
-            ]
-        )
-        == 3
-    )
+    assert len(fastapi_app.state.routing_table.current.routes) == 3
 
     fastapi_app = app.setup_routes(
         app=FastAPI(),
@@ -46,16 +122,7 @@ def test_setup_routes_number_of_routes():
             ]
         ),
     )
-    assert (
-        len(
-            [
-                route.path
-                for route in fastapi_app.routes
-                if route.path.startswith("/route")
-            ]
-        )
-        == 2
-    )
+    assert len(fastapi_app.state.routing_table.current.routes) == 2
 
     with pytest.raises(Exception):
         fastapi_app = app.setup_routes(
@@ -67,13 +134,317 @@ def test_setup_routes_number_of_routes():
                 ]
             ),
         )
-        assert (
-            len(
-                [
-                    route.path
-                    for route in fastapi_app.routes
-                    if route.path.startswith("/route")
-                ]
-            )
-            == 2
+
+
+def test_setup_routes_lookup_follows_swap(processed):
+    fastapi_app = app.setup_routes(
+        app=FastAPI(), routing=Routing(routes=[Route(name="route1", catch=False)])
+    )
+    client = TestClient(fastapi_app)
+
+    with open(f"{os.path.dirname(__file__)}/data/payload-simple-01.json") as f:
+        payload = json.load(f)
+
+    assert client.post("/route/route1/", json=payload).status_code == 200
+    assert client.post("/route/route1/aGFsbG8=", json=payload).status_code == 404
+    assert client.post("/route/route2/", json=payload).status_code == 404
+
+    fastapi_app.state.routing_table.swap(Routing(routes=[Route(name="route2")]))
+
+    assert client.post("/route/route1/", json=payload).status_code == 404
+    assert client.post("/route/route2/", json=payload).status_code == 200
+    assert [(call.plan.name, call.plan.version) for call in processed] == [
+        ("route1", 1),
+        ("route2", 2),
+    ]
+
+
+# ==============================================================================
+
+
+def test_iter_ndjson():
+    async def chunks():
+        for chunk in [b'{"a": 1}\n{"b"', b": 2}\n", b"\n", b'{"c": 3}']:
+            yield chunk
+
+    async def collect():
+        return [line async for line in app._iter_ndjson(chunks())]
+
+    assert asyncio.run(collect()) == [b'{"a": 1}', b'{"b": 2}', b'{"c": 3}']
+
+
+def test_iter_ndjson_long_line():
+    async def chunks(count: int):
+        yield b"a\n"
+        for _ in range(count):
+            yield b"x" * 1024
+        yield b"\nb"
+
+    async def collect(count: int, max_line_bytes: int):
+        return [line async for line in app._iter_ndjson(chunks(count), max_line_bytes)]
+
+    assert asyncio.run(collect(4096, 4 * 2**20)) == [b"a", b"x" * 4 * 2**20, b"b"]
+
+    with pytest.raises(app.HTTPException) as e:
+        asyncio.run(collect(4097, 4 * 2**20))
+    assert e.value.status_code == 413
+
+    async def single_chunk():
+        yield b"a\n" + b"x" * 11 + b"\nb"
+
+    async def collect_single():
+        return [line async for line in app._iter_ndjson(single_chunk(), 10)]
+
+    with pytest.raises(app.HTTPException) as e:
+        asyncio.run(collect_single())
+    assert e.value.status_code == 413
+
+
+def test_route_batch(processed):
+    fastapi_app = app.setup_routes(
+        app=FastAPI(), routing=Routing(routes=[Route(name="route1")])
+    )
+
+    with open(f"{os.path.dirname(__file__)}/data/payload-simple-01.json") as f:
+        line = json.dumps(json.load(f))
+
+    response = TestClient(fastapi_app).post(
+        "/route/route1/batch", data="\n".join([line, "not json", line]) + "\n"
+    )
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == ["ok", "invalid", "ok"]
+    assert [result["index"] for result in results] == [0, 1, 2]
+    assert len(processed) == 2
+    assert processed[0].plan.name == "route1"
+    assert processed[0].session is processed[1].session
+
+
+def test_route_batch_line_too_long():
+    fastapi_app = app.create_fastapi_base(batch=Batch(max_line_bytes=10))
+    app.setup_routes(app=fastapi_app, routing=Routing(routes=[Route(name="route1")]))
+
+    response = TestClient(fastapi_app).post(
+        "/route/route1/batch", data="\n" + "x" * 11 + "\n"
+    )
+
+    assert response.status_code == 413
+
+
+def test_setup_routes_unknown_template():
+    with pytest.raises(ValueError, match="'nope'"):
+        app.setup_routes(
+            app=FastAPI(), routing=Routing(routes=[Route(name="r", template="nope")])
         )
+
+
+def test_route_sends_rendered_card_as_json():
+    fastapi_app = app.setup_routes(
+        app=FastAPI(),
+        routing=Routing(
+            routes=[
+                Route(
+                    name="route1",
+                    targets=[Target(url="http://teams/1"), Target(url="http://teams/2")],
+                    sending=Sending(retries=0, notify_url="http://notify"),
+                )
+            ]
+        ),
+    )
+
+    with open(f"{os.path.dirname(__file__)}/data/payload-simple-01.json") as f:
+        payload = json.load(f)
+
+    with requests_mock.Mocker() as mocker:
+        mocker.post("http://teams/1", status_code=200)
+        mocker.post("http://teams/2", status_code=500)
+        mocker.post("http://notify", status_code=200)
+
+        response = TestClient(fastapi_app).post("/route/route1", json=payload)
+
+        assert response.status_code == 200
+        card, failed, notification = mocker.request_history
+        assert [r.url for r in mocker.request_history] == [
+            "http://teams/1",
+            "http://teams/2",
+            "http://notify/",
+        ]
+
+    for request in (card, failed, notification):
+        assert request.headers["Content-Type"] == "application/json"
+    assert card.json()["type"] == "message"
+    assert card.json()["attachments"][0]["content"]["type"] == "AdaptiveCard"
+    assert failed.body == card.body
+    assert notification.json()["attachments"][0]["content"]["type"] == "AdaptiveCard"
+
+
+# ==============================================================================
+
+
+def test_decode_webhook():
+    url = "https://example.com/webhook?a=1"
+    assert app._decode_webhook(base64.b64encode(url.encode()).decode()) == url
+    assert app._decode_webhook(base64.urlsafe_b64encode(url.encode()).decode()) == url
+    assert app._decode_webhook(base64.b64encode(url.encode()).decode().rstrip("=")) == url
+    assert app._decode_webhook("%%%") is None
+    assert app._decode_webhook(base64.b64encode(b"no url").decode()) is None
+    assert app._decode_webhook(base64.b64encode(b"\xff\xfe").decode()) is None
+
+
+def test_resolve_targets_does_not_mutate_route():
+    route = Route(name="route1", targets=[Target(url="https://configured.com")])
+    b64_webhook = base64.b64encode(b"https://caught.com").decode()
+
+    for _ in range(3):
+        targets = app._resolve_targets(route, b64_webhook)
+        assert [target.url for target in targets] == [
+            "https://configured.com",
+            "https://caught.com",
+        ]
+
+    assert len(route.targets) == 1
+    assert app._resolve_targets(route) is route.targets
+    assert app._resolve_targets(route, "%%%") is route.targets
+
+
+# ==============================================================================
+
+
+def test_process_render_cache(monkeypatch):
+    rendered = []
+    sent = []
+
+    def fake_template(enhanced_alert_group, name="default"):
+        rendered.append(enhanced_alert_group)
+        return [Payload(data={"text": "x"}, targets=[])], None
+
+    def fake_send(payloads, sending, error_parser=None, session=None, tracker=None):
+        sent.append(payloads)
+        return []
+
+    monkeypatch.setattr(app, "template", fake_template)
+    monkeypatch.setattr(app, "send", fake_send)
+
+    with open(f"{os.path.dirname(__file__)}/data/payload-simple-01.json") as f:
+        payload = json.load(f)
+
+    holder = RoutingTableHolder(compile_routing_table(Routing(routes=[Route(name="r")])))
+    cache = LRUCache()
+
+    for _ in range(3):
+        app._process(holder.current.get("r"), AlertGroup.parse_obj(payload), cache=cache)
+
+    assert len(rendered) == 1
+    assert len(sent) == 3
+    assert sent[0] is sent[2]
+    assert cache.stats()["hits"] == 2
+
+    holder.swap(Routing(routes=[Route(name="r")]))
+    app._process(holder.current.get("r"), AlertGroup.parse_obj(payload), cache=cache)
+
+    assert len(rendered) == 2
+
+
+def test_setup_routes_clears_render_cache_on_swap():
+    fastapi_app = app.setup_routes(app.create_fastapi_base(), Routing())
+    cache = fastapi_app.state.render_cache
+    cache.put("key", "value", 1)
+
+    fastapi_app.state.routing_table.swap(Routing())
+
+    assert len(cache) == 0
+    assert TestClient(fastapi_app).get("/stats").json()["render_cache"]["items"] == 0
+
+
+def test_stats_fragment_cache(monkeypatch):
+    fastapi_app = app.create_fastapi_base()
+
+    monkeypatch.setattr(app, "current_engine", lambda: None)
+    assert TestClient(fastapi_app).get("/stats").json()["fragment_cache"] is None
+
+    engine = TemplateEngine(fragment_cache=LRUCache())
+    monkeypatch.setattr(app, "current_engine", lambda: engine)
+    assert TestClient(fastapi_app).get("/stats").json()["fragment_cache"]["items"] == 0
+
+
+def test_template_fields(monkeypatch):
+    fields = {"a": frozenset({"x"}), "b": frozenset({"y"}), "c": None}
+    monkeypatch.setattr(app, "template_fields", lambda name: fields[name])
+
+    assert app._template_fields(Route(name="r", template="a")) == {"x"}
+    assert app._template_fields(
+        Route(name="r", template="a", targets=[Target(url="u", template="b")])
+    ) == {"x", "y"}
+    assert (
+        app._template_fields(
+            Route(name="r", template="a", targets=[Target(url="u", template="c")])
+        )
+        is None
+    )
+
+
+@pytest.mark.parametrize("delta", ["skip_unchanged", "changes"])
+def test_process_delta(monkeypatch, delta):
+    sent = []
+    status_codes = [500, 200, 200, 200]
+
+    def fake_template(enhanced_alert_group, name="default"):
+        return [Payload(data={}, targets=[])], enhanced_alert_group
+
+    def fake_send(payloads, sending, error_parser=None, session=None, tracker=None):
+        sent.append([alert.fingerprint for alert in error_parser.alerts])
+        return [SimpleNamespace(status_code=status_codes.pop(0))]
+
+    monkeypatch.setattr(app, "template", fake_template)
+    monkeypatch.setattr(app, "send", fake_send)
+
+    with open(f"{os.path.dirname(__file__)}/data/payload-simple-01.json") as f:
+        payload = json.load(f)
+    payload["alerts"].append({**payload["alerts"][0], "fingerprint": "other"})
+
+    plan = compile_routing_table(Routing(routes=[Route(name="r", delta=delta)])).get("r")
+    store = GroupStateStore()
+
+    def process(payload):
+        return app._process(plan, AlertGroup.parse_obj(payload), store=store)
+
+    all_alerts = [alert["fingerprint"] for alert in payload["alerts"]]
+
+    assert process(payload)  # Fails, so state is not recorded.
+    assert process(payload)
+    assert process(payload) == []
+
+    payload["alerts"][0]["status"] = "resolved"
+    assert process(payload)
+    assert process(payload) == []
+
+    expected_last = all_alerts if delta == "skip_unchanged" else all_alerts[:1]
+    assert sent == [all_alerts, all_alerts, expected_last]
+
+    # Fully resolved groups are forgotten after delivery.
+    payload["alerts"][1]["status"] = "resolved"
+    assert process(payload)
+    assert len(store) == 0
+
+
+def test_route_dispatch(processed):
+    routing = Routing(
+        routes=[
+            Route(name="all", matchers=['alertname=~".+"']),
+            Route(name="none", matchers=['alertname="nope"']),
+            Route(name="plain"),
+        ]
+    )
+    client = TestClient(app.setup_routes(FastAPI(), routing))
+
+    with open(f"{os.path.dirname(__file__)}/data/payload-simple-01.json") as f:
+        payload = json.load(f)
+
+    response = client.post("/dispatch", json=payload)
+
+    assert response.status_code == 200
+    assert response.json() == {"routes": {"all": len(payload["alerts"])}}
+    assert [(call.plan.name, len(call.alert_group.alerts)) for call in processed] == [
+        ("all", len(payload["alerts"]))
+    ]
@@ -0,0 +1,59 @@
+"""Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
+
+import json
+import os
+
+from prometheus_adaptive_cards.cache import LRUCache, fingerprint
+from prometheus_adaptive_cards.model import AlertGroup
+
+# ==============================================================================
+
+
+def test_lru_cache_evicts_by_items():
+    cache = LRUCache(max_items=2)
+
+    cache.put("a", 1, 1)
+    cache.put("b", 2, 1)
+    assert cache.get("a") == 1
+    cache.put("c", 3, 1)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats() == {
+        "items": 2,
+        "bytes": 2,
+        "hits": 3,
+        "misses": 1,
+        "evictions": 1,
+        "hit_ratio": 0.75,
+    }
+
+
+def test_lru_cache_evicts_by_bytes():
+    cache = LRUCache(max_bytes=10)
+
+    cache.put("a", 1, 6)
+    cache.put("b", 2, 6)
+    cache.put("too-big", 3, 11)
+    cache.put("b", 4, 2)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == 4
+    assert cache.get("too-big") is None
+    assert cache.bytes == 2
+
+    cache.clear()
+    assert len(cache) == 0 and cache.bytes == 0
+
+
+def test_fingerprint():
+    with open(f"{os.path.dirname(__file__)}/data/payload-simple-01.json") as f:
+        payload = json.load(f)
+
+    a = AlertGroup.parse_obj(payload)
+    b = AlertGroup.parse_obj(payload)
+    assert fingerprint(a) == fingerprint(b)
+
+    b.alerts[0].labels["new"] = "label"
+    assert fingerprint(a) != fingerprint(b)
@@ -0,0 +1,44 @@
+"""Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
+
+import pytest
+
+from prometheus_adaptive_cards.expansion import Expansion, compile_value
+
+# ==============================================================================
+
+
+def test_compile_value_literal():
+    assert compile_value("plain") == "plain"
+    assert compile_value("json {{x}}") == "json {x}"
+    assert compile_value("}}{{") == "}{"
+
+
+def test_compile_value_escaped_braces():
+    expansion = compile_value("{labels[a]} {{x}}")
+    assert isinstance(expansion, Expansion)
+    assert expansion.expand({"a": "A"}, {}) == "A {x}"
+    assert compile_value("json {{x}}") == expansion.expand({"a": "json"}, {})
+
+
+def test_expansion():
+    expansion = compile_value("https://wiki/{labels[alertname]}#{annotations[x]}")
+    assert isinstance(expansion, Expansion)
+    assert expansion.fields == (("labels", "alertname"), ("annotations", "x"))
+    assert expansion.expand({"alertname": "Down"}, {"x": "y"}) == "https://wiki/Down#y"
+    assert expansion.expand({}, {}) == "https://wiki/#"
+
+
+def test_expansion_memoized():
+    expansion = Expansion("{labels[a]}-{labels[a]}")
+    assert expansion.fields == (("labels", "a"),)
+    assert expansion.expand({"a": "1", "b": "2"}, {}) == "1-1"
+    assert expansion.expand({"a": "1", "b": "3"}, {}) == "1-1"
+    assert expansion._memo == {("1",): "1-1"}
+
+
+@pytest.mark.parametrize(
+    "template", ["{alertname}", "{labels}", "{labels.a}", "{labels[a]", "}"]
+)
+def test_expansion_invalid(template):
+    with pytest.raises(ValueError):
+        Expansion(template)
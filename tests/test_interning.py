@@ -0,0 +1,66 @@
+"""Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
+
+import json
+import os
+
+from prometheus_adaptive_cards.interning import InternTable
+from prometheus_adaptive_cards.model import AlertGroup
+
+# ==============================================================================
+
+
+def test_intern_returns_canonical_instance():
+    table = InternTable()
+    a = "".join(["name", "space"])
+    b = "".join(["names", "pace"])
+
+    assert a is not b
+    assert table.intern(a) is a
+    assert table.intern(b) is a
+
+
+def test_intern_skips_long_strings():
+    table = InternTable(max_length=3)
+    a = "".join(["lo", "ng"])
+
+    assert table.intern(a) is a
+    assert len(table) == 0
+
+
+def test_intern_is_bounded():
+    table = InternTable(maxsize=4)
+
+    for i in range(100):
+        table.intern(f"value-{i}")
+        assert len(table) <= 4
+
+
+def test_intern_keeps_hot_strings():
+    table = InternTable(maxsize=4)
+    hot = "".join(["ho", "t"])
+    table.intern(hot)
+
+    for i in range(100):
+        assert table.intern("".join(["ho", "t"])) is hot
+        table.intern(f"value-{i}")
+
+
+def test_intern_items():
+    table = InternTable()
+    items = table.intern_items({"".join(["a", "b"]): "".join(["c", "d"])})
+    other = table.intern_items({"".join(["a", "b"]): "".join(["c", "d"])})
+
+    assert items == {"ab": "cd"}
+    assert list(items)[0] is list(other)[0]
+    assert items["ab"] is other["ab"]
+
+
+def test_alert_group_parsing_interns():
+    with open(f"{os.path.dirname(__file__)}/data/payload-simple-01.json") as f:
+        payload = json.load(f)
+
+    a = AlertGroup.parse_obj(payload)
+    b = AlertGroup.parse_obj(json.loads(json.dumps(payload)))
+
+    assert a.alerts[0].labels["severity"] is b.alerts[0].labels["severity"]
+    assert a.common_labels["severity"] is b.alerts[0].labels["severity"]
@@ -0,0 +1,51 @@
+"""Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
+
+import pytest
+
+from prometheus_adaptive_cards.matchers import Matcher, MatcherIndex, parse_matchers
+
+# ==============================================================================
+
+
+def test_parse_matchers():
+    matchers = parse_matchers('{severity="info", team=~"a|b" , env!=prod,x!~"\\"q\\""}')
+
+    assert [(m.name, m.op, m.value) for m in matchers] == [
+        ("severity", "=", "info"),
+        ("team", "=~", "a|b"),
+        ("env", "!=", "prod"),
+        ("x", "!~", '"q"'),
+    ]
+    assert str(matchers[0]) == 'severity="info"'
+    assert parse_matchers("severity=info") == [Matcher("severity", "=", "info")]
+
+
+@pytest.mark.parametrize("text", ["", "{}", "severity", "1abc=x", 'a=~"("', "a=b c=d"])
+def test_parse_matchers_invalid(text):
+    with pytest.raises(ValueError):
+        parse_matchers(text)
+
+
+def test_matcher_semantics():
+    (regex,) = parse_matchers('team=~"a|b"')
+    assert regex.matches("a")
+    assert not regex.matches("ab")  # Anchored.
+
+    (not_equal,) = parse_matchers('env!="prod"')
+    assert not_equal.matches("")  # Missing label is empty.
+
+
+def test_matcher_index():
+    index = MatcherIndex(
+        [
+            parse_matchers('severity="info"'),
+            parse_matchers('team="db", env!~"prod|staging"'),
+        ]
+    )
+
+    assert index.matches({"severity": "info"})
+    assert index.matches({"team": "db"})
+    assert index.matches({"team": "db", "env": "dev"})
+    assert not index.matches({"team": "db", "env": "prod"})
+    assert not index.matches({"severity": "critical", "team": "web"})
+    assert not MatcherIndex([])
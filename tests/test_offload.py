@@ -0,0 +1,198 @@
+"""
+Tests and benchmark for offloading preprocessing. Run the benchmark with
+`pytest -m slow -s tests/test_offload.py` to see the numbers.
+
+Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0
+"""
+
+import json
+import os
+import statistics
+import time
+from threading import Event, Thread
+from types import SimpleNamespace
+
+import pytest
+
+import prometheus_adaptive_cards.offload as offload
+from prometheus_adaptive_cards.config import Route, Routing, SplitBy, Summarize, Target
+from prometheus_adaptive_cards.model import AlertGroup
+from prometheus_adaptive_cards.offload import (
+    Offloader,
+    decode_alert_group,
+    encode_alert_group,
+)
+from prometheus_adaptive_cards.preprocessing import preprocess
+from prometheus_adaptive_cards.routing import compile_routing_table
+
+# ==============================================================================
+
+
+def _payload(size: int) -> dict:
+    with open(f"{os.path.dirname(__file__)}/data/payload-simple-01.json") as f:
+        payload = json.load(f)
+    template = payload["alerts"][0]
+    payload["alerts"] = [
+        {
+            **template,
+            "fingerprint": f"{i:016x}",
+            "labels": {**template["labels"], "pod": f"pod-{i}", "shard": str(i % 7)},
+        }
+        for i in range(size)
+    ]
+    return payload
+
+
+def _plan():
+    routing = Routing(
+        routes=[
+            Route(
+                name="r",
+                targets=[Target(url="http://target")],
+                split_by=SplitBy(target="label", value="shard"),
+                summarize=Summarize(max_alerts=5, count_by=["pod"]),
+            )
+        ]
+    )
+    return compile_routing_table(routing).get("r")
+
+
+def test_encode_decode_alert_group():
+    alert_group = AlertGroup.parse_obj({**_payload(3), "extra": "field"})
+
+    decoded = decode_alert_group(encode_alert_group(alert_group))
+
+    assert decoded == alert_group
+    assert decoded.extra == "field"
+
+
+def test_preprocess_encoded_keeps_routing_per_version(monkeypatch):
+    monkeypatch.setattr(offload, "_versions", {})
+    plan = _plan()
+    encoded = encode_alert_group(AlertGroup.parse_obj(_payload(10)))
+
+    assert offload._preprocess_encoded(plan.version, "r", encoded) is None
+    with_routing = offload._preprocess_encoded(
+        plan.version, "r", encoded, routing=plan.routing
+    )
+    assert offload._preprocess_encoded(plan.version, "r", encoded) == with_routing
+
+    for version in [5, 3, 4]:
+        assert offload._preprocess_encoded(version, "r", encoded, routing=plan.routing)
+    assert set(offload._versions) == {4, 5}
+
+
+def test_offloader_sends_routing_once():
+    plan = _plan()
+    offloader = Offloader(threshold=10, max_workers=1)
+    pool = offloader._get_pool()
+    submitted = []
+
+    def submit(fn, *args):
+        submitted.append(args)
+        return pool.submit(fn, *args)
+
+    offloader._get_pool = lambda: SimpleNamespace(submit=submit)
+
+    try:
+        for _ in range(3):
+            offloader.preprocess(plan, AlertGroup.parse_obj(_payload(20)))
+    finally:
+        offloader.shutdown()
+
+    assert [len(args) for args in submitted] == [5, 4, 4]
+    assert isinstance(submitted[0][4], Routing)
+    assert all(not isinstance(arg, (Route, Routing)) for arg in submitted[1])
+    assert offloader._sent_versions == set()
+
+
+def test_offloader_keeps_recent_sent_versions():
+    offloader = Offloader(threshold=10)
+
+    assert not offloader._mark_sent(1)
+    assert offloader._mark_sent(1)
+    for version in [2, 3, 4]:
+        assert not offloader._mark_sent(version)
+
+    assert offloader._sent_versions == {3, 4}
+
+
+def test_offloader_equals_inline():
+    plan = _plan()
+    offloader = Offloader(threshold=10, max_workers=1)
+
+    assert not offloader.should_offload(AlertGroup.parse_obj(_payload(9)))
+    assert offloader.should_offload(AlertGroup.parse_obj(_payload(10)))
+
+    try:
+        offloaded = offloader.preprocess(plan, AlertGroup.parse_obj(_payload(50)))
+    finally:
+        offloader.shutdown()
+
+    inline = preprocess(
+        plan.routing, plan.route, AlertGroup.parse_obj(_payload(50)), actions=plan.actions
+    )
+
+    assert offloaded == inline
+
+
+# ==============================================================================
+
+
+def _small_request_latencies(run_big, plan) -> list[float]:
+    """Runs small requests in a thread while `run_big` runs in another."""
+
+    small = _payload(5)
+    done = Event()
+    latencies = []
+
+    def small_requests():
+        while not done.is_set():
+            start = time.perf_counter()
+            preprocess(plan.routing, plan.route, AlertGroup.parse_obj(small))
+            latencies.append(time.perf_counter() - start)
+
+    thread = Thread(target=small_requests)
+    thread.start()
+    for _ in range(2):
+        run_big()
+    done.set()
+    thread.join()
+
+    return latencies
+
+
+@pytest.mark.slow
+def test_benchmark_offload_small_request_latency():
+    plan = _plan()
+    big = _payload(10_000)
+    offloader = Offloader(threshold=1_000, max_workers=1)
+
+    # Start the pool before measuring.
+    offloader.preprocess(plan, AlertGroup.parse_obj(_payload(1_000)))
+
+    try:
+        inline = _small_request_latencies(
+            lambda: preprocess(
+                plan.routing, plan.route, AlertGroup.parse_obj(big), actions=plan.actions
+            ),
+            plan,
+        )
+        offloaded = _small_request_latencies(
+            lambda: offloader.preprocess(plan, AlertGroup.parse_obj(big)), plan
+        )
+    finally:
+        offloader.shutdown()
+
+    def summary(latencies: list[float]) -> str:
+        return (
+            f"p50 {statistics.median(latencies) * 1000:.2f} ms, "
+            f"max {max(latencies) * 1000:.1f} ms, {len(latencies)} requests"
+        )
+
+    print(
+        f"\nSmall requests next to 10k alerts: inline {summary(inline)}, "
+        f"offloaded {summary(offloaded)}"
+    )
+
+    assert len(offloaded) > len(inline)
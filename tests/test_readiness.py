@@ -0,0 +1,79 @@
+"""Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
+
+import asyncio
+import time
+
+from prometheus_adaptive_cards.config import Readiness
+from prometheus_adaptive_cards.distribution import DeliveryTracker
+from prometheus_adaptive_cards.readiness import ReadinessProbe
+
+# ==============================================================================
+
+
+def test_check_without_thresholds():
+    probe = ReadinessProbe(Readiness(), DeliveryTracker())
+    probe.deliveries.enqueue(1000)
+
+    with probe.track_request():
+        ready, status = probe.check()
+
+    assert ready is True
+    assert status["requests_in_flight"] == 1
+    assert status["pending_deliveries"] == 1000
+    assert status["exceeded"] == []
+    assert probe.requests_in_flight == 0
+
+
+def test_check_thresholds_exceeded():
+    probe = ReadinessProbe(
+        Readiness(max_requests_in_flight=0, max_pending_deliveries=2),
+        DeliveryTracker(),
+    )
+    token = probe.deliveries.enqueue(3)
+
+    with probe.track_request():
+        ready, status = probe.check()
+
+    assert ready is False
+    assert status["exceeded"] == ["requests_in_flight", "pending_deliveries"]
+
+    probe.deliveries.dequeue(token)
+    ready, status = probe.check()
+
+    assert ready is True
+    assert status["pending_deliveries"] == 2
+
+
+def test_check_oldest_pending():
+    probe = ReadinessProbe(Readiness(max_oldest_pending_seconds=0), DeliveryTracker())
+    token = probe.deliveries.enqueue(1)
+
+    assert probe.check()[0] is False
+    assert probe.check()[1]["oldest_pending_seconds"] > 0
+
+    probe.deliveries.release(token)
+
+    assert probe.check()[0] is True
+    assert probe.check()[1]["oldest_pending_seconds"] == 0
+
+
+def test_monitor_event_loop():
+    probe = ReadinessProbe(
+        Readiness(lag_probe_interval=0.01, max_event_loop_lag_seconds=0.05),
+        DeliveryTracker(),
+    )
+
+    async def block():
+        task = asyncio.ensure_future(probe.monitor_event_loop())
+        await asyncio.sleep(0)
+        time.sleep(0.1)
+        for _ in range(10):
+            await asyncio.sleep(0)
+            if probe.event_loop_lag:
+                break
+        task.cancel()
+
+    asyncio.run(block())
+
+    assert probe.event_loop_lag >= 0.05
+    assert probe.check()[1]["exceeded"] == ["event_loop_lag_seconds"]
@@ -0,0 +1,110 @@
+"""Copyright © 2020 Tim Schwenke - Licensed under the Apache License 2.0"""
+
+from prometheus_adaptive_cards.model import Alert, AlertGroup
+from prometheus_adaptive_cards.state import (
+    GroupStateStore,
+    alert_states,
+    changed_alerts,
+)
+
+# ==============================================================================
+
+
+def _alert_group(*states: tuple[str, str]) -> AlertGroup:
+    return AlertGroup.construct(
+        alerts=[Alert.construct(fingerprint=f, status=s) for f, s in states]
+    )
+
+
+def test_alert_states_and_changed_alerts():
+    previous = alert_states(_alert_group(("a", "firing"), ("b", "firing")))
+    alert_group = _alert_group(("a", "firing"), ("b", "resolved"), ("c", "firing"))
+
+    assert previous == {"a": "firing", "b": "firing"}
+    assert [alert.fingerprint for alert in changed_alerts(previous, alert_group)] == [
+        "b",
+        "c",
+    ]
+
+
+def test_group_state_store_in_memory():
+    store = GroupStateStore()
+
+    assert store.get("x") is None
+    store.put("x", {"a": "firing"})
+    assert store.get("x") == {"a": "firing"}
+    assert len(store) == 1
+
+
+def test_group_state_store_sqlite(tmp_path):
+    path = str(tmp_path / "state.db")
+
+    store = GroupStateStore(path)
+    store.put("x", {"a": "firing"})
+    store.put("x", {"a": "resolved", "b": "firing"})
+    store.put("y", {"a": "firing"})
+    store.put("y", {"a": "resolved"})
+    store.close()
+
+    store = GroupStateStore(path)
+    assert len(store) == 0
+    assert store.get("x") == {"a": "resolved", "b": "firing"}
+    assert store.get("y") is None
+    store.close()
+
+
+def test_group_state_store_forgets_resolved_groups():
+    store = GroupStateStore()
+
+    store.put("x", {"a": "firing", "b": "firing"})
+    store.put("x", {"a": "resolved", "b": "firing"})
+    assert store.get("x") == {"a": "resolved", "b": "firing"}
+
+    store.put("x", {"a": "resolved", "b": "resolved"})
+    assert store.get("x") is None
+    assert len(store) == 0
+
+
+def test_group_state_store_max_items(tmp_path):
+    now = [0.0]
+    path = str(tmp_path / "state.db")
+
+    store = GroupStateStore(path, max_items=2, clock=lambda: now[0])
+    for key in ["a", "b", "c"]:
+        now[0] += 1
+        store.put(key, {"x": "firing"})
+    assert len(store) == 2
+    # Evicted from memory only, still in the database.
+    assert store.get("a") == {"x": "firing"}
+    store.close()
+
+    store = GroupStateStore(path, max_items=2, clock=lambda: now[0])
+    assert [store.get(key) is not None for key in ["a", "b", "c"]] == [
+        False,
+        True,
+        True,
+    ]
+    store.close()
+
+
+def test_group_state_store_max_age(tmp_path):
+    now = [0.0]
+    path = str(tmp_path / "state.db")
+
+    store = GroupStateStore(path, max_age=10, clock=lambda: now[0])
+    store.put("a", {"x": "firing"})
+    now[0] = 5
+    store.put("b", {"x": "firing"})
+    now[0] = 12
+    assert store.get("a") is None
+    assert store.get("b") == {"x": "firing"}
+    store.close()
+
+    now[0] = 16
+    store = GroupStateStore(path, max_age=10, clock=lambda: now[0])
+    assert store.get("b") is None
+    store.close()
+
+    store = GroupStateStore(path, max_age=None, clock=lambda: now[0])
+    assert store.get("b") is None
+    store.close()